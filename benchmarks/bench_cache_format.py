@@ -0,0 +1,154 @@
+"""
+Бенчмарк формата хранения кэша расписания.
+
+Сравниваются:
+  * "JSON по дням"   - прежний формат: строка JSON на (группа, день);
+  * "неделя, сжатая" - текущий формат: одна запись на (группа, ISO-неделю)
+                       с таблицей строк и zlib (database.schedule_codec).
+
+Замеряются размер базы на диске (после VACUUM), кодирование недели и
+чтение: недели целиком и одного дня (в новом формате для одного дня
+распаковывается вся неделя).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_cache_format [--groups 200] [--weeks 4]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from database.schedule_codec import decode_week, encode_week  # noqa: E402
+from services.change_detector import schedule_fingerprint  # noqa: E402
+
+TIMES = ["08:30 - 10:00", "10:10 - 11:40", "12:10 - 13:40", "13:50 - 15:20", "15:30 - 17:00"]
+TYPES = ["Лекция", "Практическое занятие", "Лабораторная работа"]
+DAYS = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
+SUBJECTS = [f"Дисциплина учебного плана №{n}" for n in range(60)]
+TEACHERS = [f"Преподаватель{n} Имя{n} Отчество{n}" for n in range(80)]
+ROOMS = [f"{corpus}-{number}" for corpus in "АБВ" for number in range(101, 131)]
+
+
+def make_week(group: str, start: date, rng: random.Random):
+    """Неделя группы: 6 учебных дней по 2-5 пар из ограниченного набора предметов"""
+    subjects = rng.sample(SUBJECTS, 8)
+    days = {}
+    for offset in range(7):
+        day = start + timedelta(days=offset)
+        lessons = [] if offset == 6 else [
+            {
+                "number": number + 1, "time": TIMES[number], "name": rng.choice(subjects),
+                "type": rng.choice(TYPES), "teacher": rng.choice(TEACHERS), "room": rng.choice(ROOMS),
+            }
+            for number in range(rng.randint(2, 5))
+        ]
+        days[offset] = {"date": day.strftime("%d.%m.%Y"), "lessons": lessons, "day_of_week": DAYS[offset], "group_name": group}
+    return days
+
+
+def timed(func, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def db_size(path: Path, create: str, insert: str, rows) -> int:
+    connection = sqlite3.connect(path)
+    connection.execute(create)
+    connection.executemany(insert, rows)
+    connection.commit()
+    connection.execute("VACUUM")
+    connection.close()
+    return path.stat().st_size
+
+
+def main_async(args) -> int:
+    rng = random.Random(1)
+    monday = date(2026, 2, 16)
+    now = int(time.time())
+    weeks = {}
+    for group in range(args.groups):
+        for week in range(args.weeks):
+            start = monday + timedelta(weeks=week)
+            weeks[(f"ГР-{group}", start)] = make_week(f"ГР-{group}", start, rng)
+
+    records = {
+        key: {offset: (schedule, schedule_fingerprint(schedule), now) for offset, schedule in days.items()}
+        for key, days in weeks.items()
+    }
+    json_rows = [
+        (group, (start + timedelta(days=offset)).isoformat(), json.dumps(schedule, ensure_ascii=False), now, fingerprint)
+        for (group, start), days in records.items()
+        for offset, (schedule, fingerprint, _) in days.items()
+    ]
+    week_rows = [(group, start.isoformat(), encode_week(days), now) for (group, start), days in records.items()]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_size = db_size(
+            Path(tmp) / "json.db",
+            "CREATE TABLE schedule_cache (group_name TEXT NOT NULL, date TEXT NOT NULL, data TEXT NOT NULL, "
+            "fetched_at INTEGER NOT NULL, fingerprint TEXT, PRIMARY KEY (group_name, date))",
+            "INSERT INTO schedule_cache VALUES (?, ?, ?, ?, ?)", json_rows,
+        )
+        week_size = db_size(
+            Path(tmp) / "weeks.db",
+            "CREATE TABLE schedule_weeks (group_name TEXT NOT NULL, week TEXT NOT NULL, data BLOB NOT NULL, "
+            "fetched_at INTEGER NOT NULL, PRIMARY KEY (group_name, week))",
+            "INSERT INTO schedule_weeks VALUES (?, ?, ?, ?)", week_rows,
+        )
+
+    sample = list(records.values())[:args.sample]
+    sample_json = [[json.dumps(schedule, ensure_ascii=False) for schedule, _, _ in days.values()] for days in sample]
+    sample_records = [encode_week(days) for days in sample]
+    repeat = max(1, args.repeat // len(sample))
+
+    results = {
+        "JSON по дням": (
+            json_size,
+            timed(lambda: [[json.dumps(schedule, ensure_ascii=False) for schedule, _, _ in days.values()] for days in sample], repeat),
+            timed(lambda: [[json.loads(text) for text in days] for days in sample_json], repeat),
+            timed(lambda: [json.loads(days[2]) for days in sample_json], repeat),
+        ),
+        "неделя, сжатая": (
+            week_size,
+            timed(lambda: [encode_week(days) for days in sample], repeat),
+            timed(lambda: [decode_week(record) for record in sample_records], repeat),
+            timed(lambda: [decode_week(record)[2] for record in sample_records], repeat),
+        ),
+    }
+
+    print(f"{args.groups} групп × {args.weeks} недель ({len(json_rows)} дней)\n")
+    print(f"{'формат':<16}{'на диске':>12}{'запись недели':>16}{'чтение недели':>16}{'чтение дня':>14}")
+    for name, (size, encode, decode, decode_day) in results.items():
+        print(
+            f"{name:<16}{size / 1024:>9.0f} КБ{encode / len(sample):>13.1f} мкс"
+            f"{decode / len(sample):>13.1f} мкс{decode_day / len(sample):>11.1f} мкс"
+        )
+
+    (old_size, *_), (new_size, *_) = results.values()
+    print(f"\nРазмер базы: x{old_size / new_size:.1f} меньше прежнего формата")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=200, help="групп в кэше")
+    parser.add_argument("--weeks", type=int, default=4, help="недель на группу")
+    parser.add_argument("--sample", type=int, default=100, help="недель в замере кодирования")
+    parser.add_argument("--repeat", type=int, default=2000, help="всего кодирований в замере")
+    args = parser.parse_args()
+    return main_async(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
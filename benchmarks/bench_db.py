@@ -0,0 +1,124 @@
+"""
+Бенчмарк записи в SQLite.
+
+Сравниваются:
+  * "как раньше" - журнал по умолчанию (DELETE, synchronous=FULL),
+                   фиксация после каждого изменения;
+  * "WAL, по одному" - WAL и настроенные pragma, но по-прежнему фиксация
+                   после каждого изменения;
+  * "WAL, пакетами" - текущая схема: WAL и общая задача записи, которая
+                   фиксирует пачки изменений.
+
+Нагрузка - конкурентные обработчики, каждый сохраняет группу пользователя
+и запись недели расписания (как при выборе группы и загрузке недели).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db [--handlers 50] [--writes 40] [--synchronous FULL]
+
+С --synchronous FULL каждая фиксация в WAL делает fsync - так видно,
+сколько экономит объединение изменений в пачки на медленном диске.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from database.database import Database  # noqa: E402
+from database.schedule_codec import week_of  # noqa: E402
+
+SCHEDULE = {
+    "date": "16.02.2026",
+    "day_of_week": "Понедельник",
+    "group_name": "БОЗИ-24",
+    "lessons": [
+        {"number": n, "time": "08:30 - 10:00", "name": "Программирование на Python",
+         "type": "Лабораторная работа", "teacher": "Кузнецова Мария Викторовна", "room": "А-101"}
+        for n in range(1, 5)
+    ],
+}
+
+
+class LegacyDatabase(Database):
+    """Запись как до перехода на WAL: execute + commit в каждом вызове"""
+
+    async def configure(self):
+        pass
+
+    async def _write(self, sql, params=(), durable=False, batch=False):
+        if sql is None:
+            return 0, None
+        cursor = await self.connection.execute(sql, params)
+        await self.connection.commit()
+        return cursor.rowcount, cursor.lastrowid
+
+
+class LegacyWalDatabase(LegacyDatabase):
+    """Фиксация после каждого изменения, но с WAL и настроенными pragma"""
+
+    configure = Database.configure
+
+
+async def handler(db: Database, handler_id: int, writes: int, latencies: list):
+    for i in range(writes):
+        user_id = handler_id * writes + i
+        started = time.perf_counter()
+        if i % 2:
+            await db.set_user_group(user_id, "user", "User", f"ГР-{user_id % 100}")
+        else:
+            day = f"2026-02-{i % 28 + 1:02d}"
+            await db.save_schedule_week(f"ГР-{user_id % 100}", week_of(day)[0], {day: (SCHEDULE, None)})
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(name: str, db: Database, handlers: int, writes: int) -> float:
+    await db.connect()
+    latencies: list = []
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(db, h, writes, latencies) for h in range(handlers)))
+    await db.flush()
+    elapsed = time.perf_counter() - started
+    await db.disconnect()
+
+    latencies.sort()
+    rate = len(latencies) / elapsed
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<16} {rate:>9.0f} записей/с   "
+        f"ожидание обработчика: медиана {statistics.median(latencies) * 1000:.2f} мс, p95 {p95 * 1000:.2f} мс"
+    )
+    return rate
+
+
+async def main_async(args) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = await run("как раньше", LegacyDatabase(str(Path(tmp) / "legacy.db")), args.handlers, args.writes)
+        await run(
+            "WAL, по одному", LegacyWalDatabase(str(Path(tmp) / "wal1.db"), synchronous=args.synchronous),
+            args.handlers, args.writes
+        )
+        current = await run(
+            "WAL, пакетами", Database(str(Path(tmp) / "wal.db"), synchronous=args.synchronous),
+            args.handlers, args.writes
+        )
+    print(f"\nПропускная способность записи: x{current / legacy:.1f} относительно прежней схемы")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handlers", type=int, default=50, help="одновременных обработчиков")
+    parser.add_argument("--writes", type=int, default=40, help="изменений на обработчик")
+    parser.add_argument("--synchronous", default="NORMAL", help="PRAGMA synchronous для WAL (NORMAL или FULL)")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Бенчмарк чтения из SQLite при росте числа одновременных обработчиков.
+
+Сравниваются:
+  * "одно соединение" - все запросы в очереди к одному потоку aiosqlite
+                        (как раньше, DB_READ_POOL_SIZE=0);
+  * "пул N"           - соединения только для чтения в режиме WAL.
+
+Каждый обработчик читает группу и настройки пользователя и день
+расписания из кэша, как при открытии расписания. Параллельно идёт
+поток записи в кэш, чтобы чтение конкурировало с записью.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_db_reads [--users 5000] [--seconds 2] [--pool 4]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from database.database import Database  # noqa: E402
+from database.schedule_codec import day_of  # noqa: E402
+
+CONCURRENCY = (1, 4, 16, 64)
+
+SCHEDULE = {
+    "date": "16.02.2026",
+    "day_of_week": "Понедельник",
+    "group_name": "БОЗИ-24",
+    "lessons": [
+        {"number": n, "time": "08:30 - 10:00", "name": "Программирование на Python",
+         "type": "Лабораторная работа", "teacher": "Кузнецова Мария Викторовна", "room": "А-101"}
+        for n in range(1, 5)
+    ],
+}
+
+
+async def populate(path: str, users: int):
+    db = Database(path, read_pool_size=0)
+    await db.connect()
+    for user_id in range(users):
+        await db.set_user_group(user_id, "user", "User", f"ГР-{user_id % 200}")
+    for group in range(200):
+        for week in ("2026-02-02", "2026-02-09"):
+            await db.save_schedule_week(f"ГР-{group}", week, {day_of(week, offset): (SCHEDULE, None) for offset in range(7)})
+    await db.disconnect()
+
+
+async def measure(db: Database, users: int, concurrency: int, seconds: float) -> float:
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def reader():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            user_id = random.randrange(users)
+            group = await db.get_user_group(user_id)
+            await db.get_notifications_enabled(user_id)
+            await db.get_cached_schedule_entry(group, f"2026-02-{random.randint(2, 15):02d}")
+            done += 1
+
+    async def writer():
+        # Пачки записей, как при обновлении недель расписания
+        while time.perf_counter() < deadline:
+            group = f"ГР-{random.randrange(200)}"
+            await asyncio.gather(*(
+                db.save_schedule_week(group, week, {day_of(week, offset): (SCHEDULE, None) for offset in range(7)})
+                for week in ("2026-03-02", "2026-03-09", "2026-03-16", "2026-03-23")
+            ))
+            await asyncio.sleep(0.005)
+
+    started = time.perf_counter()
+    await asyncio.gather(writer(), *(reader() for _ in range(concurrency)))
+    return done / (time.perf_counter() - started)
+
+
+async def main_async(args) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.db")
+        await populate(path, args.users)
+
+        print(f"{'обработчиков':<14}" + "".join(f"{c:>10}" for c in CONCURRENCY) + "   (запросов расписания в секунду)")
+        results = {}
+        for name, pool_size in (("одно соединение", 0), (f"пул {args.pool}", args.pool)):
+            db = Database(path, read_pool_size=pool_size)
+            await db.connect()
+            results[name] = [await measure(db, args.users, concurrency, args.seconds) for concurrency in CONCURRENCY]
+            stats = db.get_read_stats()
+            await db.disconnect()
+            line = f"{name:<14}" + "".join(f"{rate:>10.0f}" for rate in results[name])
+            if stats:
+                line += f"   ожидание соединения: в среднем {stats['avg_wait_ms']:.2f} мс, максимум {stats['wait_max'] * 1000:.1f} мс"
+            print(line)
+
+        single, pooled = results.values()
+        print(f"\nПри {CONCURRENCY[-1]} обработчиках: x{pooled[-1] / single[-1]:.1f} относительно одного соединения")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5000, help="пользователей в базе")
+    parser.add_argument("--seconds", type=float, default=2.0, help="длительность замера для каждого уровня")
+    parser.add_argument("--pool", type=int, default=4, help="соединений в пуле чтения")
+    args = parser.parse_args()
+    return asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+"""
+Бенчмарк движков разбора HTML расписания: BeautifulSoup против lxml.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_parser [--repeat 200]
+
+Перед замером проверяется, что оба движка дают одинаковый результат
+на всех файлах из benchmarks/fixtures.
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from services.parser import PARSE_ENGINES  # noqa: E402
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+
+def load_fixtures():
+    return {path.name: path.read_text(encoding="utf-8") for path in sorted(FIXTURES_DIR.glob("*.html"))}
+
+
+def check_identical(fixtures) -> bool:
+    ok = True
+    for name, html in fixtures.items():
+        results = {engine: parse(html) for engine, parse in PARSE_ENGINES.items()}
+        reference = results["bs4"]
+        for engine, result in results.items():
+            if result != reference:
+                ok = False
+                print(f"❌ {name}: результат {engine} отличается от bs4")
+        print(f"{name}: {len(reference)} занятий, результаты {'совпадают' if ok else 'РАЗЛИЧАЮТСЯ'}")
+    return ok
+
+
+def bench(fixtures, repeat: int):
+    print(f"\n{'движок':<8} {'время, с':>10} {'занятий/с':>12} {'мс/страница':>12}")
+    baseline = None
+    for engine, parse in PARSE_ENGINES.items():
+        lessons = 0
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for html in fixtures.values():
+                lessons += len(parse(html))
+        elapsed = time.perf_counter() - started
+        pages = repeat * len(fixtures)
+        rate = lessons / elapsed
+        baseline = baseline or rate
+        print(f"{engine:<8} {elapsed:>10.3f} {rate:>12.0f} {elapsed / pages * 1000:>12.2f}  (x{rate / baseline:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="сколько раз разобрать каждый файл")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    if not fixtures:
+        print(f"Нет файлов в {FIXTURES_DIR}")
+        return 1
+    if not check_identical(fixtures):
+        return 1
+    bench(fixtures, args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Бенчмарк отрисовки изображений расписания.
+
+Сравниваются:
+  * "на запрос"  - как раньше: новый генератор (с загрузкой шрифтов) на каждое изображение,
+                   все слои рисуются заново;
+  * "без шаблонов" - общий генератор, но шапка/карточки/футер рисуются заново;
+  * "общий, холодный" - общий генератор с шаблонами, но кэш надписей
+                   сбрасывается перед каждым изображением (все тексты новые);
+  * "общий"      - общий генератор с шаблонами и кэшем надписей.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_render [--repeat 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("BOT_TOKEN", "0:benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from services.image_generator import ScheduleImageGenerator, _load_font_set  # noqa: E402
+
+
+def make_schedule(lessons_count: int):
+    return {
+        "date": "16.02.2026",
+        "day_of_week": "Понедельник",
+        "group_name": "БОЗИ-24",
+        "lessons": [
+            {
+                "number": number,
+                "time": "08:30 - 10:00",
+                "name": "Программирование на Python",
+                "type": "Лабораторная работа",
+                "teacher": "Кузнецова Мария Викторовна",
+                "room": "А-101",
+            }
+            for number in range(1, lessons_count + 1)
+        ],
+    }
+
+
+def per_request(schedule):
+    _load_font_set.cache_clear()
+    return ScheduleImageGenerator(prerender=False).generate_schedule_image(schedule)
+
+
+def cold(generator):
+    def render(schedule):
+        generator._text_masks.clear()
+        return generator.generate_schedule_image(schedule)
+    return render
+
+
+def run(name, render, schedules, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for schedule in schedules:
+            render(schedule)
+    elapsed = time.perf_counter() - started
+    per_image = elapsed / (repeat * len(schedules)) * 1000
+    print(f"{name:<16} {per_image:>10.2f} мс/изображение")
+    return per_image
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50, help="сколько раз отрисовать каждый набор")
+    args = parser.parse_args()
+
+    schedules = [make_schedule(count) for count in (0, 2, 4, 6)]
+    plain = ScheduleImageGenerator(prerender=False)
+    shared = ScheduleImageGenerator()
+
+    legacy = run("на запрос", per_request, schedules, args.repeat)
+    run("без шаблонов", plain.generate_schedule_image, schedules, args.repeat)
+    run("общий, холодный", cold(ScheduleImageGenerator()), schedules, args.repeat)
+    current = run("общий", shared.generate_schedule_image, schedules, args.repeat)
+    print(f"\nУскорение относительно отрисовки на запрос: {(1 - current / legacy):.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,10 +2,18 @@ from aiogram import Router, F, Bot
 from aiogram.filters import Command
 from aiogram.types import Message, BufferedInputFile
 from datetime import datetime, timedelta
-import asyncio
 
 from database import get_db
-from services import ScheduleParser, ScheduleFormatter, ScheduleImageGenerator
+from services import ScheduleParser, ScheduleFormatter, ScheduleImageGenerator, get_http_client, get_group_directory, get_schedule_cache, get_image_cache
+from services.parser import schedule_flight
+from services.upstream_guard import get_upstream_guard
+from services.workers import get_worker_pool
+from services.file_ids import get_file_id_cache
+from services.send_dispatcher import get_send_dispatcher
+from services.broadcasts import get_broadcast_worker
+from services.scheduler import get_scheduler
+from services.change_detector import get_change_notifier
+from services.cache_maintenance import get_cache_maintenance
 from utils.logger import logger
 from config import settings
 
@@ -21,29 +29,16 @@ async def cmd_stats(message: Message):
     
     db = get_db()
     
-    # Подсчет статистики
-    total_users = await db.connection.execute("SELECT COUNT(*) FROM users")
-    total_users = (await total_users.fetchone())[0]
-    
-    users_with_group = await db.connection.execute(
-        "SELECT COUNT(*) FROM users WHERE group_name IS NOT NULL"
-    )
-    users_with_group = (await users_with_group.fetchone())[0]
-    
-    users_with_notifications = await db.connection.execute(
-        "SELECT COUNT(*) FROM users WHERE notifications_enabled = 1"
-    )
-    users_with_notifications = (await users_with_notifications.fetchone())[0]
-    
-    cache_size = await db.connection.execute("SELECT COUNT(*) FROM schedule_cache")
-    cache_size = (await cache_size.fetchone())[0]
+    # Подсчет статистики (через соединения чтения, не мешая задаче записи)
+    users = await db.get_user_counts()
+    cache_size, _ = await db.get_cache_size()
     
     stats_text = (
         "📊 <b>Статистика бота</b>\n\n"
-        f"👥 Всего пользователей: {total_users}\n"
-        f"✅ С выбранной группой: {users_with_group}\n"
-        f"🔔 С уведомлениями: {users_with_notifications}\n"
-        f"💾 Записей в кэше: {cache_size}\n"
+        f"👥 Всего пользователей: {users['total']}\n"
+        f"✅ С выбранной группой: {users['with_group']}\n"
+        f"🔔 С уведомлениями: {users['with_notifications']}\n"
+        f"💾 Недель в кэше: {cache_size}\n"
     )
     
     await message.answer(stats_text)
@@ -68,28 +63,44 @@ async def cmd_broadcast(message: Message):
         )
         return
     
-    db = get_db()
+    # Рассылка идёт в фоне и переживает перезапуск бота
+    job_id = await get_broadcast_worker().submit(text, message.from_user.id)
+    job = await get_db().get_broadcast_job(job_id)
+    logger.info(f"Рассылка #{job_id} от {message.from_user.id} поставлена в очередь: {job['total']} получателей")
+    
+    await message.answer(
+        f"📨 Рассылка #{job_id} поставлена в очередь\n\n"
+        f"Получателей: {job['total']}\n"
+        f"Прогресс: /broadcast_status"
+    )
+
+
+@admin_router.message(Command("broadcast_status"))
+async def cmd_broadcast_status(message: Message):
+    """Прогресс рассылки (последней или по номеру)"""
+    if message.from_user.id not in settings.admin_ids_list:
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
     
-    # Получаем всех пользователей
-    users_query = await db.connection.execute("SELECT user_id FROM users")
-    users = await users_query.fetchall()
+    arg = message.text.replace("/broadcast_status", "").strip().lstrip("#")
+    job = await get_db().get_broadcast_job(int(arg) if arg.isdigit() else None)
     
-    sent = 0
-    failed = 0
+    if not job:
+        await message.answer("Рассылок ещё не было")
+        return
     
-    for user in users:
-        try:
-            await message.bot.send_message(user[0], text)
-            sent += 1
-            await asyncio.sleep(0.05)  # Защита от флуда
-        except Exception as e:
-            failed += 1
-            logger.error(f"Ошибка отправки рассылки {user[0]}: {e}")
+    info = get_broadcast_worker().describe(job)
+    statuses = {"pending": "⏳ в очереди", "running": "📤 идёт", "done": "✅ завершена"}
+    percent = info['processed'] / info['total'] if info['total'] else 1.0
+    eta = f"{info['eta'] / 60:.1f} мин" if info['eta'] is not None else "—"
     
     await message.answer(
-        f"✅ Рассылка завершена!\n\n"
-        f"Отправлено: {sent}\n"
-        f"Ошибок: {failed}"
+        f"📨 <b>Рассылка #{info['id']}</b>: {statuses.get(info['status'], info['status'])}\n\n"
+        f"Отправлено: {info['sent']}\n"
+        f"Ошибок: {info['failed']}\n"
+        f"Обработано: {info['processed']} из {info['total']} ({min(percent, 1.0):.0%})\n"
+        f"Скорость: {info['rate']:.1f} сообщ./с\n"
+        f"Осталось: {eta if info['status'] != 'done' else '—'}"
     )
 
 
@@ -102,4 +113,142 @@ async def cmd_clear_cache(message: Message):
     
     db = get_db()
     await db.clear_old_cache(days=0)  # Очистить весь кэш
+    # Копии в памяти иначе продолжат отдаваться до вытеснения
+    get_schedule_cache().invalidate()
+    get_image_cache().clear_memory()
     await message.answer("✅ Кэш расписания очищен")
+
+
+@admin_router.message(Command("jobs"))
+async def cmd_jobs(message: Message):
+    """Фоновые задачи и их ближайшие запуски (только для админов)"""
+    if message.from_user.id not in settings.admin_ids_list:
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
+    
+    lines = ["⏰ <b>Фоновые задачи</b>\n"]
+    for job in get_scheduler().jobs():
+        next_run = f"{job.next_run:%d.%m %H:%M:%S}" if job.next_run else "—"
+        last_run = f"{job.last_run:%d.%m %H:%M}" if job.last_run else "—"
+        lines.append(
+            f"<b>{job.name}</b> (<code>{job.spec}</code>)\n"
+            f"Следующий запуск: {next_run}\n"
+            f"Последний: {last_run}"
+            + (f", {job.last_duration:.1f} с" if job.last_duration is not None else "")
+            + (" — выполняется" if job.running else "")
+            + (f"\nОшибка: {job.last_error}" if job.last_error else "")
+            + "\n"
+        )
+    
+    await message.answer("\n".join(lines))
+
+
+@admin_router.message(Command("perf"))
+async def cmd_perf(message: Message):
+    """Метрики производительности (только для админов)"""
+    if message.from_user.id not in settings.admin_ids_list:
+        await message.answer("⛔ У вас нет доступа к этой команде")
+        return
+    
+    http_stats = get_http_client().get_stats()
+    directory = get_group_directory()
+    flight_stats = schedule_flight.get_stats()
+    cache_stats = get_schedule_cache().get_stats()
+    guard_stats = get_upstream_guard().get_stats()
+    pool_stats = get_worker_pool().get_stats()
+    image_stats = get_image_cache().get_stats()
+    file_id_stats = get_file_id_cache().get_stats()
+    send_stats = get_send_dispatcher().get_stats()
+    last_report = send_stats['last_report']
+    db_stats = get_db().write_stats
+    read_stats = get_db().get_read_stats()
+    profile_stats = get_db().profiles.get_stats()
+    maintenance_stats = get_cache_maintenance().get_stats()
+    change_notifier = get_change_notifier()
+    change_stats = change_notifier.get_stats() if change_notifier else None
+    
+    perf_text = (
+        "⚙️ <b>Метрики производительности</b>\n\n"
+        "🌐 <b>HTTP-клиент</b>\n"
+        f"Запросов: {http_stats['requests']}\n"
+        f"Новых соединений: {http_stats['connections_created']}\n"
+        f"Переиспользовано: {http_stats['connections_reused']} "
+        f"({http_stats['reuse_ratio']:.0%})\n\n"
+        "🗄 <b>База данных</b>\n"
+        f"Изменений: {db_stats['writes']} в {db_stats['commits']} транзакциях "
+        f"(ошибок: {db_stats['errors']}, сбоев фиксации: {db_stats['commit_errors']}, "
+        f"потеряно изменений: {db_stats['lost']})\n"
+        f"Профили в памяти: {profile_stats['entries']:.0f}, попаданий {profile_stats['hit_ratio']:.0%} "
+        f"(промахов: {profile_stats['misses']:.0f})\n"
+        f"Кэш в базе: {maintenance_stats['weeks']:.0f} недель, {maintenance_stats['bytes'] / 1024 / 1024:.1f} МБ; "
+        f"удалено устаревших: {maintenance_stats['expired']:.0f}, вытеснено: {maintenance_stats['evicted']:.0f}, "
+        f"file_id изображений: {maintenance_stats['file_ids']:.0f} "
+        f"(последний проход {maintenance_stats['last_duration']:.2f} с)\n"
+        + (
+            f"Чтений: {read_stats['acquired']:.0f} через {read_stats['size']} соединений, "
+            f"ждали: {read_stats['waited']:.0f} (в среднем {read_stats['avg_wait_ms']:.2f} мс, "
+            f"максимум {read_stats['wait_max'] * 1000:.1f} мс)\n"
+            if read_stats else ""
+        )
+        + "\n"
+        "👥 <b>Справочник групп</b>\n"
+        f"Групп: {len(directory)}\n"
+        f"Обновлений: {directory.stats['refreshes']} (ошибок: {directory.stats['refresh_errors']})\n"
+        f"Поисков: {directory.stats['searches']} (из общего кэша результатов: {directory.stats['result_hits']})\n\n"
+        "🔀 <b>Объединение запросов расписания</b>\n"
+        f"Вызовов: {flight_stats['calls']}\n"
+        f"Загрузок: {flight_stats['executed']}\n"
+        f"Объединено: {flight_stats['coalesced']} ({flight_stats['coalesced_ratio']:.0%})\n"
+        f"В процессе: {flight_stats['in_flight']}\n\n"
+        "💾 <b>Кэш расписания</b>\n"
+        f"Попаданий в память: {cache_stats['memory_hits']}\n"
+        f"Попаданий в БД: {cache_stats['db_hits']}\n"
+        f"Промахов: {cache_stats['misses']}\n"
+        f"Доля попаданий: {cache_stats['hit_ratio']:.0%}\n"
+        f"Устаревших ответов: {cache_stats['stale_hits']} ({cache_stats['stale_ratio']:.0%})\n"
+        f"Фоновых обновлений: {cache_stats['revalidations']} (ошибок: {cache_stats['revalidation_errors']})\n"
+        f"Записей в памяти: {cache_stats['memory_entries']}\n"
+        f"Ответов из старой копии при ошибке сайта: {cache_stats['stale_if_error']}\n"
+        f"Дней при обновлении: без изменений {cache_stats['unchanged_days']}, изменилось {cache_stats['changed_days']}\n\n"
+        "🛡 <b>Защита сайта</b>\n"
+        f"Предохранитель: {guard_stats['breaker_state']} "
+        f"(размыканий: {guard_stats['breaker_opened']}, отклонено: {guard_stats['breaker_rejected']})\n"
+        f"Запросов: {guard_stats['calls']} (ошибок: {guard_stats['failures']}, повторов: {guard_stats['retries']})\n"
+        f"Отброшено из очереди: {guard_stats['shed']}\n\n"
+        "🧵 <b>Пул исполнителей</b>\n"
+        f"Тип: {pool_stats['kind']}, воркеров: {pool_stats['workers']}\n"
+        f"В очереди: {pool_stats['queue_depth']} (максимум: {pool_stats['max_queue_depth']})\n"
+        f"Выполняется: {pool_stats['running']}\n"
+        f"Выполнено: {pool_stats['completed']} (ошибок: {pool_stats['failed']}, отклонено: {pool_stats['rejected']})\n"
+        f"Ожидание: {pool_stats['avg_wait_ms']:.1f} мс, работа: {pool_stats['avg_run_ms']:.1f} мс\n\n"
+        "🖼 <b>Кэш изображений</b>\n"
+        f"Попаданий в память: {image_stats['memory_hits']}\n"
+        f"Попаданий на диск: {image_stats['disk_hits']}\n"
+        f"Отрисовано заново: {image_stats['misses']}\n"
+        f"Доля попаданий: {image_stats['hit_ratio']:.0%}\n"
+        f"Сэкономлено: {image_stats['bytes_saved'] / 1024 / 1024:.1f} МБ\n"
+        f"В памяти: {image_stats['memory_entries']} ({image_stats['memory_bytes'] / 1024 / 1024:.1f} МБ)\n"
+        f"На диске: {image_stats['disk_entries']} ({image_stats['disk_bytes'] / 1024 / 1024:.1f} МБ)\n\n"
+        "📤 <b>Отправка изображений</b>\n"
+        f"По file_id: {file_id_stats['reused']}\n"
+        f"С загрузкой: {file_id_stats['uploaded']}\n"
+        f"Доля без загрузки: {file_id_stats['reuse_ratio']:.0%}\n"
+        f"Повторных загрузок после ошибки: {file_id_stats['fallbacks']}\n\n"
+        "📨 <b>Диспетчер отправки</b>\n"
+        f"Лимит: {settings.SEND_RATE:g} сообщ./с, одновременно: {settings.SEND_MAX_CONCURRENCY}\n"
+        f"Отправлено: {send_stats['sent']:.0f} (ошибок: {send_stats['failed']:.0f})\n"
+        f"RetryAfter: {send_stats['retry_after']:.0f}, пауза: {send_stats['paused_seconds']:.0f} с\n"
+        + (
+            f"Последняя рассылка: {last_report['sent']} за {last_report['elapsed']:.1f} с "
+            f"({last_report['rate']:.1f} сообщ./с)\n"
+            if last_report else ""
+        )
+        + (
+            "\n🔄 <b>Изменения расписания</b>\n"
+            f"Изменённых дней: {change_stats['changed_days']} (подавлено: {change_stats['suppressed']})\n"
+            f"Оповещений групп: {change_stats['alerts']}, сообщений: {change_stats['sent']}\n"
+            if change_stats else ""
+        )
+    )
+    
+    await message.answer(perf_text)
@@ -1,108 +1,336 @@
 from aiogram import Router, F, Bot
 from aiogram.filters import Command
-from aiogram.types import Message, BufferedInputFile
-from datetime import datetime, timedelta
+from aiogram.types import Message
+from datetime import date, datetime, timedelta
 from zoneinfo import ZoneInfo
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
 import asyncio
+import time
 
 from database import get_db
-from services import ScheduleParser, ScheduleFormatter, ScheduleImageGenerator
+from services import get_schedule_cache, ScheduleFormatter, render_schedule_image
+from services.file_ids import send_schedule_photo, get_file_id_cache
+from services.image_cache import schedule_image_key
+from services.send_dispatcher import get_send_dispatcher
+from services.workers import get_worker_pool
 from utils.logger import logger
 from config import settings
 
 
-async def send_night_notifications(bot: Bot):
+# Курсор рассылки в scheduler_runs: до какого момента уведомления уже разосланы
+NIGHT_CURSOR = "night_notifications_cursor"
+
+
+class PreparedNotifications:
+    """Подготовленная рассылка на день: расписания групп (None - не загрузилось)"""
+
+    def __init__(self, day: date):
+        self.day = day
+        self.schedules: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.fetch_time = 0.0
+        self.render_time = 0.0
+        self.rendered = 0
+
+
+# Подготовка, запущенная заранее: (день, задача)
+_warmup: Optional[Tuple[date, asyncio.Task]] = None
+
+
+def format_minute(minute: int) -> str:
+    """Минуты от полуночи -> 'ЧЧ:ММ'"""
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+def _minute_of(moment: datetime) -> int:
+    return moment.hour * 60 + moment.minute
+
+
+def _cron_for(minutes: Iterable[int]) -> str:
+    # Часы и минуты перечисляются отдельно: лишние сочетания дают
+    # срабатывания без подписчиков, это один пустой запрос по индексу
+    minutes = list(minutes)
+    return (
+        f"{','.join(str(m) for m in sorted({minute % 60 for minute in minutes}))} "
+        f"{','.join(str(h) for h in sorted({minute // 60 for minute in minutes}))} * * *"
+    )
+
+
+def night_send_cron() -> str:
+    """Расписание рассылки в формате cron: все варианты времени из настроек"""
+    return _cron_for(settings.notify_minutes_list)
+
+
+def night_warmup_cron() -> str:
+    """Расписание подготовки: за NOTIFY_WARMUP_MINUTES до каждого варианта времени"""
+    return _cron_for((minute - settings.NOTIFY_WARMUP_MINUTES) % (24 * 60) for minute in settings.notify_minutes_list)
+
+
+async def get_subscribers(minute_from: int, minute_to: int):
+    """Подписчики со временем уведомления в (minute_from, minute_to]"""
+    return await get_db().get_users_with_notifications(
+        minute_from, minute_to,
+        include_default=minute_from < settings.notify_default_minute <= minute_to
+    )
+
+
+def _dispatch_windows(start: datetime, end: datetime) -> List[Tuple[date, int, int]]:
+    """Интервал (start, end] по дням: [(день, минута_от, минута_до), ...]"""
+    windows = []
+    day, lower = start.date(), _minute_of(start)
+    while day < end.date():
+        windows.append((day, lower, 24 * 60 - 1))
+        day, lower = day + timedelta(days=1), -1
+    windows.append((day, lower, _minute_of(end)))
+    return [window for window in windows if window[1] < window[2]]
+
+
+async def night_warmup_job():
     """
-    Отправка вечерних уведомлений о расписании на завтра в 19:00 MSK (UTC+4 летом / UTC+3 зимой)
+    Задача планировщика: за NOTIFY_WARMUP_MINUTES до отправки загружает
+    и рисует расписания групп тех, кому уведомление придёт в ближайшие
+    NOTIFY_WARMUP_MINUTES, чтобы в момент отправки осталось только
+    разослать готовое.
     """
-    logger.info("Задача вечерних уведомлений запущена (ежедневно в 19:00 MSK)")
+    global _warmup
+    now = datetime.now(ZoneInfo(settings.TIMEZONE))
+    tomorrow = (now + timedelta(days=1)).date()
+    lower = _minute_of(now)
+    upper = min(lower + settings.NOTIFY_WARMUP_MINUTES, 24 * 60 - 1)
 
-    msk_tz = ZoneInfo("Europe/Moscow")
+    users = await get_subscribers(lower, upper)
+    logger.info(f"Подготовка вечерней рассылки на {tomorrow} ({format_minute(lower)}-{format_minute(upper)}): {len(users)} пользователей")
+    task = asyncio.ensure_future(prepare_night_notifications(tomorrow, users))
+    _warmup = (tomorrow, task)
+    await task
 
-    while True:
+
+async def night_send_job(bot: Bot):
+    """
+    Задача планировщика: вечерние уведомления о расписании на завтра.
+    Срабатывает в каждый вариант времени и рассылает тем, чьё время
+    попало в интервал с прошлого срабатывания (после простоя бота -
+    не дальше NOTIFY_CATCH_UP_MINUTES назад).
+    """
+    global _warmup
+    tz = ZoneInfo(settings.TIMEZONE)
+    now = datetime.now(tz)
+    db = get_db()
+
+    cursor = await db.get_job_last_run(NIGHT_CURSOR)
+    start = now - timedelta(minutes=1)
+    if cursor is not None:
+        start = max(datetime.fromtimestamp(cursor, tz), now - timedelta(minutes=settings.NOTIFY_CATCH_UP_MINUTES))
+    # Курсор сохраняется до отправки: после падения посреди рассылки она не повторяется
+    await db.set_job_last_run(NIGHT_CURSOR, int(now.timestamp()))
+
+    prepared = None
+    if _warmup is not None:
         try:
-            now = datetime.now(msk_tz)
-            current_time_str = now.strftime("%Y-%m-%d %H:%M:%S %Z")
+            prepared = await _warmup[1]
+        except Exception as e:
+            logger.error(f"Подготовка рассылки не удалась, всё будет загружено сейчас: {e}")
+    _warmup = None
 
-            logger.debug(f"Проверка времени (MSK): {current_time_str}")
+    for day, minute_from, minute_to in _dispatch_windows(start, now):
+        users = await get_subscribers(minute_from, minute_to)
+        logger.info(
+            f"Вечерняя рассылка за {format_minute(minute_from + 1)}-{format_minute(minute_to)} MSK: "
+            f"{len(users)} пользователей"
+        )
+        tomorrow = day + timedelta(days=1)
+        await run_night_notifications(bot, tomorrow, users, prepared if prepared is not None and prepared.day == tomorrow else None)
 
-            if now.hour == 18 and now.minute == 0:
-                logger.info(f"[{current_time_str}] ВРЕМЯ СРАБОТАЛО (19:00 MSK) — начинаем рассылку")
 
-                db = get_db()
-                users = await db.get_users_with_notifications()
+async def change_watch_job():
+    """
+    Задача планировщика: обновить текущую неделю (и следующую, если завтра
+    уже она) для групп с подписчиками. Изменения находит кэш расписания
+    по отпечаткам дней, рассылку делает services.change_detector.
+    """
+    today = datetime.now(ZoneInfo(settings.TIMEZONE)).date()
+    days = sorted({today, today + timedelta(days=1)})
+    groups = list(group_subscribers(await get_db().get_users_with_notifications()))
 
-                if not users:
-                    logger.info("Нет пользователей с включёнными уведомлениями → рассылка пропущена")
-                    await asyncio.sleep(86000)
-                    continue
+    schedule_cache = get_schedule_cache()
+    started = time.perf_counter()
+    # Одна проверка на неделю: завтра обычно в той же неделе, что и сегодня
+    weeks = {(group_name, day - timedelta(days=day.weekday())) for group_name in groups for day in days}
+    refreshed = await _bounded_gather(
+        weeks,
+        lambda week: schedule_cache.refresh_week(*week),
+        settings.UPSTREAM_MAX_CONCURRENCY,
+    )
+    logger.info(
+        f"Проверка изменений: групп {len(groups)}, недель обновлено "
+        f"{sum(1 for result in refreshed.values() if result)} из {len(weeks)} "
+        f"за {time.perf_counter() - started:.1f} с"
+    )
 
-                logger.info(f"Начинаем рассылку для {len(users)} пользователей")
 
-                async with ScheduleParser() as parser:
-                    image_generator = ScheduleImageGenerator()
+async def prepare_night_notifications(
+    day: date,
+    users: Iterable[Any],
+    prepared: Optional[PreparedNotifications] = None,
+) -> PreparedNotifications:
+    """
+    Подготовка рассылки для users: расписание и изображение - один раз
+    на группу. Уже подготовленные группы пропускаются, не загрузившиеся
+    пробуются снова.
+    """
+    prepared = prepared or PreparedNotifications(day)
+    # Группы, которых ещё нет или которые не загрузились в прошлый раз
+    groups = [group_name for group_name in group_subscribers(users) if prepared.schedules.get(group_name) is None]
+    if not groups:
+        return prepared
 
-                    for user in users:
-                        user_id = user['user_id']
-                        group_name = user['group_name']
+    # 1. Загрузка: не больше запросов одновременно, чем пропускает защита сайта
+    started = time.perf_counter()
+    schedule_cache = get_schedule_cache()
+    schedules = await _bounded_gather(
+        groups,
+        lambda group_name: schedule_cache.get_day(group_name, day),
+        settings.UPSTREAM_MAX_CONCURRENCY,
+    )
+    fetched_at = time.perf_counter()
 
-                        logger.debug(f"Обработка пользователя {user_id} (группа {group_name})")
+    # 2. Отрисовка: только то, чего ещё нет в Telegram; не больше задач, чем воркеров
+    to_render = {
+        group_name: schedule for group_name, schedule in schedules.items()
+        if schedule is not None and schedule.get("lessons")
+        and await get_file_id_cache().get(schedule_image_key(schedule)) is None
+    }
+    await _bounded_gather(
+        to_render,
+        lambda group_name: render_schedule_image(to_render[group_name]),
+        get_worker_pool().max_workers,
+    )
+    rendered_at = time.perf_counter()
 
-                        try:
-                            tomorrow = datetime.now(msk_tz) + timedelta(days=1)
-                            tomorrow_str = tomorrow.strftime("%Y-%m-%d")
+    prepared.schedules.update(schedules)
+    prepared.fetch_time += fetched_at - started
+    prepared.render_time += rendered_at - fetched_at
+    prepared.rendered += len(to_render)
+    logger.info(
+        f"Подготовлено уведомлений на {day}: групп {len(groups)}, "
+        f"загружено {sum(1 for schedule in schedules.values() if schedule is not None)}, "
+        f"отрисовано {len(to_render)}; "
+        f"загрузка {fetched_at - started:.1f} с, отрисовка {rendered_at - fetched_at:.1f} с"
+    )
+    return prepared
 
-                            schedule = await parser.get_schedule(
-                                group_name,
-                                date=tomorrow
-                            )
 
-                            if schedule.get("lessons"):
-                                image_bytes = image_generator.generate_schedule_image(schedule)
+async def run_night_notifications(
+    bot: Bot,
+    tomorrow: date,
+    users: List[Any],
+    prepared: Optional[PreparedNotifications] = None,
+):
+    """
+    Рассылка расписания на завтра пользователям users:
+    1-2. загрузка и отрисовка - один раз на группу (обычно уже сделаны
+         при подготовке; здесь догружаются только новые группы);
+    3. отправка подписчикам группы (изображение загружается один раз,
+       дальше уходит по file_id).
+    Число загрузок и отрисовок зависит от числа групп, а не пользователей.
+    """
+    if not users:
+        logger.info("Нет пользователей с уведомлениями в это время → рассылка пропущена")
+        return
 
-                                photo = BufferedInputFile(
-                                    image_bytes.read(),
-                                    filename=f"night_schedule_{schedule.get('date', tomorrow_str)}.png"
-                                )
+    subscribers = group_subscribers(users)
+    logger.info(f"Начинаем рассылку для {len(users)} пользователей из {len(subscribers)} групп")
 
-                                caption = (
-                                    "🌙 <b>Добрый вечер!</b>\n\n"
-                                    f"📅 Расписание на завтра ({schedule.get('date', tomorrow_str)})\n"
-                                    f"👥 Группа: {group_name}\n\n"
-                                    "Готовьтесь к занятиям заранее! 💪"
-                                )
+    started = time.perf_counter()
+    warm = prepared is not None and prepared.day == tomorrow
+    prepared = await prepare_night_notifications(tomorrow, users, prepared if warm else None)
+    schedules = prepared.schedules
+    rendered_at = time.perf_counter()
+    if warm:
+        logger.info(f"Подготовка заранее: загрузка {prepared.fetch_time:.1f} с, отрисовка {prepared.render_time:.1f} с")
 
-                                await bot.send_photo(
-                                    user_id,
-                                    photo=photo,
-                                    caption=caption
-                                )
+    # 3. Отправка подписчикам через общий диспетчер. Сначала по одному
+    # подписчику на группу (загрузка изображения), затем остальные (по file_id)
+    ready = {group_name: user_ids for group_name, user_ids in subscribers.items() if schedules.get(group_name) is not None}
+    skipped = sum(len(user_ids) for group_name, user_ids in subscribers.items() if group_name not in ready)
+    tomorrow_str = tomorrow.strftime("%Y-%m-%d")
 
-                                logger.info(f"Отправлено вечернее уведомление для {user_id}")
+    def jobs(first: bool):
+        for group_name, user_ids in ready.items():
+            for user_id in (user_ids[:1] if first else user_ids[1:]):
+                yield user_id, _send_job(bot, user_id, group_name, schedules[group_name], tomorrow_str)
 
-                                await asyncio.sleep(0.7)
+    dispatcher = get_send_dispatcher()
+    first = await dispatcher.deliver(jobs(first=True), name="вечерние уведомления (первые в группе)")
+    rest = await dispatcher.deliver(jobs(first=False), name="вечерние уведомления")
+    finished_at = time.perf_counter()
 
-                            else:
-                                await bot.send_message(
-                                    user_id,
-                                    "🌙 Добрый вечер!\n\n"
-                                    f"Завтра ({tomorrow_str}) занятий нет. Отдыхай! 😴"
-                                )
-                                logger.info(f"Отправлено сообщение о выходном для {user_id}")
-                                await asyncio.sleep(0.7)
+    sent = first["sent"] + rest["sent"]
+    send_time = finished_at - rendered_at
+    logger.info(
+        f"Рассылка завершена: отправлено {sent}, ошибок {first['failed'] + rest['failed']}, "
+        f"пропущено {skipped} (расписание не загрузилось); "
+        f"групп {len(subscribers)}, отрисовано {prepared.rendered}; "
+        f"подготовка в момент отправки {rendered_at - started:.1f} с, "
+        f"отправка {send_time:.1f} с ({sent / send_time if send_time > 0 else 0:.1f} сообщ./с)"
+    )
 
-                        except Exception as inner_e:
-                            logger.error(
-                                f"Ошибка при обработке пользователя {user_id} "
-                                f"(группа {group_name}): {inner_e}"
-                            )
 
-                logger.info("Рассылка завершена")
-                await asyncio.sleep(86000)
+def group_subscribers(users: Iterable[Any]) -> Dict[str, List[int]]:
+    """Подписчики по группам: {группа: [user_id, ...]}"""
+    subscribers: Dict[str, List[int]] = {}
+    for user in users:
+        subscribers.setdefault(user['group_name'], []).append(user['user_id'])
+    return subscribers
 
-            else:
-                await asyncio.sleep(60)
 
-        except Exception as e:
-            logger.error(f"Глобальная ошибка в цикле уведомлений: {e}")
-            await asyncio.sleep(60)
\ No newline at end of file
+async def _bounded_gather(
+    keys: Iterable[Hashable],
+    func: Callable[[Any], Awaitable[Any]],
+    limit: int,
+) -> Dict[Any, Optional[Any]]:
+    """func(key) для всех ключей, не больше limit одновременно; при ошибке - None"""
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(key: Hashable):
+        async with semaphore:
+            try:
+                return await func(key)
+            except Exception as e:
+                logger.error(f"Ошибка подготовки уведомлений для группы {key}: {e}")
+                return None
+
+    keys = list(keys)
+    results = await asyncio.gather(*(run(key) for key in keys))
+    return dict(zip(keys, results))
+
+
+def _send_job(bot: Bot, user_id: int, group_name: str, schedule: Dict[str, Any], tomorrow_str: str):
+    return lambda: _send_to_user(bot, user_id, group_name, schedule, tomorrow_str)
+
+
+async def _send_to_user(bot: Bot, user_id: int, group_name: str, schedule: Dict[str, Any], tomorrow_str: str):
+    if schedule.get("lessons"):
+        caption = (
+            "🌙 <b>Добрый вечер!</b>\n\n"
+            f"📅 Расписание на завтра ({schedule.get('date', tomorrow_str)})\n"
+            f"👥 Группа: {group_name}\n\n"
+            "Готовьтесь к занятиям заранее! 💪"
+            f"{ScheduleFormatter.format_stale_note(schedule)}"
+        )
+
+        # Одногруппники получают одно и то же изображение:
+        # оно загружается один раз, дальше уходит по file_id
+        await send_schedule_photo(
+            lambda photo: bot.send_photo(user_id, photo=photo, caption=caption),
+            schedule,
+            filename=f"night_schedule_{schedule.get('date', tomorrow_str)}.png"
+        )
+        logger.info(f"Отправлено вечернее уведомление для {user_id}")
+
+    else:
+        await bot.send_message(
+            user_id,
+            "🌙 Добрый вечер!\n\n"
+            f"Завтра ({tomorrow_str}) занятий нет. Отдыхай! 😴"
+        )
+        logger.info(f"Отправлено сообщение о выходном для {user_id}")
@@ -1,11 +1,12 @@
 """Обработчики расписания"""
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, BufferedInputFile, InputMediaPhoto
+from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from datetime import datetime, timedelta, timezone
 from bot.keyboards import inline
 from database import get_db
-from services import ScheduleParser, ScheduleFormatter, ScheduleImageGenerator
+from services import get_schedule_cache, ScheduleFormatter
+from services.file_ids import send_schedule_photo, send_schedule_album
 from utils.logger import logger
 
 router = Router()
@@ -87,28 +88,24 @@ async def show_day_schedule(event: Message | CallbackQuery):
         # Для message из обычного текста оставляем message как есть
    
     try:
-        async with ScheduleParser() as parser:
-            schedule_data = await parser.get_schedule(group_name, date=date)
+        schedule_data = await get_schedule_cache().get_day(group_name, date)
        
-        image_generator = ScheduleImageGenerator()
-        image_bytes = image_generator.generate_schedule_image(schedule_data)
+        caption = f"📅 Расписание на {schedule_data.get('date', '')}\n👥 Группа: {group_name}"
+        caption += ScheduleFormatter.format_stale_note(schedule_data)
        
-        photo = BufferedInputFile(
-            image_bytes.read(),
+        await send_schedule_photo(
+            lambda photo: message.answer_photo(
+                photo=photo,
+                caption=caption,
+                reply_markup=inline.get_back_button("menu_schedule")
+            ),
+            schedule_data,
             filename=f"schedule_{schedule_data.get('date', 'unknown')}.png"
         )
        
-        caption = f"📅 Расписание на {schedule_data.get('date', '')}\n👥 Группа: {group_name}"
-       
-        # Удаляем сообщение с лоадером
+        # Удаляем сообщение с лоадером (после отправки, чтобы при ошибке удалить его в except)
         await message.delete()
        
-        await message.answer_photo(
-            photo=photo,
-            caption=caption,
-            reply_markup=inline.get_back_button("menu_schedule")
-        )
-       
     except Exception as e:
         logger.error(f"Ошибка при генерации расписания на день: {e}")
         await message.delete()
@@ -144,36 +141,31 @@ async def show_week_schedule(event: Message | CallbackQuery):
         await message.answer(loader_text)
    
     try:
-        async with ScheduleParser() as parser:
-            week_data = await parser.get_week_schedule(group_name)
-       
-        image_generator = ScheduleImageGenerator()
+        week_data = await get_schedule_cache().get_week(group_name)
        
-        media_group = []
+        album = []
        
         for day_schedule in week_data:
             date_str = day_schedule.get('date', '—')
             day_of_week = day_schedule.get('day_of_week', '—')
            
             caption = f"📅 {date_str} — {day_of_week}\n👥 Группа: {group_name}"
+            caption += ScheduleFormatter.format_stale_note(day_schedule)
            
-            image_bytes = image_generator.generate_schedule_image(day_schedule)
-           
-            media_group.append(
-                InputMediaPhoto(
-                    media=BufferedInputFile(
-                        image_bytes.read(),
-                        filename=f"schedule_{date_str}.png"
-                    ),
-                    caption=caption
-                )
-            )
+            album.append({
+                "schedule": day_schedule,
+                "caption": caption,
+                "filename": f"schedule_{date_str}.png",
+            })
+       
+        if album:
+            # Уже загруженные дни уходят по file_id, остальные рисуются в пуле
+            await send_schedule_album(lambda media: message.answer_media_group(media=media), album)
        
         # Удаляем лоадер
         await message.delete()
        
-        if media_group:
-            await message.answer_media_group(media=media_group)
+        if album:
             await message.answer(
                 "📋 Расписание на неделю загружено!",
                 reply_markup=inline.get_back_button("menu_schedule")
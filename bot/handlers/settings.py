@@ -5,12 +5,38 @@ from aiogram.fsm.context import FSMContext
 
 from bot.keyboards import inline
 from bot.states import SettingsStates
+from bot.handlers.notification import format_minute
+from config import settings
 from database import get_db
-from services import ScheduleParser
+from services import get_group_directory
+from services.group_directory import GroupResults
 from utils.logger import logger
 
 router = Router()
 
+GROUPS_PER_PAGE = 5
+
+
+def _settings_text(group_name: str | None, notifications_enabled: bool, notify_minute: int) -> str:
+    return (
+        "⚙️ <b>Настройки</b>\n\n"
+        f"👥 Группа: <b>{group_name or 'не выбрана'}</b>\n"
+        f"🔔 Уведомления: <b>{'включены' if notifications_enabled else 'выключены'}</b>\n"
+        f"🕒 Время уведомлений: <b>{format_minute(notify_minute)}</b>\n\n"
+        f"Выбери, что хочешь изменить:"
+    )
+
+
+async def _notify_minute(user_id: int) -> int:
+    notify_minute = await get_db().get_notify_minute(user_id)
+    return settings.notify_default_minute if notify_minute is None else notify_minute
+
+
+async def _remember_groups(state: FSMContext, query: str, groups: GroupResults):
+    """Состояние выбора группы: запрос, handle результата и страница (без самого списка)"""
+    await state.set_data({"group_query": query, "group_results": groups.handle, "group_page": 0})
+    await state.set_state(SettingsStates.changing_group)
+
 
 @router.callback_query(F.data == "menu_settings")
 @router.message(F.text == "⚙️ Настройки")
@@ -23,13 +49,7 @@ async def menu_settings(event: Message | CallbackQuery):
     db = get_db()
     group_name = await db.get_user_group(user_id)
     notifications_enabled = await db.get_notifications_enabled(user_id)
-    
-    settings_text = (
-        "⚙️ <b>Настройки</b>\n\n"
-        f"👥 Группа: <b>{group_name or 'не выбрана'}</b>\n"
-        f"🔔 Уведомления: <b>{'включены' if notifications_enabled else 'выключены'}</b>\n\n"
-        f"Выбери, что хочешь изменить:"
-    )
+    settings_text = _settings_text(group_name, notifications_enabled, await _notify_minute(user_id))
     
     if is_callback:
         await message.edit_text(
@@ -50,8 +70,7 @@ async def settings_group(callback: CallbackQuery, state: FSMContext):
     await callback.answer("Загружаю список групп...")
     
     try:
-        async with ScheduleParser() as parser:
-            groups = await parser.search_groups()
+        groups = await get_group_directory().find()
         
         if not groups:
             await callback.answer(
@@ -60,13 +79,12 @@ async def settings_group(callback: CallbackQuery, state: FSMContext):
             )
             return
         
-        await state.update_data(groups=groups, page=0)
-        await state.set_state(SettingsStates.changing_group)
+        await _remember_groups(state, "", groups)
         
         await callback.message.edit_text(
             "👥 <b>Выбор группы</b>\n\n"
             "Выбери свою группу из списка или используй поиск:",
-            reply_markup=inline.get_groups_keyboard(groups, page=0)
+            reply_markup=inline.get_groups_keyboard(groups, page=0, per_page=GROUPS_PER_PAGE)
         )
         
     except Exception as e:
@@ -82,13 +100,15 @@ async def groups_pagination(callback: CallbackQuery, state: FSMContext):
     """Пагинация списка групп"""
     page = int(callback.data.split(":")[1])
     
+    # В состоянии только запрос и handle результата - сам список берётся из справочника
     data = await state.get_data()
-    groups = data.get("groups", [])
+    groups = await get_group_directory().resolve(data.get("group_query", ""), data.get("group_results"))
+    page = max(min(page, (len(groups) - 1) // GROUPS_PER_PAGE), 0)
     
-    await state.update_data(page=page)
+    await state.update_data(group_page=page)
     
     await callback.message.edit_reply_markup(
-        reply_markup=inline.get_groups_keyboard(groups, page=page)
+        reply_markup=inline.get_groups_keyboard(groups, page=page, per_page=GROUPS_PER_PAGE)
     )
     await callback.answer()
 
@@ -148,8 +168,7 @@ async def process_group_search(message: Message, state: FSMContext):
     loading_msg = await message.answer("🔍 Ищу группы...")
     
     try:
-        async with ScheduleParser() as parser:
-            groups = await parser.search_groups(query)
+        groups = await get_group_directory().find(query)
         
         await loading_msg.delete()
         
@@ -161,13 +180,12 @@ async def process_group_search(message: Message, state: FSMContext):
             )
             return
         
-        await state.update_data(groups=groups, page=0)
-        await state.set_state(SettingsStates.changing_group)
+        await _remember_groups(state, query, groups)
         
         await message.answer(
             f"🔍 Найдено групп: <b>{len(groups)}</b>\n\n"
             f"Выбери свою группу:",
-            reply_markup=inline.get_groups_keyboard(groups, page=0)
+            reply_markup=inline.get_groups_keyboard(groups, page=0, per_page=GROUPS_PER_PAGE)
         )
         
     except Exception as e:
@@ -183,18 +201,15 @@ async def toggle_notifications(callback: CallbackQuery):
     """Переключение уведомлений"""
     db = get_db()
     new_state = await db.toggle_notifications(callback.from_user.id)
+    if new_state is None:
+        await callback.answer("❌ Сначала выберите группу", show_alert=True)
+        return
     
     state_text = "включены ✅" if new_state else "выключены ❌"
     await callback.answer(f"Уведомления {state_text}")
     
     group_name = await db.get_user_group(callback.from_user.id)
-    
-    settings_text = (
-        "⚙️ <b>Настройки</b>\n\n"
-        f"👥 Группа: <b>{group_name or 'не выбрана'}</b>\n"
-        f"🔔 Уведомления: <b>{'включены' if new_state else 'выключены'}</b>\n\n"
-        f"Выбери, что хочешь изменить:"
-    )
+    settings_text = _settings_text(group_name, new_state, await _notify_minute(callback.from_user.id))
     
     await callback.message.edit_text(
         settings_text,
@@ -204,6 +219,51 @@ async def toggle_notifications(callback: CallbackQuery):
     logger.info(f"Пользователь {callback.from_user.id} изменил уведомления: {new_state}")
 
 
+@router.callback_query(F.data == "settings_notify_time")
+async def settings_notify_time(callback: CallbackQuery):
+    """Выбор времени вечерних уведомлений"""
+    current = await _notify_minute(callback.from_user.id)
+    
+    await callback.message.edit_text(
+        "🕒 <b>Время уведомлений</b>\n\n"
+        "Во сколько присылать расписание на завтра (MSK)?",
+        reply_markup=inline.get_notify_time_keyboard(settings.notify_minutes_list, current)
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("notify_time:"))
+async def select_notify_time(callback: CallbackQuery):
+    """Сохранение времени уведомлений"""
+    minute = int(callback.data.split(":", 1)[1])
+    
+    if minute not in settings.notify_minutes_list:
+        await callback.answer("❌ Это время больше недоступно", show_alert=True)
+        return
+    
+    # Время по умолчанию хранится как NULL: при смене значения по умолчанию оно меняется для всех
+    db = get_db()
+    saved = await db.set_notify_minute(
+        callback.from_user.id,
+        None if minute == settings.notify_default_minute else minute
+    )
+    if not saved:
+        await callback.answer("❌ Сначала выберите группу", show_alert=True)
+        return
+    
+    await callback.answer(f"✅ Уведомления будут приходить в {format_minute(minute)}")
+    
+    group_name = await db.get_user_group(callback.from_user.id)
+    notifications_enabled = await db.get_notifications_enabled(callback.from_user.id)
+    
+    await callback.message.edit_text(
+        _settings_text(group_name, notifications_enabled, minute),
+        reply_markup=inline.get_settings_menu(notifications_enabled)
+    )
+    
+    logger.info(f"Пользователь {callback.from_user.id} выбрал время уведомлений {format_minute(minute)}")
+
+
 @router.callback_query(F.data == "back_to_settings")
 async def back_to_settings(callback: CallbackQuery, state: FSMContext):
     """Возврат в настройки"""
@@ -1,7 +1,7 @@
 """Inline клавиатуры"""
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from typing import List, Dict
+from typing import List, Dict, Sequence
 
 
 def get_main_menu() -> InlineKeyboardMarkup:
@@ -50,6 +50,9 @@ def get_settings_menu(notifications_enabled: bool = True) -> InlineKeyboardMarku
     builder.row(
         InlineKeyboardButton(text=notification_text, callback_data="settings_notifications")
     )
+    builder.row(
+        InlineKeyboardButton(text="🕒 Время уведомлений", callback_data="settings_notify_time")
+    )
     builder.row(
         InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_main")
     )
@@ -57,12 +60,40 @@ def get_settings_menu(notifications_enabled: bool = True) -> InlineKeyboardMarku
     return builder.as_markup()
 
 
-def get_groups_keyboard(groups: List[Dict[str, str]], page: int = 0, per_page: int = 5) -> InlineKeyboardMarkup:
+def get_notify_time_keyboard(options: List[int], current: int, per_row: int = 3) -> InlineKeyboardMarkup:
+    """
+    Клавиатура выбора времени уведомлений
+    
+    Args:
+        options: Варианты времени в минутах от полуночи
+        current: Текущее время пользователя
+        per_row: Кнопок в ряду
+    """
+    builder = InlineKeyboardBuilder()
+    
+    buttons = [
+        InlineKeyboardButton(
+            text=f"{'✅ ' if minute == current else ''}{minute // 60:02d}:{minute % 60:02d}",
+            callback_data=f"notify_time:{minute}"
+        )
+        for minute in options
+    ]
+    for i in range(0, len(buttons), per_row):
+        builder.row(*buttons[i:i + per_row])
+    
+    builder.row(
+        InlineKeyboardButton(text="◀️ Назад", callback_data="back_to_settings")
+    )
+    
+    return builder.as_markup()
+
+
+def get_groups_keyboard(groups: Sequence[Dict[str, str]], page: int = 0, per_page: int = 5) -> InlineKeyboardMarkup:
     """
     Клавиатура со списком групп
     
     Args:
-        groups: Список групп
+        groups: Список групп (или результат поиска справочника)
         page: Номер страницы
         per_page: Групп на странице
     """
@@ -14,6 +14,18 @@ class Settings(BaseSettings):
     
     # База данных
     DATABASE_PATH: str = "data/bot.db"
+    DB_CACHE_SIZE_KB: int = 16384           # кэш страниц SQLite
+    DB_MMAP_SIZE_MB: int = 64               # чтение файла через отображение в память (0 - выключено)
+    DB_SYNCHRONOUS: str = "NORMAL"          # в режиме WAL безопасно; FULL - fsync на каждую фиксацию
+    DB_WRITE_BATCH_SIZE: int = 200          # изменений в одной транзакции
+    DB_WRITE_FLUSH_MS: float = 50           # максимальная задержка фиксации
+    DB_READ_POOL_SIZE: int = -1             # соединений только для чтения (0 - читать через основное, -1 - по числу ядер)
+    USER_CACHE_SIZE: int = 50000            # профилей пользователей в памяти (группа и уведомления)
+    
+    # Состояния FSM (выбор группы): "sqlite" - переживают перезапуск, "memory" - только в памяти
+    FSM_STORAGE: str = "sqlite"
+    FSM_CACHE_SIZE: int = 10000             # состояний в памяти при FSM_STORAGE=sqlite
+    FSM_STATE_TTL_DAYS: float = 7           # брошенные состояния удаляются при обслуживании кэша
     
     # Логирование
     LOG_LEVEL: str = "INFO"
@@ -23,6 +35,84 @@ class Settings(BaseSettings):
     SCHEDULE_BASE_URL: str = "https://lk.tolgas.ru/public-schedule"
     SCHEDULE_SEARCH_URL: str = "https://lk.tolgas.ru/public-schedule/search/"
     
+    # Движок разбора HTML расписания: "lxml" (быстрый) или "bs4" (BeautifulSoup)
+    PARSER_ENGINE: str = "lxml"
+    
+    # Пул исполнителей для разбора HTML и отрисовки: "thread" или "process"
+    WORKER_POOL_KIND: str = "thread"
+    WORKER_POOL_SIZE: int = 0               # 0 = по числу ядер
+    WORKER_POOL_MAX_QUEUE: int = 64
+    
+    # Кэш готовых изображений расписания (0 МБ на диске = только память)
+    IMAGE_CACHE_MEMORY_MB: float = 32
+    IMAGE_CACHE_DISK_MB: float = 256
+    IMAGE_CACHE_DIR: str = "data/images"
+    
+    # Вечерние уведомления: время по умолчанию и варианты на выбор в настройках (MSK, ЧЧ:ММ)
+    NOTIFY_DEFAULT_TIME: str = "18:00"
+    NOTIFY_TIMES: str = "17:00,18:00,19:00,20:00,21:00,22:00"
+    # За сколько минут до вечерней рассылки готовить расписания и изображения
+    NOTIFY_WARMUP_MINUTES: int = 30
+    # Если бот был выключен во время рассылки - отправить после старта, если опоздание не больше
+    NOTIFY_CATCH_UP_MINUTES: int = 120
+    
+    # Уведомления об изменениях расписания
+    CHANGE_ALERT_DAYS: int = 7              # сообщать об изменениях на сегодня и N дней вперёд
+    CHANGE_ALERT_DELAY: float = 5.0         # сколько секунд копить изменения группы перед отправкой
+    CHANGE_WATCH_CRON: str = ""             # проверка групп подписчиков, напр. "0 7-22 * * *" ("" = только при запросах)
+    
+    # Обслуживание кэша расписания в SQLite (cron: минута час день месяц день_недели)
+    CACHE_CLEANUP_CRON: str = "*/15 * * * *"  # удаление устаревших и лишних недель небольшими пачками
+    CACHE_RETENTION_DAYS: float = 14        # неделя удаляется, если не обновлялась столько дней
+    CACHE_MAX_WEEKS: int = 20000            # записей недель в кэше (0 - без ограничения)
+    CACHE_MAX_MB: float = 64                # объём данных кэша (0 - без ограничения)
+    CACHE_EVICT_BATCH: int = 200            # недель за одно удаление
+    DB_OPTIMIZE_CRON: str = "30 4 * * *"    # PRAGMA optimize и возврат свободных страниц
+    DB_VACUUM_FREE_RATIO: float = 0.3       # полный VACUUM (однократный переход на auto_vacuum) при такой доле свободных страниц
+    
+    # Исходящие сообщения (рассылки и уведомления)
+    SEND_RATE: float = 25.0                 # сообщений в секунду на всего бота
+    SEND_PER_CHAT_INTERVAL: float = 1.0     # не чаще раза в N секунд в один чат
+    SEND_MAX_CONCURRENCY: int = 10          # одновременных запросов к Telegram
+    SEND_MAX_RETRIES: int = 3               # повторов после RetryAfter
+    BROADCAST_BATCH_SIZE: int = 200         # пользователей в пачке рассылки
+    
+    # HTTP-клиент (общий пул соединений к сайту расписания)
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_LIMIT_PER_HOST: int = 10
+    HTTP_KEEPALIVE_TIMEOUT: float = 60.0
+    HTTP_DNS_CACHE_TTL: int = 600
+    HTTP_TIMEOUT: float = 20.0
+    
+    # Справочник групп (обновление в фоне, секунды)
+    GROUPS_REFRESH_INTERVAL: int = 3600
+    GROUPS_RETRY_INTERVAL: int = 60
+    
+    # Часовой пояс расписания
+    TIMEZONE: str = "Europe/Moscow"
+    
+    # Кэш расписания
+    SCHEDULE_CACHE_MEMORY_SIZE: int = 2000
+    # TTL по датам: сегодня/завтра, ближайшие две недели, дальше; прошедшие дни (0 = бессрочно)
+    CACHE_TTL_NEAR_MINUTES: float = 15
+    CACHE_TTL_SOON_MINUTES: float = 60
+    CACHE_TTL_FAR_MINUTES: float = 360
+    CACHE_TTL_PAST_DAYS: float = 0
+    # Сколько можно отдавать просроченную запись, пока идёт фоновое обновление
+    CACHE_MAX_STALE_HOURS: float = 168
+    
+    # Защита сайта расписания
+    UPSTREAM_RATE: float = 5.0              # запросов в секунду в среднем
+    UPSTREAM_BURST: int = 10                # допустимый всплеск
+    UPSTREAM_MAX_CONCURRENCY: int = 4       # одновременных запросов
+    UPSTREAM_MAX_WAIT: float = 5.0          # сколько запрос может ждать очереди, с
+    UPSTREAM_RETRIES: int = 2
+    UPSTREAM_RETRY_BUDGET: float = 0.2      # доля повторов от всех запросов
+    BREAKER_FAILURE_THRESHOLD: int = 5      # ошибок подряд до размыкания
+    BREAKER_SLOW_CALL_SECONDS: float = 8.0  # ответ медленнее - считается медленным
+    BREAKER_SLOW_CALL_THRESHOLD: int = 5    # медленных ответов подряд до размыкания
+    BREAKER_RESET_TIMEOUT: float = 30.0     # через сколько секунд пробовать снова
+    
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -35,6 +125,22 @@ class Settings(BaseSettings):
         if not self.ADMIN_IDS:
             return []
         return [int(admin_id.strip()) for admin_id in self.ADMIN_IDS.split(",")]
+    
+    @property
+    def notify_default_minute(self) -> int:
+        """Время уведомлений по умолчанию в минутах от полуночи"""
+        hours, minutes = self.NOTIFY_DEFAULT_TIME.strip().split(":")
+        return int(hours) * 60 + int(minutes)
+    
+    @property
+    def notify_minutes_list(self) -> List[int]:
+        """Варианты времени уведомлений в минутах от полуночи (включая время по умолчанию)"""
+        minutes = {self.notify_default_minute}
+        for item in self.NOTIFY_TIMES.split(","):
+            if item.strip():
+                hours, mins = item.strip().split(":")
+                minutes.add(int(hours) * 60 + int(mins))
+        return sorted(minutes)
 
 
 # Создаем глобальный объект настроек
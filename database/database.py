@@ -1,32 +1,267 @@
 """Работа с базой данных"""
+import asyncio
+import os
+import time
 import aiosqlite
-from typing import Optional, Dict, Any
-from datetime import datetime
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, AsyncIterator, Awaitable, Callable
+from datetime import datetime, timedelta
 import json
+from config import settings
 from utils.logger import logger
+from .profiles import UserProfileCache, profile_from_row
+from .schedule_codec import CacheFormatError, WeekDays, day_of, decode_week, encode_week, week_of
 
 
 class Database:
-    """Упрощенная база данных для хранения настроек пользователей и кэша расписания"""
+    """
+    Упрощенная база данных для хранения настроек пользователей и кэша расписания.
     
-    def __init__(self, db_path: str):
+    Соединение работает в режиме WAL с настроенными pragma. Все изменения
+    идут через одну задачу записи: она выполняет запросы по очереди в общей
+    транзакции и фиксирует её раз в write_batch_size запросов или не позже
+    чем через write_flush_interval секунд после первого незафиксированного.
+    Вызов записи ждёт только выполнения запроса, а не fsync; durable=True
+    ждёт фиксации. Если фиксация не удалась, транзакция откатывается:
+    durable-вызовы получают исключение, остальные изменения теряются
+    (ошибка в логе, счётчик lost в write_stats и /perf).
+    
+    Чтение идёт через пул из read_pool_size соединений только для чтения
+    (каждое в своём потоке), поэтому запросы обработчиков выполняются
+    параллельно друг с другом и с записью. Читатели видят только
+    зафиксированные данные: настройки пользователя записываются с
+    durable=True, а кэш расписания может отставать на write_flush_interval.
+    
+    Профили пользователей (группа, уведомления, время) читаются из кэша
+    в памяти: он загружается при подключении и обновляется методами записи.
+    """
+    
+    def __init__(
+        self,
+        db_path: str,
+        cache_size_kb: int = 16384,
+        mmap_size_mb: int = 64,
+        synchronous: str = "NORMAL",
+        write_batch_size: int = 200,
+        write_flush_interval: float = 0.05,
+        read_pool_size: int = 4,
+        profile_cache_size: int = 50000,
+    ):
         self.db_path = db_path
         self.connection: Optional[aiosqlite.Connection] = None
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size_mb = mmap_size_mb
+        self.synchronous = synchronous
+        self.write_batch_size = write_batch_size
+        self.write_flush_interval = write_flush_interval
+        self.read_pool_size = read_pool_size
+        self._reader: Optional[ReadPool] = None
+        self.profiles = UserProfileCache(profile_cache_size)
+        self._week_locks: Dict[Tuple[str, str], list] = {}
+        # Время чтения недель кэша: копится в памяти и записывается обслуживанием
+        self._week_access: Dict[Tuple[str, str], int] = {}
+        
+        self._write_queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+        self.write_stats: Dict[str, int] = {"writes": 0, "commits": 0, "errors": 0, "commit_errors": 0, "lost": 0}
         
     async def connect(self):
         """Подключение к базе данных"""
         self.connection = await aiosqlite.connect(self.db_path)
         self.connection.row_factory = aiosqlite.Row
+        await self.configure()
         await self.create_tables()
+        self._writer = asyncio.create_task(self._writer_loop())
+        if self.read_pool_size > 0 and self.db_path != ":memory:":
+            self._reader = ReadPool(self.db_path, self.read_pool_size, self.tune)
+            await self._reader.open()
+        await self.warm_profiles()
         logger.info(f"База данных подключена: {self.db_path}")
         
     async def disconnect(self):
-        """Отключение от базы данных"""
+        """Отключение от базы данных (накопленные изменения фиксируются)"""
         if self.connection:
+            if self._writer:
+                await self.flush()
+                self._writer.cancel()
+                try:
+                    await self._writer
+                except asyncio.CancelledError:
+                    pass
+                self._writer = None
+            if self._reader:
+                await self._reader.close()
+                self._reader = None
             await self.connection.close()
             logger.info("База данных отключена")
             self.connection = None
             
+    async def configure(self):
+        """Журнал WAL и настройки соединения"""
+        # Действует для новой базы; существующую переводит Database.vacuum()
+        await self.connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        async with self.connection.execute("PRAGMA journal_mode = WAL") as cursor:
+            journal_mode = (await cursor.fetchone())[0]
+        # В режиме WAL synchronous=NORMAL не теряет целостность, fsync - только при checkpoint
+        await self.connection.execute(f"PRAGMA synchronous = {self.synchronous}")
+        await self.tune(self.connection)
+        logger.info(f"SQLite: journal_mode={journal_mode}, synchronous={self.synchronous}")
+        
+    async def tune(self, connection: aiosqlite.Connection):
+        """Кэш страниц, отображение в память и временные таблицы в памяти"""
+        await connection.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        await connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size_mb) * 1024 * 1024}")
+        await connection.execute("PRAGMA temp_store = MEMORY")
+        await connection.execute("PRAGMA busy_timeout = 5000")
+        
+    def get_read_stats(self) -> Optional[Dict[str, float]]:
+        """Статистика пула чтения (None - чтение через основное соединение)"""
+        return self._reader.get_stats() if self._reader is not None else None
+        
+    def _read(self):
+        """Соединение для чтения: из пула, а без пула - основное"""
+        if self._reader is not None:
+            return self._reader.acquire()
+        return _borrow(self.connection)
+        
+    async def flush(self):
+        """Дождаться фиксации всех поставленных в очередь изменений"""
+        await self._write(None, durable=True)
+        
+    async def _write(
+        self, sql: Optional[str], params: tuple = (), durable: bool = False, batch: bool = False
+    ) -> Tuple[int, Optional[int]]:
+        """
+        Изменение через задачу записи. Возвращает (rowcount, lastrowid)
+        после выполнения запроса; с durable=True - после фиксации транзакции.
+        
+        batch=True разрешает выполнить запрос одним executemany с такими же
+        соседними в очереди. Только для идемпотентных запросов, результат
+        которых не нужен: после ошибки в executemany группа выполняется
+        заново по одному, а результат выполненных пачкой - (-1, None).
+        """
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+        future = asyncio.get_running_loop().create_future()
+        self._write_queue.put_nowait((sql, params, durable, batch, future))
+        return await future
+        
+    async def _writer_loop(self):
+        uncommitted = 0
+        first_at = 0.0
+        waiters: List[Tuple[asyncio.Future, Tuple[int, Optional[int]]]] = []
+        
+        while True:
+            timeout = None
+            if uncommitted or waiters:
+                timeout = max(first_at + self.write_flush_interval - time.monotonic(), 0)
+            try:
+                batch = [await asyncio.wait_for(self._write_queue.get(), timeout)]
+            except asyncio.TimeoutError:
+                await self._commit(waiters, uncommitted)
+                uncommitted, waiters = 0, []
+                continue
+            
+            # Забираем всё, что успело накопиться, - это выполняется без ожидания
+            while len(batch) < self.write_batch_size and not self._write_queue.empty():
+                batch.append(self._write_queue.get_nowait())
+            if not uncommitted and not waiters:
+                first_at = time.monotonic()
+            
+            for group in _statement_runs(batch):
+                if group[0][1] is _OUTSIDE_TRANSACTION:
+                    await self._commit(waiters, uncommitted)
+                    uncommitted, waiters = 0, []
+                    await self._execute_script(group[0])
+                    continue
+                uncommitted += await self._execute_group(group, waiters)
+            
+            # Фиксация: пачка набрана или кто-то ждёт её, а очередь пуста
+            if uncommitted >= self.write_batch_size or (waiters and self._write_queue.empty()):
+                await self._commit(waiters, uncommitted)
+                uncommitted, waiters = 0, []
+                
+    async def _execute_group(self, group: List[tuple], waiters: list) -> int:
+        """
+        Выполнение подряд идущих одинаковых запросов с batch=True: несколько -
+        одним executemany (один переход в поток соединения). Возвращает
+        число выполненных изменений.
+        """
+        sql = group[0][0]
+        if sql is None:
+            waiters.extend((future, (0, None)) for *_, future in group)
+            return 0
+        
+        if len(group) > 1:
+            try:
+                await self.connection.executemany(sql, [params for _, params, *_ in group])
+            except Exception:
+                # Ищем ошибочный запрос по одному; часть группы уже выполнена,
+                # поэтому batch=True допускается только для идемпотентных запросов
+                pass
+            else:
+                self.write_stats["writes"] += len(group)
+                for *_, future in group:
+                    if not future.done():
+                        future.set_result((-1, None))
+                return len(group)
+        
+        executed = 0
+        for _, params, durable, _, future in group:
+            try:
+                cursor = await self.connection.execute(sql, params)
+            except Exception as e:
+                # Ошибка одного запроса не отменяет остальные в транзакции
+                self.write_stats["errors"] += 1
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            executed += 1
+            self.write_stats["writes"] += 1
+            result = (cursor.rowcount, cursor.lastrowid)
+            if durable:
+                waiters.append((future, result))
+            elif not future.done():
+                future.set_result(result)
+        return executed
+        
+    async def _execute_script(self, item: tuple):
+        """Выполнение команд вне транзакции (VACUUM и т.п.)"""
+        script, *_, future = item
+        try:
+            await self.connection.executescript(script)
+        except Exception as e:
+            self.write_stats["errors"] += 1
+            if not future.done():
+                future.set_exception(e)
+            return
+        self.write_stats["writes"] += 1
+        self.write_stats["commits"] += 1
+        if not future.done():
+            future.set_result((0, None))
+            
+    async def _commit(self, waiters: List[Tuple[asyncio.Future, Tuple[int, Optional[int]]]], uncommitted: int = 0):
+        try:
+            await self.connection.commit()
+            self.write_stats["commits"] += 1
+        except Exception as e:
+            # Незафиксированные изменения откатываются, чтобы счёт потерянных был точным
+            self.write_stats["commit_errors"] += 1
+            self.write_stats["lost"] += uncommitted
+            logger.error(f"Ошибка фиксации транзакции: {e}; потеряно изменений: {uncommitted}")
+            try:
+                await self.connection.rollback()
+            except Exception as rollback_error:
+                logger.error(f"Ошибка отката транзакции: {rollback_error}")
+            for future, _ in waiters:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in waiters:
+            if not future.done():
+                future.set_result(result)
+            
     async def create_tables(self):
         """Создание таблиц и индексов"""
         if not self.connection:
@@ -39,25 +274,84 @@ class Database:
                 username TEXT,
                 first_name TEXT,
                 group_name TEXT,
-                notifications_enabled INTEGER DEFAULT 1
+                notifications_enabled INTEGER DEFAULT 1,
+                notify_minute INTEGER              -- время уведомления, минут от полуночи (NULL - по умолчанию)
             )
         """)
+        await self._add_column_if_missing("users", "notify_minute", "INTEGER")
         
-        # Таблица кэша расписания
+        # Кэш расписания: одна сжатая запись на группу и неделю (см. schedule_codec)
         await self.connection.execute("""
-            CREATE TABLE IF NOT EXISTS schedule_cache (
+            CREATE TABLE IF NOT EXISTS schedule_weeks (
                 group_name TEXT NOT NULL,
-                date TEXT NOT NULL,                -- 'YYYY-MM-DD'
-                data TEXT NOT NULL,                -- JSON строка
-                fetched_at INTEGER NOT NULL,       -- unix timestamp
-                PRIMARY KEY (group_name, date)
+                week TEXT NOT NULL,                -- понедельник недели 'YYYY-MM-DD'
+                data BLOB NOT NULL,                -- дни недели с fetched_at и отпечатками
+                fetched_at INTEGER NOT NULL,       -- unix timestamp самого свежего дня
+                accessed_at INTEGER,               -- последнее чтение (сбрасывается из памяти пачками)
+                PRIMARY KEY (group_name, week)
+            )
+        """)
+        await self._add_column_if_missing("schedule_weeks", "accessed_at", "INTEGER")
+        await self._migrate_schedule_cache()
+        
+        # file_id загруженных в Telegram изображений (ключ - хэш изображения)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS image_file_ids (
+                image_key TEXT PRIMARY KEY,
+                file_id TEXT NOT NULL,
+                created_at INTEGER NOT NULL        -- unix timestamp
+            )
+        """)
+        
+        # Рассылки администратора: курсор по users.user_id для продолжения после перезапуска
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS broadcast_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',   -- pending / running / done
+                last_user_id INTEGER NOT NULL DEFAULT 0,  -- последний обработанный user_id
+                total INTEGER NOT NULL DEFAULT 0,
+                sent INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                created_by INTEGER,
+                created_at INTEGER NOT NULL,
+                finished_at INTEGER
+            )
+        """)
+        
+        # Состояния FSM (выбор группы и т.п.), если включено FSM_STORAGE=sqlite
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key TEXT PRIMARY KEY,              -- ключ aiogram: бот, чат, пользователь, назначение
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}',   -- JSON
+                updated_at INTEGER NOT NULL        -- unix timestamp
+            )
+        """)
+        
+        # Время последнего запуска задач планировщика
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS scheduler_runs (
+                job_name TEXT PRIMARY KEY,
+                last_run INTEGER NOT NULL          -- unix timestamp
             )
         """)
         
         # Индексы для ускорения
+        # Вытеснение кэша: устаревшие недели и давно не читавшиеся - небольшими пачками по индексу
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS idx_weeks_fetched_at 
+            ON schedule_weeks (fetched_at)
+        """)
+        
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS idx_weeks_accessed_at 
+            ON schedule_weeks (accessed_at)
+        """)
+        
         await self.connection.execute("""
-            CREATE INDEX IF NOT EXISTS idx_group_date 
-            ON schedule_cache (group_name, date)
+            CREATE INDEX IF NOT EXISTS idx_image_file_ids_created_at 
+            ON image_file_ids (created_at)
         """)
         
         await self.connection.execute("""
@@ -65,37 +359,113 @@ class Database:
             ON users (group_name)
         """)
         
+        # Выборка подписчиков по времени уведомления при каждом срабатывании
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_notify_minute 
+            ON users (notify_minute)
+        """)
+        
         await self.connection.commit()
         logger.info("Таблицы и индексы созданы / проверены")
         
+    async def _add_column_if_missing(self, table: str, column: str, definition: str):
+        """Добавление колонки в таблицу, созданную старой версией бота"""
+        async with self.connection.execute(f"PRAGMA table_info({table})") as cursor:
+            columns = {row['name'] for row in await cursor.fetchall()}
+        if column not in columns:
+            await self.connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"Добавлена колонка {table}.{column}")
+        
+    async def _migrate_schedule_cache(self):
+        """Перенос кэша из прежней таблицы schedule_cache (строка JSON на день) в записи недель"""
+        async with self.connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'schedule_cache'"
+        ) as cursor:
+            if await cursor.fetchone() is None:
+                return
+                
+        weeks: Dict[Tuple[str, str], WeekDays] = {}
+        skipped = 0
+        async with self.connection.execute("SELECT * FROM schedule_cache") as cursor:
+            async for row in cursor:
+                try:
+                    data = json.loads(row['data'])
+                    week, offset = week_of(row['date'])
+                except ValueError:
+                    skipped += 1
+                    continue
+                fingerprint = row['fingerprint'] if 'fingerprint' in row.keys() else None
+                weeks.setdefault((row['group_name'], week), {})[offset] = (data, fingerprint, row['fetched_at'])
+                
+        await self.connection.executemany("""
+            INSERT OR REPLACE INTO schedule_weeks 
+            (group_name, week, data, fetched_at, accessed_at)
+            VALUES (?1, ?2, ?3, ?4, ?4)
+        """, [
+            (group_name, week, encode_week(days), max(fetched_at for _, _, fetched_at in days.values()))
+            for (group_name, week), days in weeks.items()
+        ])
+        await self.connection.execute("DROP TABLE schedule_cache")
+        logger.info(f"Кэш расписания перенесён в формат недель: {len(weeks)} недель (пропущено повреждённых дней: {skipped})")
+        
     # ────────────────────────────────────────────────
     # Методы для пользователей
     # ────────────────────────────────────────────────
     
-    async def get_user_group(self, user_id: int) -> Optional[str]:
-        """Получение группы пользователя"""
+    async def _profile(self, user_id: int) -> Dict[str, Any]:
+        """Профиль пользователя из кэша; при промахе - одна строка users"""
         if not self.connection:
             raise RuntimeError("Нет соединения с БД")
             
-        async with self.connection.execute(
-            "SELECT group_name FROM users WHERE user_id = ?",
+        profile = self.profiles.get(user_id)
+        if profile is not None:
+            return profile
+            
+        version = self.profiles.version
+        async with self._read() as conn, conn.execute(
+            "SELECT group_name, notifications_enabled, notify_minute FROM users WHERE user_id = ?",
             (user_id,)
         ) as cursor:
             row = await cursor.fetchone()
-            return row['group_name'] if row else None
+        if not row:
+            # Без записи в users не кэшируем: настройки появятся вместе с группой
+            return self.profiles.default_profile()
+        # Параллельная запись могла изменить строку после чтения - тогда в кэш не кладём
+        return self.profiles.add(user_id, profile_from_row(row), version)
+        
+    async def warm_profiles(self):
+        """Загрузка профилей пользователей в кэш при старте"""
+        async with self._read() as conn, conn.execute(
+            "SELECT user_id, group_name, notifications_enabled, notify_minute FROM users LIMIT ?",
+            (self.profiles.max_entries,)
+        ) as cursor:
+            self.profiles.load(await cursor.fetchall())
+        logger.info(f"Профилей пользователей в кэше: {len(self.profiles)}")
+            
+    async def get_user_group(self, user_id: int) -> Optional[str]:
+        """Получение группы пользователя"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        return (await self._profile(user_id))["group_name"]
             
     async def set_user_group(self, user_id: int, username: str, first_name: str, group_name: str):
         """Установка группы пользователя"""
         if not self.connection:
             raise RuntimeError("Нет соединения с БД")
             
-        await self.connection.execute("""
-            INSERT OR REPLACE INTO users 
+        # Без REPLACE: остальные настройки пользователя (уведомления, время) сохраняются
+        await self._write("""
+            INSERT INTO users 
             (user_id, username, first_name, group_name)
             VALUES (?, ?, ?, ?)
-        """, (user_id, username, first_name, group_name))
-        
-        await self.connection.commit()
+            ON CONFLICT (user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                group_name = excluded.group_name
+        """, (user_id, username, first_name, group_name), durable=True)
+        # Профиля нет в кэше - остальные поля загрузятся из БД при следующем чтении
+        self.profiles.update(user_id, group_name=group_name)
         logger.info(f"Группа {group_name} установлена для пользователя {user_id}")
         
     async def get_notifications_enabled(self, user_id: int) -> bool:
@@ -103,132 +473,690 @@ class Database:
         if not self.connection:
             raise RuntimeError("Нет соединения с БД")
             
-        async with self.connection.execute(
-            "SELECT notifications_enabled FROM users WHERE user_id = ?",
-            (user_id,)
-        ) as cursor:
-            row = await cursor.fetchone()
-            return bool(row['notifications_enabled']) if row else True
+        return (await self._profile(user_id))["notifications_enabled"]
             
-    async def toggle_notifications(self, user_id: int) -> bool:
-        """Переключение состояния уведомлений"""
+    async def toggle_notifications(self, user_id: int) -> Optional[bool]:
+        """Переключение состояния уведомлений (None - пользователя нет в users)"""
         if not self.connection:
             raise RuntimeError("Нет соединения с БД")
             
-        enabled = await self.get_notifications_enabled(user_id)
-        new_state = not enabled
-        
-        await self.connection.execute("""
+        # Одним запросом: чтение и запись идут через разные соединения
+        changed, _ = await self._write("""
             UPDATE users 
-            SET notifications_enabled = ? 
+            SET notifications_enabled = 1 - COALESCE(notifications_enabled, 1) 
             WHERE user_id = ?
-        """, (int(new_state), user_id))
-        
-        await self.connection.commit()
+        """, (user_id,), durable=True)
+        if not changed:
+            self.profiles.discard(user_id)
+            logger.warning(f"Переключение уведомлений: пользователя {user_id} нет в базе")
+            return None
+        profile = self.profiles.get(user_id)
+        if profile is not None:
+            self.profiles.update(user_id, notifications_enabled=not profile["notifications_enabled"])
+        else:
+            self.profiles.update(user_id)  # прочитанное до записи не попадёт в кэш
+            profile = await self._profile(user_id)
+        new_state = profile["notifications_enabled"]
         
         logger.info(f"Уведомления для {user_id}: {'включены' if new_state else 'выключены'}")
         return new_state
 
-    async def get_users_with_notifications(self):
+    async def get_notify_minute(self, user_id: int) -> Optional[int]:
+        """Время уведомления пользователя в минутах от полуночи (None - время по умолчанию)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        return (await self._profile(user_id))["notify_minute"]
+            
+    async def set_notify_minute(self, user_id: int, notify_minute: Optional[int]) -> bool:
+        """Установка времени уведомления (None - время по умолчанию); False - пользователя нет в users"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        changed, _ = await self._write("""
+            UPDATE users 
+            SET notify_minute = ? 
+            WHERE user_id = ?
+        """, (notify_minute, user_id), durable=True)
+        if not changed:
+            self.profiles.discard(user_id)
+            logger.warning(f"Время уведомлений: пользователя {user_id} нет в базе")
+            return False
+        self.profiles.update(user_id, notify_minute=notify_minute)
+        logger.info(f"Время уведомлений для {user_id}: {notify_minute}")
+        return True
+
+    async def get_users_with_notifications(
+        self,
+        minute_from: Optional[int] = None,
+        minute_to: Optional[int] = None,
+        include_default: bool = False,
+    ):
         """
         Возвращает список пользователей с включёнными уведомлениями
         Возвращает: список объектов Row с полями user_id, group_name
+        
+        Если задан интервал, только пользователи со временем уведомления
+        в (minute_from, minute_to] (поиск по индексу idx_user_notify_minute);
+        include_default добавляет пользователей со временем по умолчанию.
         """
         if not self.connection:
             raise RuntimeError("Нет соединения с базой данных")
 
-        cursor = await self.connection.execute("""
+        query = """
             SELECT user_id, group_name 
             FROM users 
             WHERE notifications_enabled = 1 
               AND group_name IS NOT NULL
-        """)
+        """
+        params: tuple = ()
+        if minute_from is not None and minute_to is not None:
+            if include_default:
+                query += " AND ((notify_minute > ? AND notify_minute <= ?) OR notify_minute IS NULL)"
+            else:
+                query += " AND notify_minute > ? AND notify_minute <= ?"
+            params = (minute_from, minute_to)
 
-        rows = await cursor.fetchall()
+        async with self._read() as conn, conn.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
         logger.info(f"Найдено {len(rows)} пользователей с включёнными уведомлениями")
 
         return rows
     
+    async def get_user_counts(self) -> Dict[str, int]:
+        """Число пользователей: всего, с выбранной группой и с включёнными уведомлениями"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute("""
+            SELECT 
+                COUNT(*),
+                COUNT(group_name),
+                COALESCE(SUM(notifications_enabled = 1), 0)
+            FROM users
+        """) as cursor:
+            total, with_group, with_notifications = await cursor.fetchone()
+        return {"total": total, "with_group": with_group, "with_notifications": with_notifications}
+    
+    async def get_group_subscribers(self, group_name: str) -> List[int]:
+        """user_id пользователей группы с включёнными уведомлениями"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute("""
+            SELECT user_id 
+            FROM users 
+            WHERE group_name = ? AND notifications_enabled = 1
+        """, (group_name,)) as cursor:
+            return [row['user_id'] for row in await cursor.fetchall()]
+    
     # ────────────────────────────────────────────────
     # Методы для кэша расписания
     # ────────────────────────────────────────────────
     
-    async def get_cached_schedule(self, group_name: str, date: str) -> Optional[Dict[str, Any]]:
-        """Получить расписание из кэша, если оно не устарело"""
+    @asynccontextmanager
+    async def _week_lock(self, group_name: str, week: str) -> AsyncIterator[None]:
+        """Запись недели перезаписывается целиком: изменения одной недели идут по очереди"""
+        key = (group_name, week)
+        entry = self._week_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._week_locks[key]
+
+    async def get_cached_week(self, group_name: str, week: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Сохранённые дни недели без проверки возраста:
+        {дата: {'data': ..., 'fetched_at': ..., 'fingerprint': ...}}
+        """
         if not self.connection:
             raise RuntimeError("Нет соединения с БД")
             
-        row = await self.connection.fetchrow("""
-            SELECT data, fetched_at 
-            FROM schedule_cache 
-            WHERE group_name = ? AND date = ?
-        """, (group_name, date))
+        async with self._read() as conn, conn.execute("""
+            SELECT data 
+            FROM schedule_weeks 
+            WHERE group_name = ? AND week = ?
+        """, (group_name, week)) as cursor:
+            row = await cursor.fetchone()
         
         if not row:
             return None
             
-        age_hours = (datetime.now().timestamp() - row['fetched_at']) / 3600
-        
-        # Кэш живёт 12 часов (можно изменить)
-        if age_hours > 12:
-            await self.delete_cache_entry(group_name, date)
-            return None
-            
+        self._week_access[(group_name, week)] = int(time.time())
         try:
-            return json.loads(row['data'])
-        except json.JSONDecodeError as e:
-            logger.warning(f"Повреждённый кэш для {group_name} {date}: {e}")
-            await self.delete_cache_entry(group_name, date)
+            days = decode_week(row['data'])
+        except CacheFormatError as e:
+            logger.warning(f"Повреждённый кэш для {group_name} (неделя с {week}): {e}")
+            await self._write("""
+                DELETE FROM schedule_weeks 
+                WHERE group_name = ? AND week = ?
+            """, (group_name, week), batch=True)
             return None
+            
+        return {
+            day_of(week, offset): {"data": data, "fetched_at": fetched_at, "fingerprint": fingerprint}
+            for offset, (data, fingerprint, fetched_at) in days.items()
+        }
 
+    async def get_cached_schedule_entry(self, group_name: str, date: str) -> Optional[Dict[str, Any]]:
+        """Запись кэша как есть: {'data': ..., 'fetched_at': ...} без проверки возраста"""
+        days = await self.get_cached_week(group_name, week_of(date)[0])
+        return days.get(date) if days else None
 
-    async def save_schedule_to_cache(self, group_name: str, date: str, schedule_data: Dict[str, Any]):
-        """Сохранить расписание в кэш"""
+    async def save_schedule_week(self, group_name: str, week: str, days: Dict[str, Tuple[Dict[str, Any], Optional[str]]]):
+        """Сохранить загруженную неделю целиком: {дата: (расписание, отпечаток)}"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        now = int(datetime.now().timestamp())
+        record = encode_week({
+            week_of(date)[1]: (schedule_data, fingerprint, now)
+            for date, (schedule_data, fingerprint) in days.items()
+        })
+        async with self._week_lock(group_name, week):
+            await self._write("""
+                INSERT OR REPLACE INTO schedule_weeks 
+                (group_name, week, data, fetched_at, accessed_at)
+                VALUES (?1, ?2, ?3, ?4, ?4)
+            """, (group_name, week, record, now), batch=True)
+        logger.debug(f"Кэш сохранён: {group_name} → неделя с {week}")
+
+    async def _update_week(self, group_name: str, date: str, change: Callable[[WeekDays, int], None]):
+        """Изменение одного дня в записи недели (чтение и перезапись записи)"""
+        week, offset = week_of(date)
+        async with self._week_lock(group_name, week):
+            # Предыдущие изменения недели должны быть видны соединениям чтения
+            await self.flush()
+            async with self._read() as conn, conn.execute("""
+                SELECT data 
+                FROM schedule_weeks 
+                WHERE group_name = ? AND week = ?
+            """, (group_name, week)) as cursor:
+                row = await cursor.fetchone()
+            try:
+                days = decode_week(row['data']) if row else {}
+            except CacheFormatError:
+                days = {}
+                
+            change(days, offset)
+            if not days:
+                await self._write("""
+                    DELETE FROM schedule_weeks 
+                    WHERE group_name = ? AND week = ?
+                """, (group_name, week), batch=True)
+                return
+            await self._write("""
+                INSERT OR REPLACE INTO schedule_weeks 
+                (group_name, week, data, fetched_at, accessed_at)
+                VALUES (?1, ?2, ?3, ?4, ?4)
+            """, (group_name, week, encode_week(days), max(fetched_at for _, _, fetched_at in days.values())), batch=True)
+
+    async def save_schedule_to_cache(self, group_name: str, date: str, schedule_data: Dict[str, Any], fingerprint: Optional[str] = None):
+        """Сохранить расписание одного дня в кэш (остальные дни недели не меняются)"""
         if not self.connection:
             raise RuntimeError("Нет соединения с БД")
             
-        json_data = json.dumps(schedule_data, ensure_ascii=False)
         now = int(datetime.now().timestamp())
         
-        await self.connection.execute("""
-            INSERT OR REPLACE INTO schedule_cache 
-            (group_name, date, data, fetched_at)
-            VALUES (?, ?, ?, ?)
-        """, (group_name, date, json_data, now))
-        
-        await self.connection.commit()
+        def put(days: WeekDays, offset: int):
+            days[offset] = (schedule_data, fingerprint, now)
+            
+        await self._update_week(group_name, date, put)
         logger.debug(f"Кэш сохранён: {group_name} → {date}")
 
+    async def get_schedule_fingerprints(self, group_name: str, date_from: str, date_to: str) -> Dict[str, str]:
+        """Отпечатки расписания группы за период: {дата: отпечаток}"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute("""
+            SELECT week, data 
+            FROM schedule_weeks 
+            WHERE group_name = ? AND week BETWEEN ? AND ?
+        """, (group_name, week_of(date_from)[0], week_of(date_to)[0])) as cursor:
+            rows = await cursor.fetchall()
+            
+        fingerprints = {}
+        for row in rows:
+            try:
+                days = decode_week(row['data'])
+            except CacheFormatError:
+                continue
+            for offset, (_, fingerprint, _) in days.items():
+                date = day_of(row['week'], offset)
+                if fingerprint is not None and date_from <= date <= date_to:
+                    fingerprints[date] = fingerprint
+        return fingerprints
 
-    async def delete_cache_entry(self, group_name: str, date: str):
-        """Удалить конкретную запись кэша"""
+    async def clear_old_cache(self, days: int = 14, batch_size: int = 500):
+        """Очистка записей старше указанного количества дней (пачками, без долгой блокировки записи)"""
         if not self.connection:
-            return
+            raise RuntimeError("Нет соединения с БД")
             
-        await self.connection.execute("""
-            DELETE FROM schedule_cache 
-            WHERE group_name = ? AND date = ?
-        """, (group_name, date))
+        threshold = int((datetime.now() - timedelta(days=days)).timestamp())
         
-        await self.connection.commit()
+        deleted = 0
+        while True:
+            batch = await self.delete_expired_weeks(threshold, batch_size)
+            deleted += batch
+            if batch < batch_size:
+                break
+        
+        logger.info(f"Очищено {deleted} старых недель кэша (старше {days} дней)")
 
+    # ────────────────────────────────────────────────
+    # Методы для состояний FSM
+    # ────────────────────────────────────────────────
 
-    async def clear_old_cache(self, days: int = 14):
-        """Очистка записей старше указанного количества дней"""
+    async def get_fsm_record(self, key: str) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+        """(состояние, данные) по ключу хранилища FSM или None"""
         if not self.connection:
             raise RuntimeError("Нет соединения с БД")
             
-        threshold = int((datetime.now() - timedelta(days=days)).timestamp())
+        async with self._read() as conn, conn.execute(
+            "SELECT state, data FROM fsm_states WHERE key = ?",
+            (key,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            
+        if not row:
+            return None
+        try:
+            return row['state'], json.loads(row['data'])
+        except json.JSONDecodeError as e:
+            logger.warning(f"Повреждённые данные FSM {key}: {e}")
+            return row['state'], {}
+
+    async def save_fsm_record(self, key: str, state: Optional[str], data: Dict[str, Any]):
+        """Сохранить состояние и данные FSM; пустая запись удаляется"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        if state is None and not data:
+            await self._write("DELETE FROM fsm_states WHERE key = ?", (key,), batch=True)
+            return
+        await self._write("""
+            INSERT INTO fsm_states (key, state, data, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                state = excluded.state,
+                data = excluded.data,
+                updated_at = excluded.updated_at
+        """, (key, state, json.dumps(data, ensure_ascii=False), int(time.time())), batch=True)
+
+    async def delete_stale_fsm_records(self, threshold: int, limit: int) -> int:
+        """Удалить до limit состояний FSM, не менявшихся с threshold (брошенные меню)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        deleted, _ = await self._write("""
+            DELETE FROM fsm_states 
+            WHERE key IN (
+                SELECT key FROM fsm_states 
+                WHERE updated_at <= ? 
+                LIMIT ?
+            )
+        """, (threshold, limit), durable=True)
+        return deleted
+
+    # ────────────────────────────────────────────────
+    # Обслуживание кэша и файла базы
+    # ────────────────────────────────────────────────
+
+    async def flush_week_access(self) -> int:
+        """Записать накопленное время чтения недель (для вытеснения давно не читавшихся)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        accessed, self._week_access = self._week_access, {}
+        # Одинаковые запросы подряд задача записи выполняет одним executemany;
+        # повтор UPDATE безопасен благодаря условию на accessed_at
+        await asyncio.gather(*(
+            self._write("""
+                UPDATE schedule_weeks 
+                SET accessed_at = ? 
+                WHERE group_name = ? AND week = ? AND COALESCE(accessed_at, 0) < ?
+            """, (accessed_at, group_name, week, accessed_at), batch=True)
+            for (group_name, week), accessed_at in accessed.items()
+        ))
+        return len(accessed)
+
+    async def delete_expired_weeks(self, threshold: int, limit: int) -> int:
+        """Удалить до limit недель, обновлённых не позже threshold (unix timestamp)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        deleted, _ = await self._write("""
+            DELETE FROM schedule_weeks 
+            WHERE rowid IN (
+                SELECT rowid FROM schedule_weeks 
+                WHERE fetched_at <= ? 
+                ORDER BY fetched_at 
+                LIMIT ?
+            )
+        """, (threshold, limit), durable=True)
+        return deleted
+
+    async def delete_expired_file_ids(self, threshold: int, limit: int) -> int:
+        """Удалить до limit file_id изображений, сохранённых не позже threshold"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        deleted, _ = await self._write("""
+            DELETE FROM image_file_ids 
+            WHERE rowid IN (
+                SELECT rowid FROM image_file_ids 
+                WHERE created_at <= ? 
+                ORDER BY created_at 
+                LIMIT ?
+            )
+        """, (threshold, limit), durable=True)
+        return deleted
+
+    async def delete_least_used_weeks(self, limit: int) -> int:
+        """Удалить limit недель, которые дольше всех не читались"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        deleted, _ = await self._write("""
+            DELETE FROM schedule_weeks 
+            WHERE rowid IN (
+                SELECT rowid FROM schedule_weeks 
+                ORDER BY accessed_at 
+                LIMIT ?
+            )
+        """, (limit,), durable=True)
+        return deleted
+
+    async def get_cache_size(self) -> Tuple[int, int]:
+        """(число недель в кэше, объём их данных в байтах)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length(data)), 0) FROM schedule_weeks"
+        ) as cursor:
+            rows, size = await cursor.fetchone()
+        return rows, size
+
+    async def get_page_stats(self) -> Dict[str, int]:
+        """Размер файла базы в страницах: всего, свободных и размер страницы"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        stats = {}
+        for pragma in ("page_count", "freelist_count", "page_size", "auto_vacuum"):
+            async with self._read() as conn, conn.execute(f"PRAGMA {pragma}") as cursor:
+                stats[pragma] = (await cursor.fetchone())[0]
+        return stats
+
+    async def optimize(self):
+        """PRAGMA optimize: обновление статистики планировщика запросов, если она устарела"""
+        await self._write("PRAGMA optimize", durable=True)
+
+    async def incremental_vacuum(self, pages: int):
+        """Вернуть системе до pages свободных страниц (при auto_vacuum=INCREMENTAL)"""
+        await self._write_outside_transaction(f"PRAGMA incremental_vacuum({int(pages)})")
+
+    async def vacuum(self):
+        """
+        Полная перестройка файла базы. Блокирует запись на всё время
+        работы, поэтому вызывается редко и только при большой доле
+        свободных страниц; заодно включает auto_vacuum=INCREMENTAL.
+        """
+        await self._write_outside_transaction("PRAGMA auto_vacuum = INCREMENTAL; VACUUM;")
+
+    async def _write_outside_transaction(self, script: str):
+        """Команды, которые нельзя выполнять в транзакции: задача записи сначала фиксирует накопленное"""
+        await self._write(script, _OUTSIDE_TRANSACTION, durable=True)
+
+
+    # ────────────────────────────────────────────────
+    # Методы для file_id изображений
+    # ────────────────────────────────────────────────
+
+    async def get_image_file_id(self, image_key: str) -> Optional[str]:
+        """file_id ранее загруженного изображения"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute(
+            "SELECT file_id FROM image_file_ids WHERE image_key = ?",
+            (image_key,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row['file_id'] if row else None
+
+    async def save_image_file_id(self, image_key: str, file_id: str):
+        """Запомнить file_id загруженного изображения"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        await self._write("""
+            INSERT OR REPLACE INTO image_file_ids (image_key, file_id, created_at)
+            VALUES (?, ?, ?)
+        """, (image_key, file_id, int(datetime.now().timestamp())), batch=True)
+
+    async def delete_image_file_id(self, image_key: str):
+        """Забыть file_id, который Telegram больше не принимает"""
+        if not self.connection:
+            return
+            
+        await self._write(
+            "DELETE FROM image_file_ids WHERE image_key = ?",
+            (image_key,), batch=True
+        )
+
+
+    # ────────────────────────────────────────────────
+    # Методы для рассылок
+    # ────────────────────────────────────────────────
+
+    async def create_broadcast_job(self, text: str, created_by: int) -> int:
+        """Создать задание рассылки на всех текущих пользователей"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute("SELECT COUNT(*) FROM users") as cursor:
+            total = (await cursor.fetchone())[0]
         
-        cursor = await self.connection.execute("""
-            DELETE FROM schedule_cache 
-            WHERE fetched_at < ?
-        """, (threshold,))
+        _, job_id = await self._write("""
+            INSERT INTO broadcast_jobs (text, total, created_by, created_at)
+            VALUES (?, ?, ?, ?)
+        """, (text, total, created_by, int(datetime.now().timestamp())), durable=True)
+        logger.info(f"Создана рассылка #{job_id} на {total} пользователей")
+        return job_id
+
+    async def get_broadcast_job(self, job_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Задание рассылки по id (или последнее созданное)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        if job_id is None:
+            query, params = "SELECT * FROM broadcast_jobs ORDER BY id DESC LIMIT 1", ()
+        else:
+            query, params = "SELECT * FROM broadcast_jobs WHERE id = ?", (job_id,)
         
-        deleted = cursor.rowcount
-        await self.connection.commit()
+        async with self._read() as conn, conn.execute(query, params) as cursor:
+            row = await cursor.fetchone()
+            return dict(row) if row else None
+
+    async def get_unfinished_broadcast_jobs(self):
+        """Незавершённые рассылки в порядке создания"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute("""
+            SELECT * FROM broadcast_jobs
+            WHERE status != 'done'
+            ORDER BY id
+        """) as cursor:
+            return [dict(row) for row in await cursor.fetchall()]
+
+    async def get_user_ids_after(self, last_user_id: int, limit: int):
+        """Следующая страница user_id (keyset-пагинация по первичному ключу)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute("""
+            SELECT user_id FROM users
+            WHERE user_id > ?
+            ORDER BY user_id
+            LIMIT ?
+        """, (last_user_id, limit)) as cursor:
+            return [row['user_id'] for row in await cursor.fetchall()]
+
+    async def update_broadcast_progress(self, job_id: int, last_user_id: int, sent: int, failed: int):
+        """Сохранить курсор и счётчики после очередной пачки"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        await self._write("""
+            UPDATE broadcast_jobs
+            SET status = 'running', last_user_id = ?, sent = ?, failed = ?
+            WHERE id = ?
+        """, (last_user_id, sent, failed, job_id), durable=True)
+
+    async def finish_broadcast_job(self, job_id: int):
+        """Отметить рассылку завершённой"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        await self._write("""
+            UPDATE broadcast_jobs
+            SET status = 'done', finished_at = ?
+            WHERE id = ?
+        """, (int(datetime.now().timestamp()), job_id), durable=True)
+
+
+    # ────────────────────────────────────────────────
+    # Методы для планировщика
+    # ────────────────────────────────────────────────
+
+    async def get_job_last_run(self, job_name: str) -> Optional[int]:
+        """Время последнего запуска задачи (unix timestamp)"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        async with self._read() as conn, conn.execute(
+            "SELECT last_run FROM scheduler_runs WHERE job_name = ?",
+            (job_name,)
+        ) as cursor:
+            row = await cursor.fetchone()
+            return row['last_run'] if row else None
+
+    async def set_job_last_run(self, job_name: str, last_run: int):
+        """Запомнить время запуска задачи"""
+        if not self.connection:
+            raise RuntimeError("Нет соединения с БД")
+            
+        await self._write("""
+            INSERT OR REPLACE INTO scheduler_runs (job_name, last_run)
+            VALUES (?, ?)
+        """, (job_name, last_run), durable=True)
+
+
+class ReadPool:
+    """
+    Пул соединений SQLite только для чтения. В режиме WAL читатели не
+    блокируют запись и друг друга. Запрос отдаётся наименее загруженному
+    соединению; у каждого соединения свой поток, и стоящие к нему в очереди
+    запросы выполняются подряд, без возврата в цикл событий между ними.
+    Всего одновременно выполняется не больше size * max_in_flight запросов;
+    время ожидания сверх этого попадает в статистику.
+    """
+    
+    def __init__(
+        self,
+        db_path: str,
+        size: int,
+        tune: Callable[[aiosqlite.Connection], Awaitable[None]],
+        max_in_flight: int = 8,
+    ):
+        self.db_path = db_path
+        self.size = size
+        self.max_in_flight = max_in_flight
+        self._tune = tune
+        self._slots = asyncio.Semaphore(size * max_in_flight)
+        self._connections: List[aiosqlite.Connection] = []
+        self._in_flight: List[int] = []
+        self.stats: Dict[str, float] = {"acquired": 0, "waited": 0, "wait_total": 0.0, "wait_max": 0.0}
         
-        logger.info(f"Очищено {deleted} старых записей кэша (старше {days} дней)")
+    async def open(self):
+        uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro"
+        for _ in range(self.size):
+            connection = await aiosqlite.connect(uri, uri=True)
+            connection.row_factory = aiosqlite.Row
+            await self._tune(connection)
+            self._connections.append(connection)
+            self._in_flight.append(0)
+            
+    async def close(self):
+        for connection in self._connections:
+            await connection.close()
+        self._connections.clear()
+        self._in_flight.clear()
+        
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[aiosqlite.Connection]:
+        # Семафор пропускает ждущих по очереди, новые запросы их не обгоняют
+        if self._slots.locked():
+            started = time.monotonic()
+            await self._slots.acquire()
+            waited = time.monotonic() - started
+            self.stats["waited"] += 1
+            self.stats["wait_total"] += waited
+            self.stats["wait_max"] = max(self.stats["wait_max"], waited)
+        else:
+            await self._slots.acquire()
+        self.stats["acquired"] += 1
+        index = min(range(self.size), key=self._in_flight.__getitem__)
+        self._in_flight[index] += 1
+        try:
+            yield self._connections[index]
+        finally:
+            self._in_flight[index] -= 1
+            self._slots.release()
+            
+    def get_stats(self) -> Dict[str, float]:
+        stats = dict(self.stats)
+        stats["size"] = self.size
+        stats["in_use"] = sum(self._in_flight)
+        stats["avg_wait_ms"] = stats["wait_total"] / stats["acquired"] * 1000 if stats["acquired"] else 0.0
+        return stats
+
+
+@asynccontextmanager
+async def _borrow(connection: aiosqlite.Connection) -> AsyncIterator[aiosqlite.Connection]:
+    yield connection
+
+
+# Параметры-метка для команд вне транзакции (см. Database._write_outside_transaction)
+_OUTSIDE_TRANSACTION = object()
+
+
+def _statement_runs(batch: List[tuple]) -> List[List[tuple]]:
+    """
+    Разбивка очереди на группы подряд идущих одинаковых запросов с
+    batch=True без ожидания фиксации; остальные запросы и барьеры flush()
+    идут по одному. Порядок изменений сохраняется.
+    """
+    runs: List[List[tuple]] = []
+    for item in batch:
+        sql, _, durable, batchable, _ = item
+        first = runs[-1][0] if runs else None
+        if (
+            first is not None and batchable and not durable and sql is not None
+            and first[0] == sql and first[3] and not first[2]
+        ):
+            runs[-1].append(item)
+        else:
+            runs.append([item])
+    return runs
 
 
 # Глобальный экземпляр
@@ -243,10 +1171,31 @@ def get_db() -> Database:
     return _db_instance
 
 
+def read_pool_size(configured: int) -> int:
+    """
+    Размер пула чтения. Потоки читателей выигрывают только на нескольких
+    ядрах: на одном ядре они делят GIL и проигрывают одному соединению
+    (см. benchmarks/bench_db_reads.py), поэтому по умолчанию пул не создаётся.
+    """
+    if configured >= 0:
+        return configured
+    cpus = os.cpu_count() or 1
+    return min(4, cpus) if cpus > 1 else 0
+
+
 async def init_db(db_path: str) -> Database:
     """Инициализация базы данных"""
     global _db_instance
-    _db_instance = Database(db_path)
+    _db_instance = Database(
+        db_path,
+        cache_size_kb=settings.DB_CACHE_SIZE_KB,
+        mmap_size_mb=settings.DB_MMAP_SIZE_MB,
+        synchronous=settings.DB_SYNCHRONOUS,
+        write_batch_size=settings.DB_WRITE_BATCH_SIZE,
+        write_flush_interval=settings.DB_WRITE_FLUSH_MS / 1000,
+        read_pool_size=read_pool_size(settings.DB_READ_POOL_SIZE),
+        profile_cache_size=settings.USER_CACHE_SIZE,
+    )
     await _db_instance.connect()
     return _db_instance
 
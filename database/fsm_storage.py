@@ -0,0 +1,80 @@
+"""Хранилище FSM aiogram в SQLite (переживает перезапуск бота)"""
+import copy
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from .database import Database
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Состояния и данные FSM в таблице fsm_states.
+
+    aiogram читает состояние на каждом обновлении, поэтому записи держатся
+    в памяти (LRU на max_entries ключей, отсутствующие - тоже): чтение
+    обращается к базе только при промахе, запись меняет память и ставит
+    изменение в общую задачу записи Database. Данные должны сериализоваться
+    в JSON - обработчики хранят в них только запросы, номера и т.п.
+    """
+
+    def __init__(self, db: Database, max_entries: int = 10000, key_builder: Optional[KeyBuilder] = None):
+        self.db = db
+        self.max_entries = max_entries
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True, with_business_connection_id=True)
+        # {ключ: [состояние, данные]}
+        self._records: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "writes": 0}
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._record(storage_key)
+        record[0] = state.state if isinstance(state, State) else state
+        await self._save(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(self.key_builder.build(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._record(storage_key)
+        record[1] = copy.deepcopy(data)
+        await self._save(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._record(self.key_builder.build(key)))[1])
+
+    async def close(self) -> None:
+        # Соединение закрывает close_db(); незафиксированное записывается при отключении
+        self._records.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = dict(self.stats)
+        stats["entries"] = len(self._records)
+        return stats
+
+    async def _record(self, storage_key: str) -> List[Any]:
+        record = self._records.get(storage_key)
+        if record is not None:
+            self._records.move_to_end(storage_key)
+            self.stats["hits"] += 1
+            return record
+
+        self.stats["misses"] += 1
+        stored = await self.db.get_fsm_record(storage_key)
+        record = list(stored) if stored else [None, {}]
+        self._remember(storage_key, record)
+        return record
+
+    async def _save(self, storage_key: str, record: List[Any]):
+        self._remember(storage_key, record)
+        self.stats["writes"] += 1
+        await self.db.save_fsm_record(storage_key, record[0], record[1])
+
+    def _remember(self, storage_key: str, record: List[Any]):
+        self._records[storage_key] = record
+        self._records.move_to_end(storage_key)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
@@ -0,0 +1,92 @@
+"""Кэш профилей пользователей в памяти (группа и настройки уведомлений)"""
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+
+class UserProfileCache:
+    """
+    LRU-кэш профилей по user_id: {"group_name", "notifications_enabled",
+    "notify_minute"}. Заполняется из таблицы users при старте и при
+    промахах, изменяется на месте методами записи Database (write-through),
+    поэтому в установившемся режиме обработчики не обращаются к БД.
+    Кэшируются только пользователи с записью в users: для остальных
+    профиль по умолчанию не кладётся в кэш, иначе он разойдётся с базой,
+    когда запись появится.
+
+    version растёт при каждом изменении: строка, прочитанная из БД до
+    записи, не должна попасть в кэш после неё (см. add()).
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._profiles: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.version = 0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def default_profile() -> Dict[str, Any]:
+        return {"group_name": None, "notifications_enabled": True, "notify_minute": None}
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        profile = self._profiles.get(user_id)
+        if profile is None:
+            self.stats["misses"] += 1
+            return None
+        self._profiles.move_to_end(user_id)
+        self.stats["hits"] += 1
+        return profile
+
+    def put(self, user_id: int, profile: Dict[str, Any]):
+        self._profiles[user_id] = profile
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.max_entries:
+            self._profiles.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def add(self, user_id: int, profile: Dict[str, Any], version: int) -> Dict[str, Any]:
+        """
+        Положить профиль, прочитанный из БД при данной version. Если профиль
+        уже есть или с тех пор были изменения, кэш не трогается: возвращается
+        имеющийся профиль, а прочитанный - только вызывающему.
+        """
+        cached = self._profiles.get(user_id)
+        if cached is not None:
+            return cached
+        if version == self.version:
+            self.put(user_id, profile)
+        return profile
+
+    def update(self, user_id: int, **fields: Any):
+        """Изменить поля профиля, если он в кэше (иначе он загрузится при следующем чтении)"""
+        self.version += 1
+        profile = self._profiles.get(user_id)
+        if profile is not None:
+            profile.update(fields)
+
+    def discard(self, user_id: int):
+        """Убрать профиль: запись в БД не изменила строку users (её нет)"""
+        self.version += 1
+        self._profiles.pop(user_id, None)
+
+    def load(self, rows: Iterable[Any]):
+        """Заполнение из строк users (user_id, group_name, notifications_enabled, notify_minute)"""
+        for row in rows:
+            self.put(row["user_id"], profile_from_row(row))
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def get_stats(self) -> Dict[str, float]:
+        stats: Dict[str, float] = dict(self.stats)
+        total = stats["hits"] + stats["misses"]
+        stats["entries"] = len(self._profiles)
+        stats["hit_ratio"] = stats["hits"] / total if total else 0.0
+        return stats
+
+
+def profile_from_row(row: Any) -> Dict[str, Any]:
+    return {
+        "group_name": row["group_name"],
+        "notifications_enabled": bool(row["notifications_enabled"]) if row["notifications_enabled"] is not None else True,
+        "notify_minute": row["notify_minute"],
+    }
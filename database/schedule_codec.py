@@ -0,0 +1,186 @@
+"""
+Двоичный формат кэша расписания: одна сжатая запись на группу и ISO-неделю.
+
+Запись: b"SW" + версия формата (1 байт) + zlib(тело). Тело:
+  * заголовок <HB: число строк, число дней;
+  * длины строк в символах (<I на строку);
+  * дни - заголовок <BBI20sHHHH: номер дня недели (0 - понедельник),
+    флаги, fetched_at, отпечаток (sha1), индексы строк даты, дня недели
+    и группы, число занятий; затем занятия <6H: номер пары и индексы
+    строк времени, предмета, типа, преподавателя и аудитории;
+  * текст всех строк подряд (UTF-8).
+
+Повторяющиеся значения (преподаватели, предметы, аудитории, время пар)
+хранятся в таблице строк один раз. День, который не укладывается в
+схему (другие поля, нечисловой номер пары), хранится строкой JSON.
+"""
+import json
+import struct
+import zlib
+from datetime import date, timedelta
+from collections import defaultdict
+from itertools import accumulate, chain, count
+from operator import itemgetter
+from typing import Any, Dict, Optional, Tuple
+
+FORMAT_VERSION = 1
+MAGIC = b"SW"
+
+DAY_KEYS = frozenset(("date", "day_of_week", "group_name", "lessons"))
+LESSON_KEYS = ("number", "time", "name", "type", "teacher", "room")
+
+_HEADER = struct.Struct("<HB")
+_DAY = struct.Struct("<BBI20sHHHH")
+_LESSON = struct.Struct("<6H")
+_lesson_values = itemgetter(*LESSON_KEYS)
+
+_DIGEST_SIZE = 20
+_NO_DIGEST = b"\0" * _DIGEST_SIZE
+
+_HAS_FINGERPRINT = 1
+_JSON_DAY = 2
+
+# {номер дня недели: (расписание, отпечаток, fetched_at)}
+WeekDays = Dict[int, Tuple[Dict[str, Any], Optional[str], int]]
+
+
+class CacheFormatError(ValueError):
+    """Запись кэша повреждена или записана неизвестной версией формата"""
+
+
+def week_of(day: str) -> Tuple[str, int]:
+    """('YYYY-MM-DD' понедельника, номер дня недели) для даты 'YYYY-MM-DD'"""
+    parsed = date.fromisoformat(day)
+    return (parsed - timedelta(days=parsed.weekday())).isoformat(), parsed.weekday()
+
+
+def day_of(week: str, offset: int) -> str:
+    """Дата 'YYYY-MM-DD' дня недели offset"""
+    return (date.fromisoformat(week) + timedelta(days=offset)).isoformat()
+
+
+def _day_fields(schedule: Dict[str, Any]) -> Optional[list]:
+    """
+    Значения дня в порядке записи: дата, день недели, группа, затем поля
+    занятий подряд. None - день не укладывается в схему.
+    """
+    lessons = schedule.get("lessons")
+    if len(schedule) != len(DAY_KEYS) or not isinstance(lessons, list) or set(schedule) != DAY_KEYS:
+        return None
+    try:
+        rows = list(map(_lesson_values, lessons))
+    except (KeyError, TypeError):
+        return None
+    if any(len(lesson) != len(LESSON_KEYS) for lesson in lessons):
+        return None
+
+    fields = [schedule["date"], schedule["day_of_week"], schedule["group_name"], *chain.from_iterable(rows)]
+    numbers = fields[3::len(LESSON_KEYS)]
+    if not all(type(number) is int and 0 <= number <= 0xFFFF for number in numbers):
+        return None
+    del fields[3::len(LESSON_KEYS)]
+    if set(map(type, fields)) != {str}:
+        return None
+    return [numbers, fields]
+
+
+def encode_week(days: WeekDays) -> bytes:
+    """Сжатая запись недели из {номер дня: (расписание, отпечаток, fetched_at)}"""
+    # Индекс строки - номер её первого появления; порядок ключей совпадает с индексами
+    index: Dict[str, int] = defaultdict(count().__next__)
+    intern = index.__getitem__
+
+    chunks = []
+    for offset, (schedule, fingerprint, fetched_at) in sorted(days.items()):
+        digest = _digest(fingerprint)
+        flags = _HAS_FINGERPRINT if digest else 0
+        layout = _day_fields(schedule)
+
+        if layout is None:
+            flags |= _JSON_DAY
+            text = intern(json.dumps(schedule, ensure_ascii=False))
+            chunks.append(_DAY.pack(offset, flags, int(fetched_at), digest or _NO_DIGEST, text, 0, 0, 0))
+            continue
+
+        numbers, fields = layout
+        positions = list(map(intern, fields))
+        chunks.append(_DAY.pack(offset, flags, int(fetched_at), digest or _NO_DIGEST, *positions[:3], len(numbers)))
+        if numbers:
+            width = len(LESSON_KEYS)
+            lessons = [0] * (width * len(numbers))
+            lessons[::width] = numbers
+            for field in range(1, width):
+                lessons[field::width] = positions[2 + field::width - 1]
+            chunks.append(struct.pack(f"<{len(lessons)}H", *lessons))
+
+    if len(index) > 0xFFFF:
+        raise ValueError("Слишком много строк в записи недели")
+
+    body = b"".join((
+        _HEADER.pack(len(index), len(days)),
+        struct.pack(f"<{len(index)}I", *map(len, index)),
+        *chunks,
+        "".join(index).encode("utf-8"),
+    ))
+    return MAGIC + bytes((FORMAT_VERSION,)) + zlib.compress(body)
+
+
+def decode_week(record: bytes) -> WeekDays:
+    """Обратное к encode_week; CacheFormatError для чужой или повреждённой записи"""
+    if record[:2] != MAGIC or len(record) < 3:
+        raise CacheFormatError("Не запись недели")
+    if record[2] != FORMAT_VERSION:
+        raise CacheFormatError(f"Неизвестная версия формата: {record[2]}")
+
+    try:
+        body = zlib.decompress(record[3:])
+        string_count, day_count = _HEADER.unpack_from(body)
+        position = _HEADER.size
+        lengths = struct.unpack_from(f"<{string_count}I", body, position)
+        position += 4 * string_count
+
+        layout = []
+        for _ in range(day_count):
+            day = _DAY.unpack_from(body, position)
+            position += _DAY.size
+            lessons = list(_LESSON.iter_unpack(body[position:position + _LESSON.size * day[7]]))
+            position += _LESSON.size * day[7]
+            layout.append((day, lessons))
+
+        text = body[position:].decode("utf-8")
+        bounds = list(accumulate(lengths, initial=0))
+        strings = [text[start:end] for start, end in zip(bounds, bounds[1:])]
+
+        days: WeekDays = {}
+        for (offset, flags, fetched_at, digest, date_index, dow_index, group_index, _), lessons in layout:
+            if flags & _JSON_DAY:
+                schedule = json.loads(strings[date_index])
+            else:
+                schedule = {
+                    "date": strings[date_index],
+                    "lessons": [
+                        {
+                            "number": number, "time": strings[time], "name": strings[name],
+                            "type": strings[type_], "teacher": strings[teacher], "room": strings[room],
+                        }
+                        for number, time, name, type_, teacher, room in lessons
+                    ],
+                    "day_of_week": strings[dow_index],
+                    "group_name": strings[group_index],
+                }
+            fingerprint = digest.hex() if flags & _HAS_FINGERPRINT else None
+            days[offset] = (schedule, fingerprint, fetched_at)
+        return days
+    except Exception as e:
+        raise CacheFormatError(f"Повреждённая запись недели: {e}") from e
+
+
+def _digest(fingerprint: Optional[str]) -> Optional[bytes]:
+    """Отпечаток sha1 в байтах; отпечаток другого вида не сохраняется"""
+    if not fingerprint:
+        return None
+    try:
+        digest = bytes.fromhex(fingerprint)
+    except ValueError:
+        return None
+    return digest if len(digest) == _DIGEST_SIZE else None
@@ -1,7 +1,6 @@
 import asyncio
 import sys
 from pathlib import Path
-from datetime import datetime
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
@@ -10,27 +9,52 @@ from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import settings
 from database import init_db, close_db, get_db
+from database.fsm_storage import SQLiteStorage
 from bot.handlers import start, schedule, settings as settings_handlers
 from bot.handlers.admin import admin_router
-from bot.handlers.notification import send_night_notifications
+from bot.handlers.notification import change_watch_job, night_send_cron, night_send_job, night_warmup_cron, night_warmup_job
+from services import (
+    init_http_client, close_http_client, init_group_directory, close_group_directory,
+    init_worker_pool, close_worker_pool, get_image_generator,
+)
+from services.broadcasts import init_broadcast_worker, close_broadcast_worker
+from services.cache_maintenance import get_cache_maintenance
+from services.change_detector import init_change_notifier, close_change_notifier
+from services.scheduler import init_scheduler, close_scheduler
 from utils.logger import logger
 
 
-async def cache_cleanup_task():
-    """Фоновая задача: очистка старого кэша раз в сутки ≈ в 4:05 утра"""
-    while True:
-        try:
-            now = datetime.now()
-            if now.hour == 4 and now.minute == 5:  # можно изменить время
-                db = get_db()
-                await db.clear_old_cache(days=14)
-                logger.info("Выполнена плановая очистка кэша расписания")
-                await asyncio.sleep(82800)  # почти сутки (23 часа)
-            else:
-                await asyncio.sleep(300)  # проверяем каждые 5 минут
-        except Exception as e:
-            logger.error(f"Ошибка в задаче очистки кэша: {e}")
-            await asyncio.sleep(3600)  # при ошибке ждём час
+async def cache_cleanup_job():
+    """Задача планировщика: вытеснение устаревших и лишних недель кэша небольшими пачками"""
+    await get_cache_maintenance().evict()
+
+
+async def db_optimize_job():
+    """Задача планировщика: PRAGMA optimize и возврат свободного места в файле базы"""
+    await get_cache_maintenance().optimize()
+
+
+async def schedule_jobs(bot: Bot):
+    """Фоновые задачи по расписанию (часовой пояс - settings.TIMEZONE)"""
+    scheduler = await init_scheduler()
+    await scheduler.add_job(
+        "night_warmup", night_warmup_cron(), night_warmup_job,
+        jitter=60, catch_up=settings.NOTIFY_WARMUP_MINUTES * 60
+    )
+    await scheduler.add_job(
+        "night_notifications", night_send_cron(), lambda: night_send_job(bot),
+        catch_up=settings.NOTIFY_CATCH_UP_MINUTES * 60
+    )
+    await scheduler.add_job(
+        "cache_cleanup", settings.CACHE_CLEANUP_CRON, cache_cleanup_job,
+        jitter=60, catch_up=24 * 3600
+    )
+    await scheduler.add_job(
+        "db_optimize", settings.DB_OPTIMIZE_CRON, db_optimize_job,
+        jitter=300, catch_up=24 * 3600
+    )
+    if settings.CHANGE_WATCH_CRON:
+        await scheduler.add_job("change_watch", settings.CHANGE_WATCH_CRON, change_watch_job, jitter=120)
 
 
 async def main():
@@ -46,13 +70,28 @@ async def main():
     await init_db(settings.DATABASE_PATH)
     logger.info("База данных инициализирована")
 
+    # Пул исполнителей для разбора HTML и отрисовки изображений
+    init_worker_pool()
+
+    # Генератор изображений: шрифты, цвета и шаблоны готовятся один раз
+    get_image_generator()
+
+    # Общий HTTP-клиент для запросов к сайту расписания
+    await init_http_client()
+
+    # Справочник групп: загрузка в фоне и периодическое обновление
+    await init_group_directory()
+
     # Инициализируем бота и диспетчер
     bot = Bot(
         token=settings.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
 
-    storage = MemoryStorage()
+    if settings.FSM_STORAGE == "sqlite":
+        storage = SQLiteStorage(get_db(), max_entries=settings.FSM_CACHE_SIZE)
+    else:
+        storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
 
     # Регистрируем все роутеры
@@ -62,9 +101,14 @@ async def main():
     dp.include_router(admin_router)
     logger.info("Все роутеры зарегистрированы (включая админ-панель)")
 
+    # Обработчик рассылок: продолжает незавершённые после перезапуска
+    await init_broadcast_worker(bot)
+
+    # Уведомления подписчиков об изменениях расписания
+    await init_change_notifier(bot)
+
     # Запускаем фоновые задачи
-    asyncio.create_task(send_night_notifications(bot))
-    asyncio.create_task(cache_cleanup_task())
+    await schedule_jobs(bot)
     logger.info("Запущены фоновые задачи: вечерние уведомления, очистка кэша")
 
     try:
@@ -78,8 +122,9 @@ async def main():
         logger.info(f"   • База данных:    {settings.DATABASE_PATH}")
         logger.info(f"   • Режим:          изображения с водяным знаком FLEIZY")
 
-        logger.info(f"   • Уведомления:    вечерние уведомления в 19:00")
-        logger.info(f"   • Очистка кэша:   ежедневно в ~4:05")
+        logger.info(f"   • Уведомления:    вечером, по выбору пользователя (по умолчанию {settings.NOTIFY_DEFAULT_TIME})")
+        logger.info(f"   • Очистка кэша:   по расписанию «{settings.CACHE_CLEANUP_CRON}»")
+        logger.info(f"   • Обслуживание БД: по расписанию «{settings.DB_OPTIMIZE_CRON}»")
         logger.info("=" * 60)
 
         # Запускаем polling
@@ -90,6 +135,12 @@ async def main():
 
     finally:
         # Закрываем соединения
+        await close_scheduler()
+        await close_broadcast_worker()
+        await close_change_notifier()
+        await close_group_directory()
+        await close_http_client()
+        close_worker_pool()
         await close_db()
         await bot.session.close()
         logger.info("Бот остановлен")
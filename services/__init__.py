@@ -1,6 +1,19 @@
 """Сервисы"""
-from .parser import ScheduleParser, create_parser
+from .workers import WorkerPool, init_worker_pool, close_worker_pool, get_worker_pool, render_schedule_image
+from .http_client import HttpClient, init_http_client, close_http_client, get_http_client
+from .parser import ScheduleParser, get_parser
+from .group_directory import GroupDirectory, init_group_directory, close_group_directory, get_group_directory
+from .schedule_cache import ScheduleCache, get_schedule_cache
 from .formatter import ScheduleFormatter
-from .image_generator import ScheduleImageGenerator
+from .image_generator import ScheduleImageGenerator, get_image_generator
+from .image_cache import ImageCache, get_image_cache
 
-__all__ = ["ScheduleParser", "create_parser", "ScheduleFormatter", "ScheduleImageGenerator"]
+__all__ = [
+    "WorkerPool", "init_worker_pool", "close_worker_pool", "get_worker_pool", "render_schedule_image",
+    "HttpClient", "init_http_client", "close_http_client", "get_http_client",
+    "ScheduleParser", "get_parser",
+    "GroupDirectory", "init_group_directory", "close_group_directory", "get_group_directory",
+    "ScheduleCache", "get_schedule_cache",
+    "ScheduleFormatter", "ScheduleImageGenerator", "get_image_generator",
+    "ImageCache", "get_image_cache",
+]
@@ -0,0 +1,148 @@
+"""Рассылки администратора: задания в SQLite и фоновый обработчик"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+from aiogram import Bot
+
+from config import settings
+from database import get_db
+from services.send_dispatcher import get_send_dispatcher
+from utils.logger import logger
+
+
+class BroadcastWorker:
+    """
+    Фоновый обработчик рассылок. Задание хранится в таблице broadcast_jobs
+    вместе с курсором - последним обработанным user_id. Пользователи
+    читаются пачками по batch_size (keyset-пагинация), после каждой пачки
+    курсор и счётчики сохраняются, поэтому после перезапуска рассылка
+    продолжается с места остановки (повторно может уйти не больше одной пачки),
+    а память не зависит от числа пользователей.
+    """
+
+    def __init__(self, bot: Bot, batch_size: int = 200):
+        self.bot = bot
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        # Скорость считается по текущему запуску: {job_id: (время старта, обработано на старте)}
+        self._progress: Dict[int, tuple] = {}
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Сообщить о новом задании"""
+        self._wakeup.set()
+
+    async def submit(self, text: str, created_by: int) -> int:
+        """Поставить рассылку в очередь; возвращает номер задания"""
+        job_id = await get_db().create_broadcast_job(text, created_by)
+        self.wake()
+        return job_id
+
+    def describe(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Задание с добавленными processed, rate (сообщ./с) и eta (с)"""
+        info = dict(job)
+        info["processed"] = job["sent"] + job["failed"]
+        info["rate"] = 0.0
+        info["eta"] = None
+
+        if job["status"] == "done":
+            duration = (job["finished_at"] or job["created_at"]) - job["created_at"]
+            info["rate"] = info["processed"] / duration if duration > 0 else 0.0
+            return info
+
+        progress = self._progress.get(job["id"])
+        if progress is not None:
+            started, processed_at_start = progress
+            elapsed = time.monotonic() - started
+            if elapsed > 0:
+                info["rate"] = (info["processed"] - processed_at_start) / elapsed
+            if info["rate"] > 0:
+                info["eta"] = max(job["total"] - info["processed"], 0) / info["rate"]
+        return info
+
+    async def _loop(self):
+        while True:
+            try:
+                for job in await get_db().get_unfinished_broadcast_jobs():
+                    await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обработчика рассылок: {e}")
+                await asyncio.sleep(30)
+                continue
+
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+    async def _run_job(self, job: Dict[str, Any]):
+        db = get_db()
+        job_id, text = job["id"], job["text"]
+        cursor, sent, failed = job["last_user_id"], job["sent"], job["failed"]
+
+        if cursor:
+            logger.info(f"Продолжение рассылки #{job_id} после user_id {cursor} (отправлено {sent}, ошибок {failed})")
+        else:
+            logger.info(f"Запуск рассылки #{job_id} на {job['total']} пользователей")
+        self._progress[job_id] = (time.monotonic(), sent + failed)
+
+        dispatcher = get_send_dispatcher()
+        try:
+            while True:
+                user_ids = await db.get_user_ids_after(cursor, self.batch_size)
+                if not user_ids:
+                    break
+
+                report = await dispatcher.deliver(
+                    ((user_id, lambda user_id=user_id: self.bot.send_message(user_id, text)) for user_id in user_ids),
+                    name=f"рассылка #{job_id}"
+                )
+                cursor = user_ids[-1]
+                sent += report["sent"]
+                failed += report["failed"]
+                await db.update_broadcast_progress(job_id, cursor, sent, failed)
+
+            await db.finish_broadcast_job(job_id)
+            logger.info(f"Рассылка #{job_id} завершена: отправлено {sent}, ошибок {failed}")
+        finally:
+            self._progress.pop(job_id, None)
+
+
+# Глобальный экземпляр
+_broadcast_worker: Optional[BroadcastWorker] = None
+
+
+def get_broadcast_worker() -> BroadcastWorker:
+    """Получить обработчик рассылок"""
+    if _broadcast_worker is None:
+        raise RuntimeError("Обработчик рассылок не инициализирован. Вызовите init_broadcast_worker()")
+    return _broadcast_worker
+
+
+async def init_broadcast_worker(bot: Bot) -> BroadcastWorker:
+    """Инициализация обработчика рассылок; незавершённые рассылки продолжаются"""
+    global _broadcast_worker
+    _broadcast_worker = BroadcastWorker(bot, batch_size=settings.BROADCAST_BATCH_SIZE)
+    await _broadcast_worker.start()
+    return _broadcast_worker
+
+
+async def close_broadcast_worker():
+    """Остановка обработчика рассылок (прогресс уже сохранён в БД)"""
+    global _broadcast_worker
+    if _broadcast_worker:
+        await _broadcast_worker.close()
+        _broadcast_worker = None
@@ -0,0 +1,165 @@
+"""Обслуживание кэша расписания в SQLite: вытеснение небольшими пачками, optimize и VACUUM"""
+import asyncio
+import math
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import settings
+from database import get_db
+from utils.logger import logger
+
+
+class CacheMaintenance:
+    """
+    Ограничение роста базы без долгих блокировок записи.
+
+    evict() (часто, по CACHE_CLEANUP_CRON):
+    - удаляет недели, не обновлявшиеся retention_days, пачками по
+      batch_size по индексу fetched_at;
+    - если недель больше max_weeks или данных больше max_bytes, удаляет
+      дольше всех не читавшиеся (accessed_at);
+    - удаляет file_id изображений старше retention_days: изображения
+      с датами тех недель уже не понадобятся, а при повторе загрузятся снова;
+    - удаляет состояния FSM, не менявшиеся fsm_ttl_days (брошенные меню).
+    Между пачками делается пауза, чтобы запись обработчиков не ждала;
+    за один запуск - не больше max_batches пачек, остальное - в следующий.
+
+    optimize() (раз в сутки): PRAGMA optimize и возврат свободных страниц.
+    Полный VACUUM - только если база ещё не в режиме auto_vacuum=INCREMENTAL
+    и свободные страницы занимают больше vacuum_free_ratio файла.
+    """
+
+    def __init__(
+        self,
+        retention_days: float = 14,
+        max_weeks: int = 20000,
+        max_bytes: int = 64 * 1024 * 1024,
+        batch_size: int = 200,
+        max_batches: int = 50,
+        pause: float = 0.05,
+        vacuum_free_ratio: float = 0.3,
+        vacuum_pages: int = 2000,
+        fsm_ttl_days: float = 7,
+    ):
+        self.retention_days = retention_days
+        self.max_weeks = max_weeks
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.pause = pause
+        self.vacuum_free_ratio = vacuum_free_ratio
+        self.vacuum_pages = vacuum_pages
+        self.fsm_ttl_days = fsm_ttl_days
+        self._lock = asyncio.Lock()
+        self.stats: Dict[str, float] = {
+            "runs": 0, "expired": 0, "evicted": 0, "batches": 0, "last_duration": 0.0,
+            "weeks": 0, "bytes": 0, "optimizations": 0, "freed_pages": 0, "vacuums": 0,
+            "fsm_states": 0, "file_ids": 0,
+        }
+
+    async def evict(self) -> Dict[str, int]:
+        """Один проход вытеснения; возвращает число удалённых записей по причинам"""
+        async with self._lock:
+            started = time.monotonic()
+            db = get_db()
+            await db.flush_week_access()
+            self._batches = 0
+
+            threshold = int(time.time() - self.retention_days * 86400)
+            expired = await self._in_batches(lambda limit: db.delete_expired_weeks(threshold, limit))
+
+            evicted = 0
+            weeks, size = await db.get_cache_size()
+            excess = self._excess(weeks, size)
+            if excess:
+                evicted = await self._in_batches(db.delete_least_used_weeks, excess)
+                weeks, size = await db.get_cache_size()
+
+            file_ids = await self._in_batches(lambda limit: db.delete_expired_file_ids(threshold, limit))
+
+            fsm_threshold = int(time.time() - self.fsm_ttl_days * 86400)
+            fsm_states = await self._in_batches(lambda limit: db.delete_stale_fsm_records(fsm_threshold, limit))
+
+            duration = time.monotonic() - started
+            self.stats["runs"] += 1
+            self.stats["expired"] += expired
+            self.stats["evicted"] += evicted
+            self.stats["fsm_states"] += fsm_states
+            self.stats["file_ids"] += file_ids
+            self.stats["batches"] += self._batches
+            self.stats["last_duration"] = duration
+            self.stats["weeks"] = weeks
+            self.stats["bytes"] = size
+            if expired or evicted or file_ids:
+                logger.info(
+                    f"Кэш расписания: удалено устаревших недель {expired}, вытеснено {evicted}, "
+                    f"file_id изображений {file_ids} "
+                    f"за {duration:.2f} с; осталось {weeks} недель, {size / 1024 / 1024:.1f} МБ"
+                )
+            return {"expired": expired, "evicted": evicted, "file_ids": file_ids}
+
+    async def optimize(self):
+        """Статистика планировщика запросов и возврат свободного места"""
+        async with self._lock:
+            db = get_db()
+            await db.optimize()
+            self.stats["optimizations"] += 1
+
+            pages = await db.get_page_stats()
+            free_ratio = pages["freelist_count"] / pages["page_count"] if pages["page_count"] else 0.0
+            if pages["auto_vacuum"] == 2:
+                # INCREMENTAL: свободные страницы возвращаются понемногу, без перестройки файла
+                freed = 0
+                while freed < pages["freelist_count"]:
+                    step = min(self.vacuum_pages, pages["freelist_count"] - freed)
+                    await db.incremental_vacuum(step)
+                    freed += step
+                    await asyncio.sleep(self.pause)
+                self.stats["freed_pages"] += freed
+            elif free_ratio > self.vacuum_free_ratio:
+                started = time.monotonic()
+                await db.vacuum()
+                self.stats["vacuums"] += 1
+                logger.info(f"VACUUM базы: свободно было {free_ratio:.0%} страниц, {time.monotonic() - started:.1f} с")
+
+    def get_stats(self) -> Dict[str, float]:
+        return dict(self.stats)
+
+    def _excess(self, weeks: int, size: int) -> int:
+        """Сколько недель нужно вытеснить, чтобы уложиться в ограничения"""
+        excess = weeks - self.max_weeks if self.max_weeks else 0
+        if self.max_bytes and size > self.max_bytes and weeks:
+            excess = max(excess, math.ceil((size - self.max_bytes) / (size / weeks)))
+        return max(excess, 0)
+
+    async def _in_batches(self, delete: Callable[[int], Awaitable[int]], total: Optional[int] = None) -> int:
+        """Удаление пачками по batch_size, пока есть что удалять (или до total)"""
+        deleted = 0
+        while self._batches < self.max_batches and (total is None or deleted < total):
+            limit = self.batch_size if total is None else min(self.batch_size, total - deleted)
+            count = await delete(limit)
+            self._batches += 1
+            deleted += count
+            if count < limit:
+                break
+            await asyncio.sleep(self.pause)
+        return deleted
+
+
+# Глобальный экземпляр
+_cache_maintenance: Optional[CacheMaintenance] = None
+
+
+def get_cache_maintenance() -> CacheMaintenance:
+    """Получить обслуживание кэша (создаётся при первом обращении)"""
+    global _cache_maintenance
+    if _cache_maintenance is None:
+        _cache_maintenance = CacheMaintenance(
+            retention_days=settings.CACHE_RETENTION_DAYS,
+            max_weeks=settings.CACHE_MAX_WEEKS,
+            max_bytes=int(settings.CACHE_MAX_MB * 1024 * 1024),
+            batch_size=settings.CACHE_EVICT_BATCH,
+            vacuum_free_ratio=settings.DB_VACUUM_FREE_RATIO,
+            fsm_ttl_days=settings.FSM_STATE_TTL_DAYS,
+        )
+    return _cache_maintenance
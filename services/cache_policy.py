@@ -0,0 +1,59 @@
+"""Политика времени жизни кэша расписания в зависимости от даты"""
+from datetime import datetime, date as date_type
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from config import settings
+
+
+class CacheTTLPolicy:
+    """
+    TTL записи кэша зависит от того, насколько дата близка к сегодняшней:
+    прошедшие дни не меняются, сегодня/завтра меняются чаще всего,
+    а дальние недели - редко.
+    """
+
+    def __init__(
+        self,
+        near_ttl: float = 15 * 60,
+        soon_ttl: float = 60 * 60,
+        far_ttl: float = 6 * 3600,
+        past_ttl: float = float("inf"),
+        near_days: int = 1,
+        far_days: int = 14,
+        tz: str = "Europe/Moscow",
+    ):
+        self.near_ttl = near_ttl
+        self.soon_ttl = soon_ttl
+        self.far_ttl = far_ttl
+        self.past_ttl = past_ttl
+        self.near_days = near_days
+        self.far_days = far_days
+        self.tz = ZoneInfo(tz)
+
+    def today(self) -> date_type:
+        return datetime.now(self.tz).date()
+
+    def ttl_for(self, day: date_type, today: Optional[date_type] = None) -> float:
+        """TTL (в секундах) для расписания на указанный день"""
+        if today is None:
+            today = self.today()
+        delta = (day - today).days
+
+        if delta < 0:
+            return self.past_ttl
+        if delta <= self.near_days:
+            return self.near_ttl
+        if delta < self.far_days:
+            return self.soon_ttl
+        return self.far_ttl
+
+    @classmethod
+    def from_settings(cls) -> "CacheTTLPolicy":
+        return cls(
+            near_ttl=settings.CACHE_TTL_NEAR_MINUTES * 60,
+            soon_ttl=settings.CACHE_TTL_SOON_MINUTES * 60,
+            far_ttl=settings.CACHE_TTL_FAR_MINUTES * 60,
+            past_ttl=settings.CACHE_TTL_PAST_DAYS * 86400 if settings.CACHE_TTL_PAST_DAYS else float("inf"),
+            tz=settings.TIMEZONE,
+        )
@@ -0,0 +1,210 @@
+"""Обнаружение изменений расписания: отпечатки дней и уведомления подписчиков"""
+import asyncio
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from aiogram import Bot
+
+from config import settings
+from database import get_db
+from services.formatter import ScheduleFormatter
+from services.send_dispatcher import get_send_dispatcher
+from utils.logger import logger
+
+
+LESSON_FIELDS = ("number", "time", "name", "type", "teacher", "room")
+
+Lesson = Dict[str, Any]
+ScheduleDiff = Dict[str, List[Any]]
+
+
+def _normalize_lesson(lesson: Lesson) -> Tuple[str, ...]:
+    return tuple(" ".join(str(lesson.get(field, "")).split()) for field in LESSON_FIELDS)
+
+
+def _slot(lesson: Lesson) -> Tuple[str, ...]:
+    return _normalize_lesson(lesson)[:2]
+
+
+def _subject(lesson: Lesson) -> Tuple[str, ...]:
+    return _normalize_lesson(lesson)[2:5]
+
+
+def schedule_fingerprint(schedule: Dict[str, Any]) -> str:
+    """
+    Отпечаток расписания дня: хэш отсортированных занятий с нормализованными
+    пробелами. Не зависит от порядка занятий и служебных полей ("stale").
+    """
+    lessons = sorted(_normalize_lesson(lesson) for lesson in schedule.get("lessons", []))
+    return hashlib.sha1(json.dumps(lessons, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def diff_schedules(old: Dict[str, Any], new: Dict[str, Any]) -> ScheduleDiff:
+    """
+    Разница двух версий расписания дня:
+    - added / removed - новые и отменённые занятия;
+    - moved - [(было, стало)]: тот же предмет, преподаватель и тип в другую пару;
+    - room_changed - [(было, стало)]: та же пара в другой аудитории.
+    """
+    new_left = list(new.get("lessons", []))
+    old_left = []
+
+    # Полностью совпадающие занятия не изменились
+    for lesson in old.get("lessons", []):
+        match = next((i for i, other in enumerate(new_left) if _normalize_lesson(other) == _normalize_lesson(lesson)), None)
+        if match is None:
+            old_left.append(lesson)
+        else:
+            new_left.pop(match)
+
+    diff: ScheduleDiff = {"added": [], "removed": [], "moved": [], "room_changed": []}
+    for kind, same_slot in (("room_changed", True), ("moved", False)):
+        rest = []
+        for lesson in old_left:
+            match = next(
+                (
+                    i for i, other in enumerate(new_left)
+                    if _subject(other) == _subject(lesson) and (_slot(other) == _slot(lesson)) == same_slot
+                ),
+                None
+            )
+            if match is None:
+                rest.append(lesson)
+            else:
+                diff[kind].append((lesson, new_left.pop(match)))
+        old_left = rest
+
+    diff["removed"] = old_left
+    diff["added"] = new_left
+    return diff
+
+
+def has_changes(diff: ScheduleDiff) -> bool:
+    return any(diff.values())
+
+
+class ChangeNotifier:
+    """
+    Рассылка изменений расписания подписчикам затронутых групп.
+    Кэш расписания сообщает об изменённых днях при обновлении недели;
+    изменения одной группы, пришедшие в течение delay секунд, объединяются
+    в одно сообщение. Отправка идёт через общий диспетчер и не задерживает
+    обновление кэша.
+    """
+
+    def __init__(self, bot: Bot, delay: float = 5.0, alert_days: int = 7):
+        self.bot = bot
+        self.delay = delay
+        self.alert_days = alert_days
+        self.tz = ZoneInfo(settings.TIMEZONE)
+        # {группа: {день: (расписание до изменений, последнее расписание)}}
+        self._pending: Dict[str, Dict[date, Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {"changed_days": 0, "suppressed": 0, "alerts": 0, "sent": 0}
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def report(self, group_name: str, changes: Dict[date, Tuple[Dict[str, Any], Dict[str, Any]]]):
+        """Изменённые дни группы после обновления: {день: (было, стало)}"""
+        today = datetime.now(self.tz).date()
+        last_day = today + timedelta(days=self.alert_days)
+        changes = {day: versions for day, versions in changes.items() if today <= day <= last_day}
+        if not changes:
+            return
+
+        # Все дни разом опустели - скорее всего сбой сайта, а не отмена занятий
+        if all(not new.get("lessons") for _, new in changes.values()) and len(changes) > 1:
+            self.stats["suppressed"] += len(changes)
+            logger.warning(f"Расписание {group_name} опустело на {len(changes)} дней - уведомление не отправлено")
+            return
+
+        self.stats["changed_days"] += len(changes)
+        pending = self._pending.setdefault(group_name, {})
+        for day, (old, new) in changes.items():
+            first_old = pending[day][0] if day in pending else old
+            pending[day] = (first_old, new)
+        self._wakeup.set()
+
+    def get_stats(self) -> Dict[str, int]:
+        stats = dict(self.stats)
+        stats["pending_groups"] = len(self._pending)
+        return stats
+
+    async def _loop(self):
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.delay)
+            self._wakeup.clear()
+            pending, self._pending = self._pending, {}
+            for group_name, days in pending.items():
+                try:
+                    await self._notify(group_name, days)
+                except Exception as e:
+                    logger.error(f"Ошибка рассылки изменений расписания {group_name}: {e}")
+
+    async def _notify(self, group_name: str, days: Dict[date, Tuple[Dict[str, Any], Dict[str, Any]]]):
+        diffs = {day: diff_schedules(old, new) for day, (old, new) in sorted(days.items())}
+        # Изменение могло откатиться, пока копились обновления
+        diffs = {day: diff for day, diff in diffs.items() if has_changes(diff)}
+        if not diffs:
+            return
+
+        user_ids = await get_db().get_group_subscribers(group_name)
+        logger.info(f"Расписание {group_name} изменилось ({len(diffs)} дн.) → {len(user_ids)} подписчиков")
+        if not user_ids:
+            return
+
+        self.stats["alerts"] += 1
+        text = ScheduleFormatter.format_changes(group_name, diffs)
+        report = await get_send_dispatcher().deliver(
+            ((user_id, lambda user_id=user_id: self.bot.send_message(user_id, text)) for user_id in user_ids),
+            name=f"изменения расписания {group_name}"
+        )
+        self.stats["sent"] += report["sent"]
+
+
+# Глобальный экземпляр
+_change_notifier: Optional[ChangeNotifier] = None
+
+
+def get_change_notifier() -> Optional[ChangeNotifier]:
+    """Получить рассыльщик изменений (None, если уведомления об изменениях не запущены)"""
+    return _change_notifier
+
+
+def report_schedule_changes(group_name: str, changes: Dict[date, Tuple[Dict[str, Any], Dict[str, Any]]]):
+    """Сообщить об изменённых днях; без запущенного рассыльщика только пишется в лог"""
+    if _change_notifier is None:
+        logger.info(f"Расписание {group_name} изменилось: {', '.join(str(day) for day in sorted(changes))}")
+        return
+    _change_notifier.report(group_name, changes)
+
+
+async def init_change_notifier(bot: Bot) -> ChangeNotifier:
+    """Инициализация рассылки изменений расписания"""
+    global _change_notifier
+    _change_notifier = ChangeNotifier(bot, delay=settings.CHANGE_ALERT_DELAY, alert_days=settings.CHANGE_ALERT_DAYS)
+    await _change_notifier.start()
+    return _change_notifier
+
+
+async def close_change_notifier():
+    """Остановка рассылки изменений"""
+    global _change_notifier
+    if _change_notifier:
+        await _change_notifier.close()
+        _change_notifier = None
@@ -0,0 +1,172 @@
+"""Отправка изображений расписания с переиспользованием file_id Telegram"""
+import asyncio
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, InputMediaPhoto, Message
+
+from database import get_db
+from services.image_cache import schedule_image_key
+from services.workers import render_schedule_image
+from utils.logger import logger
+
+
+PhotoSend = Callable[[Union[str, BufferedInputFile]], Awaitable[Message]]
+
+
+class FileIdCache:
+    """
+    file_id, которые Telegram вернул для загруженных изображений,
+    по ключу изображения (хэш расписания и оформления). Хранится в
+    таблице image_file_ids, последние max_entries - ещё и в памяти.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self.stats: Dict[str, int] = {"reused": 0, "uploaded": 0, "fallbacks": 0}
+
+    async def get(self, key: str) -> Optional[str]:
+        file_id = self._memory.get(key)
+        if file_id is not None:
+            self._memory.move_to_end(key)
+            return file_id
+        try:
+            file_id = await get_db().get_image_file_id(key)
+        except Exception as e:
+            logger.error(f"Ошибка чтения file_id {key[:12]}: {e}")
+            return None
+        if file_id is not None:
+            self._remember(key, file_id)
+        return file_id
+
+    async def save(self, key: str, file_id: str):
+        self._remember(key, file_id)
+        try:
+            await get_db().save_image_file_id(key, file_id)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить file_id {key[:12]}: {e}")
+
+    async def forget(self, key: str):
+        self._memory.pop(key, None)
+        try:
+            await get_db().delete_image_file_id(key)
+        except Exception as e:
+            logger.error(f"Не удалось удалить file_id {key[:12]}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        sent = stats["reused"] + stats["uploaded"]
+        stats["reuse_ratio"] = stats["reused"] / sent if sent else 0.0
+        stats["memory_entries"] = len(self._memory)
+        return stats
+
+    def _remember(self, key: str, file_id: str):
+        self._memory[key] = file_id
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+# Глобальный экземпляр
+_file_id_cache: Optional[FileIdCache] = None
+
+
+def get_file_id_cache() -> FileIdCache:
+    """Получить кэш file_id (создаётся при первом обращении)"""
+    global _file_id_cache
+    if _file_id_cache is None:
+        _file_id_cache = FileIdCache()
+    return _file_id_cache
+
+
+def _photo_file_id(message: Message) -> Optional[str]:
+    # Самый большой размер - это исходное изображение
+    return message.photo[-1].file_id if message.photo else None
+
+
+async def send_schedule_photo(send: PhotoSend, schedule: Dict[str, Any], filename: str) -> Message:
+    """
+    Отправить изображение расписания через send(photo).
+    Если это изображение уже загружалось, отправляется его file_id
+    (без отрисовки и загрузки); если Telegram не принял file_id -
+    изображение загружается заново.
+    """
+    cache = get_file_id_cache()
+    key = schedule_image_key(schedule)
+
+    file_id = await cache.get(key)
+    if file_id is not None:
+        try:
+            message = await send(file_id)
+            cache.stats["reused"] += 1
+            return message
+        except TelegramBadRequest as e:
+            cache.stats["fallbacks"] += 1
+            logger.warning(f"file_id {key[:12]} не принят ({e}), изображение загружается заново")
+            await cache.forget(key)
+
+    image = await render_schedule_image(schedule)
+    message = await send(BufferedInputFile(image, filename=filename))
+    cache.stats["uploaded"] += 1
+
+    new_file_id = _photo_file_id(message)
+    if new_file_id:
+        await cache.save(key, new_file_id)
+    return message
+
+
+async def send_schedule_album(
+    send: Callable[[List[InputMediaPhoto]], Awaitable[List[Message]]],
+    items: List[Dict[str, Any]],
+) -> List[Message]:
+    """
+    Отправить альбом изображений через send(media).
+    items - словари с ключами schedule, caption и filename.
+    Уже загружавшиеся изображения отправляются по file_id; если Telegram
+    отклонил альбом с file_id, он отправляется повторно с загрузкой всех файлов.
+    """
+    cache = get_file_id_cache()
+    keys = [schedule_image_key(item["schedule"]) for item in items]
+    file_ids = [await cache.get(key) for key in keys]
+
+    if any(file_ids):
+        try:
+            messages = await send(await _album_media(items, file_ids))
+            await _save_album(cache, keys, file_ids, messages)
+            return messages
+        except TelegramBadRequest as e:
+            cache.stats["fallbacks"] += 1
+            logger.warning(f"Альбом с file_id не принят ({e}), изображения загружаются заново")
+            for key, file_id in zip(keys, file_ids):
+                if file_id is not None:
+                    await cache.forget(key)
+            file_ids = [None] * len(items)
+
+    messages = await send(await _album_media(items, file_ids))
+    await _save_album(cache, keys, file_ids, messages)
+    return messages
+
+
+async def _album_media(items: List[Dict[str, Any]], file_ids: List[Optional[str]]) -> List[InputMediaPhoto]:
+    missing = [item["schedule"] for item, file_id in zip(items, file_ids) if file_id is None]
+    # Недостающие изображения рисуются параллельно в пуле исполнителей
+    rendered = iter(await asyncio.gather(*(render_schedule_image(schedule) for schedule in missing)))
+
+    media = []
+    for item, file_id in zip(items, file_ids):
+        photo = file_id if file_id is not None else BufferedInputFile(next(rendered), filename=item["filename"])
+        media.append(InputMediaPhoto(media=photo, caption=item.get("caption")))
+    return media
+
+
+async def _save_album(cache: FileIdCache, keys: List[str], file_ids: List[Optional[str]], messages: List[Message]):
+    for key, file_id, message in zip(keys, file_ids, messages):
+        if file_id is not None:
+            cache.stats["reused"] += 1
+            continue
+        cache.stats["uploaded"] += 1
+        new_file_id = _photo_file_id(message)
+        if new_file_id:
+            await cache.save(key, new_file_id)
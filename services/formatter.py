@@ -1,6 +1,7 @@
 """Форматирование расписания для отображения"""
-from typing import Dict, List
-from datetime import datetime
+from html import escape
+from typing import Dict, List, Tuple
+from datetime import date, datetime
 
 
 class ScheduleFormatter:
@@ -122,3 +123,86 @@ class ScheduleFormatter:
             Отформатированная строка
         """
         return f"👥 <b>{group['name']}</b>\n{group.get('full_name', '')}"
+        
+    @staticmethod
+    def format_stale_note(schedules) -> str:
+        """
+        Предупреждение об устаревших данных (если расписание взято из кэша
+        при недоступном сайте)
+        
+        Args:
+            schedules: Словарь с расписанием или список таких словарей
+            
+        Returns:
+            Строка с предупреждением или пустая строка
+        """
+        if isinstance(schedules, dict):
+            schedules = [schedules]
+        
+        if any(schedule.get("stale") for schedule in schedules):
+            return "\n\n⚠️ Сайт университета недоступен, данные могут быть устаревшими"
+        return ""
+        
+    @staticmethod
+    def format_changes(group_name: str, diffs: Dict[date, Dict[str, list]], max_length: int = 4000) -> str:
+        """
+        Сообщение об изменениях расписания
+        
+        Args:
+            group_name: Название группы
+            diffs: {дата: разница} (см. services.change_detector.diff_schedules)
+            max_length: Предел длины (Telegram не принимает сообщения длиннее 4096
+                символов); не поместившиеся изменения заменяются строкой «…и ещё N»
+            
+        Returns:
+            Отформатированная строка
+        """
+        # Поля приходят с сайта как есть - экранируем для ParseMode.HTML
+        def field(lesson: Dict, key: str) -> str:
+            return escape(str(lesson[key]))
+        
+        # (строка, это изменение, а не заголовок дня)
+        lines: List[Tuple[str, bool]] = []
+        for day, diff in diffs.items():
+            lines.append((f"\n📅 <b>{day.strftime('%d.%m.%Y')}</b>\n", False))
+            for lesson in diff["added"]:
+                lines.append((
+                    f"➕ {field(lesson, 'number')} пара ({field(lesson, 'time')}): "
+                    f"{field(lesson, 'name')}, ауд. {field(lesson, 'room')}\n", True
+                ))
+            for lesson in diff["removed"]:
+                lines.append((f"➖ <s>{field(lesson, 'number')} пара ({field(lesson, 'time')}): {field(lesson, 'name')}</s>\n", True))
+            for old, new in diff["moved"]:
+                lines.append((
+                    f"🔀 {field(new, 'name')}: {field(old, 'number')} пара → "
+                    f"<b>{field(new, 'number')} пара</b> ({field(new, 'time')}), ауд. {field(new, 'room')}\n", True
+                ))
+            for old, new in diff["room_changed"]:
+                lines.append((
+                    f"🚪 {field(new, 'number')} пара, {field(new, 'name')}: "
+                    f"ауд. {field(old, 'room')} → <b>{field(new, 'room')}</b>\n", True
+                ))
+        
+        text = (
+            "🔄 <b>Расписание изменилось</b>\n"
+            f"👥 Группа: <b>{escape(group_name)}</b>\n"
+        )
+        total = sum(is_change for _, is_change in lines)
+        shown = 0
+        # Запас под строку «…и ещё N изменений»
+        limit = max_length - 64
+        # Заголовок дня добавляется вместе с первым изменением, чтобы не остаться пустым
+        day_header = ""
+        for line, is_change in lines:
+            if not is_change:
+                day_header = line
+                continue
+            if len(text) + len(day_header) + len(line) > limit:
+                break
+            text += day_header + line
+            day_header = ""
+            shown += 1
+            
+        if shown < total:
+            text += f"\n…и ещё {total - shown} изменений — полное расписание в меню бота\n"
+        return text
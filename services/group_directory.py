@@ -0,0 +1,256 @@
+"""Справочник групп в памяти с фоновым обновлением"""
+import asyncio
+import sys
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import List, Dict, Set, Tuple, Optional, Sequence, Union, overload
+
+from config import settings
+from services.parser import get_parser
+from utils.logger import logger
+
+
+class GroupResults(Sequence):
+    """
+    Результат поиска: номера групп в общем списке справочника.
+    Словари групп не копируются - страница берётся срезом.
+    handle - версия справочника, по которой построен результат.
+    """
+
+    __slots__ = ("handle", "_ids", "_groups")
+
+    def __init__(self, handle: int, ids: Tuple[int, ...], groups: List[Dict[str, str]]):
+        self.handle = handle
+        self._ids = ids
+        self._groups = groups
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @overload
+    def __getitem__(self, index: int) -> Dict[str, str]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> List[Dict[str, str]]: ...
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self._groups[idx] for idx in self._ids[index]]
+        return self._groups[self._ids[index]]
+
+
+class GroupDirectory:
+    """
+    Список групп, загруженный один раз и обновляемый в фоне по TTL.
+    Поиск идёт по заранее построенному индексу:
+    префиксы - бинарным поиском по отсортированному списку,
+    подстроки - через индекс n-грамм (до GRAM символов).
+
+    Результаты поиска хранятся в общем LRU по запросу (results_cache_size
+    запросов), поэтому состояние выбора группы у пользователя - только
+    запрос, handle результата и страница (см. find / resolve).
+    """
+
+    GRAM = 3
+
+    def __init__(
+        self,
+        refresh_interval: float = 3600,
+        retry_interval: float = 60,
+        default_limit: int = 50,
+        results_cache_size: int = 256,
+    ):
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.default_limit = default_limit
+        self.results_cache_size = results_cache_size
+
+        self._groups: List[Dict[str, str]] = []
+        self._upper: List[str] = []
+        self._sorted: List[Tuple[str, int]] = []
+        self._grams: Dict[str, Set[int]] = {}
+        self.version = 0
+        self._results: "OrderedDict[str, GroupResults]" = OrderedDict()
+
+        self.loaded_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._refresh_lock = asyncio.Lock()
+        self.stats: Dict[str, int] = {"refreshes": 0, "refresh_errors": 0, "searches": 0, "result_hits": 0}
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    # ────────────────────────────────────────────────
+    # Загрузка и индекс
+    # ────────────────────────────────────────────────
+
+    async def refresh(self) -> bool:
+        """Перезагрузка списка групп; при ошибке остаётся прежний список"""
+        async with self._refresh_lock:
+            names = await get_parser().fetch_group_names()
+
+            if not names:
+                self.stats["refresh_errors"] += 1
+                logger.warning(
+                    f"Не удалось обновить справочник групп, используется прежний список ({len(self._groups)} групп)"
+                )
+                return False
+
+            self._build_index(names)
+            self.loaded_at = time.time()
+            self.stats["refreshes"] += 1
+            logger.info(f"Справочник групп обновлён: {len(self._groups)} групп")
+            return True
+
+    def _build_index(self, names: List[str]):
+        """Построение индексов; готовые структуры подменяются целиком"""
+        names = [sys.intern(name) for name in names]
+        groups = [{"id": name, "name": name, "full_name": name} for name in names]
+        upper = [name.upper() for name in names]
+
+        grams: Dict[str, Set[int]] = {}
+        for idx, name in enumerate(upper):
+            for size in range(1, self.GRAM + 1):
+                for start in range(len(name) - size + 1):
+                    grams.setdefault(name[start:start + size], set()).add(idx)
+
+        self._groups = groups
+        self._upper = upper
+        self._sorted = sorted((name, idx) for idx, name in enumerate(upper))
+        self._grams = grams
+        self.version += 1
+        self._results.clear()
+
+    async def ensure_loaded(self):
+        """Загрузить список, если он ещё ни разу не загружался"""
+        if self._groups:
+            return
+        # Если загрузка уже идёт (например, при старте) - дожидаемся её, а не дублируем
+        if self._refresh_lock.locked():
+            async with self._refresh_lock:
+                pass
+        if not self._groups:
+            await self.refresh()
+
+    # ────────────────────────────────────────────────
+    # Поиск
+    # ────────────────────────────────────────────────
+
+    async def find(self, query: str = "") -> GroupResults:
+        """Результат поиска из общего кэша (для постраничного выбора группы)"""
+        await self.ensure_loaded()
+        return self.find_loaded(query)
+
+    async def resolve(self, query: str, handle: Optional[int]) -> GroupResults:
+        """
+        Результат, сохранённый в состоянии пользователя как (запрос, handle).
+        Если справочник с тех пор обновился, поиск повторяется по новому
+        списку - состав страниц может немного сдвинуться.
+        """
+        results = await self.find(query)
+        if handle is not None and handle != results.handle:
+            logger.debug(f"Справочник групп обновился, результат '{query}' построен заново")
+        return results
+
+    def find_loaded(self, query: str = "") -> GroupResults:
+        """Поиск по уже загруженному индексу через общий кэш результатов"""
+        self.stats["searches"] += 1
+        query = query.upper().strip()
+
+        results = self._results.get(query)
+        if results is not None:
+            self._results.move_to_end(query)
+            self.stats["result_hits"] += 1
+            return results
+
+        # Если запроса нет, возвращаем первые группы (чтобы список не был пустым при открытии меню)
+        if not query:
+            ids = tuple(range(min(self.default_limit, len(self._groups))))
+        else:
+            prefix_ids = self._prefix_ids(query)
+            substring_ids = self._substring_ids(query) - set(prefix_ids)
+            # Сначала группы, начинающиеся с запроса, затем остальные совпадения
+            ids = tuple(prefix_ids + sorted(substring_ids))
+
+        results = GroupResults(self.version, ids, self._groups)
+        self._results[query] = results
+        while len(self._results) > self.results_cache_size:
+            self._results.popitem(last=False)
+        return results
+
+    def _prefix_ids(self, query: str) -> List[int]:
+        ids = []
+        pos = bisect_left(self._sorted, (query, -1))
+        while pos < len(self._sorted) and self._sorted[pos][0].startswith(query):
+            ids.append(self._sorted[pos][1])
+            pos += 1
+        return ids
+
+    def _substring_ids(self, query: str) -> Set[int]:
+        if len(query) <= self.GRAM:
+            return set(self._grams.get(query, ()))
+
+        candidates = [
+            self._grams.get(query[start:start + self.GRAM], set())
+            for start in range(len(query) - self.GRAM + 1)
+        ]
+        candidates.sort(key=len)
+        found = set(candidates[0]).intersection(*candidates[1:])
+        return {idx for idx in found if query in self._upper[idx]}
+
+    # ────────────────────────────────────────────────
+    # Фоновое обновление
+    # ────────────────────────────────────────────────
+
+    async def start(self):
+        """Запуск фонового обновления (первая загрузка - сразу)"""
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                ok = await self.refresh()
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления справочника групп: {e}")
+                ok = False
+            await asyncio.sleep(self.refresh_interval if ok else self.retry_interval)
+
+
+# Глобальный экземпляр
+_group_directory: Optional[GroupDirectory] = None
+
+
+def get_group_directory() -> GroupDirectory:
+    """Получить справочник групп"""
+    if _group_directory is None:
+        raise RuntimeError("Справочник групп не инициализирован. Вызовите init_group_directory()")
+    return _group_directory
+
+
+async def init_group_directory() -> GroupDirectory:
+    """Инициализация справочника групп и запуск фонового обновления"""
+    global _group_directory
+    _group_directory = GroupDirectory(
+        refresh_interval=settings.GROUPS_REFRESH_INTERVAL,
+        retry_interval=settings.GROUPS_RETRY_INTERVAL,
+    )
+    await _group_directory.start()
+    return _group_directory
+
+
+async def close_group_directory():
+    """Остановка фонового обновления справочника"""
+    global _group_directory
+    if _group_directory:
+        await _group_directory.close()
+        _group_directory = None
@@ -0,0 +1,130 @@
+"""Общий HTTP-клиент для запросов к сайту ПВГУС"""
+import aiohttp
+from typing import Optional, Dict
+
+from config import settings
+from utils.logger import logger
+
+try:
+    import brotli  # noqa: F401  (aiohttp распаковывает br только при наличии brotli)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Referer": "https://lk.tolgas.ru/public-schedule/",
+    "X-Requested-With": "XMLHttpRequest",
+    "Accept-Encoding": ACCEPT_ENCODING,
+}
+
+
+class HttpClient:
+    """Долгоживущая сессия aiohttp с пулом keep-alive соединений и DNS-кэшем"""
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 10,
+        keepalive_timeout: float = 60.0,
+        dns_cache_ttl: int = 600,
+        timeout: float = 20.0,
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stats: Dict[str, int] = {
+            "requests": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+        }
+
+    async def start(self):
+        """Создание сессии и пула соединений"""
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(self._on_request_start)
+        trace_config.on_connection_create_end.append(self._on_connection_create)
+        trace_config.on_connection_reuseconn.append(self._on_connection_reuse)
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            use_dns_cache=True,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=DEFAULT_HEADERS,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[trace_config],
+        )
+        logger.info(
+            f"HTTP-клиент запущен: limit={self.limit}, limit_per_host={self.limit_per_host}, "
+            f"keepalive={self.keepalive_timeout}s, dns_ttl={self.dns_cache_ttl}s, encoding={ACCEPT_ENCODING}"
+        )
+
+    async def close(self):
+        """Закрытие сессии и всех соединений пула"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+            logger.info("HTTP-клиент остановлен")
+
+    def get_stats(self) -> Dict[str, float]:
+        """Счётчики запросов и переиспользования соединений"""
+        stats = dict(self.stats)
+        total = stats["connections_created"] + stats["connections_reused"]
+        stats["reuse_ratio"] = stats["connections_reused"] / total if total else 0.0
+        return stats
+
+    async def _on_request_start(self, session, ctx, params):
+        self.stats["requests"] += 1
+
+    async def _on_connection_create(self, session, ctx, params):
+        self.stats["connections_created"] += 1
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        self.stats["connections_reused"] += 1
+
+
+# Глобальный экземпляр
+_http_client: Optional[HttpClient] = None
+
+
+def get_http_client() -> HttpClient:
+    """Получить общий HTTP-клиент"""
+    if _http_client is None:
+        raise RuntimeError("HTTP-клиент не инициализирован. Вызовите init_http_client()")
+    return _http_client
+
+
+def is_http_client_ready() -> bool:
+    """Проверка, запущен ли общий HTTP-клиент"""
+    return _http_client is not None and _http_client.session is not None
+
+
+async def init_http_client() -> HttpClient:
+    """Инициализация общего HTTP-клиента"""
+    global _http_client
+    _http_client = HttpClient(
+        limit=settings.HTTP_POOL_LIMIT,
+        limit_per_host=settings.HTTP_LIMIT_PER_HOST,
+        keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        dns_cache_ttl=settings.HTTP_DNS_CACHE_TTL,
+        timeout=settings.HTTP_TIMEOUT,
+    )
+    await _http_client.start()
+    return _http_client
+
+
+async def close_http_client():
+    """Закрытие общего HTTP-клиента"""
+    global _http_client
+    if _http_client:
+        await _http_client.close()
+        _http_client = None
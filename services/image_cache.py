@@ -0,0 +1,201 @@
+"""Кэш готовых PNG расписания: память и диск, вытеснение LRU по объёму"""
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config import settings
+from services.image_generator import ScheduleImageGenerator
+from utils.logger import logger
+
+
+def image_cache_key(schedule: Dict[str, Any], theme: str) -> str:
+    """
+    Хэш расписания и темы оформления. Словарь сериализуется с сортировкой
+    ключей, поэтому одинаковые расписания дают один ключ независимо от
+    порядка полей. Пометка "stale" на изображение не влияет и не учитывается.
+    """
+    payload = {key: value for key, value in schedule.items() if key != "stale"}
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{theme}\n{canonical}".encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    Двухуровневый кэш изображений по ключу image_cache_key.
+    Оба уровня ограничены суммарным размером в байтах и вытесняют
+    давно не использованные изображения. На диске каждое изображение
+    лежит отдельным файлом <ключ>.png; чтение и запись идут в потоках,
+    чтобы не блокировать цикл событий.
+    """
+
+    def __init__(self, memory_bytes: int = 32 * 1024 * 1024, disk_dir: Optional[str] = None, disk_bytes: int = 0):
+        self.memory_limit = memory_bytes
+        self.disk_dir = disk_dir if disk_dir and disk_bytes > 0 else None
+        self.disk_limit = disk_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0,
+            "bytes_saved": 0, "evictions": 0,
+        }
+
+        if self.disk_dir:
+            self._load_disk_index()
+
+    # ────────────────────────────────────────────────
+    # Публичные методы
+    # ────────────────────────────────────────────────
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """Готовое изображение или None"""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            self.stats["bytes_saved"] += len(data)
+            return data
+
+        if key in self._disk:
+            try:
+                data = await asyncio.to_thread(_read_file, self._path(key))
+            except OSError as e:
+                logger.warning(f"Не удалось прочитать изображение {key[:12]} из кэша: {e}")
+                self._forget_disk(key)
+            else:
+                self._disk.move_to_end(key)
+                self._remember(key, data)
+                self.stats["disk_hits"] += 1
+                self.stats["bytes_saved"] += len(data)
+                return data
+
+        self.stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, data: bytes):
+        """Сохранить изображение в память и на диск"""
+        self._remember(key, data)
+        if not self.disk_dir or key in self._disk or len(data) > self.disk_limit:
+            return
+
+        try:
+            await asyncio.to_thread(_write_file, self._path(key), data)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить изображение {key[:12]} на диск: {e}")
+            return
+
+        if key in self._disk:
+            return
+        self._disk[key] = len(data)
+        self._disk_size += len(data)
+        evicted = []
+        while self._disk_size > self.disk_limit:
+            old_key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.stats["evictions"] += 1
+            evicted.append(self._path(old_key))
+        if evicted:
+            await asyncio.to_thread(_remove_files, evicted)
+
+    def clear_memory(self):
+        self._memory.clear()
+        self._memory_size = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        total = hits + stats["misses"]
+        stats["hit_ratio"] = hits / total if total else 0.0
+        stats["memory_entries"] = len(self._memory)
+        stats["memory_bytes"] = self._memory_size
+        stats["disk_entries"] = len(self._disk)
+        stats["disk_bytes"] = self._disk_size
+        return stats
+
+    # ────────────────────────────────────────────────
+    # Внутренние методы
+    # ────────────────────────────────────────────────
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_limit:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_size -= len(previous)
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_limit:
+            _, old = self._memory.popitem(last=False)
+            self._memory_size -= len(old)
+            self.stats["evictions"] += 1
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_size -= size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.png")
+
+    def _load_disk_index(self):
+        """Индекс файлов на диске; порядок LRU восстанавливается по времени изменения"""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        files = []
+        for entry in os.scandir(self.disk_dir):
+            if entry.is_file() and entry.name.endswith(".png"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._disk[key] = size
+            self._disk_size += size
+        logger.info(f"Кэш изображений на диске: {len(self._disk)} файлов, {self._disk_size / 1024 / 1024:.1f} МБ")
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        data = f.read()
+    # Время изменения служит отметкой использования для LRU после перезапуска
+    os.utime(path)
+    return data
+
+
+def _write_file(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# Глобальный экземпляр
+_image_cache: Optional[ImageCache] = None
+
+
+def get_image_cache() -> ImageCache:
+    """Получить кэш изображений (создаётся при первом обращении)"""
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache(
+            memory_bytes=int(settings.IMAGE_CACHE_MEMORY_MB * 1024 * 1024),
+            disk_dir=settings.IMAGE_CACHE_DIR,
+            disk_bytes=int(settings.IMAGE_CACHE_DISK_MB * 1024 * 1024),
+        )
+    return _image_cache
+
+
+def schedule_image_key(schedule: Dict[str, Any]) -> str:
+    """Ключ кэша для изображения в текущем оформлении"""
+    return image_cache_key(schedule, ScheduleImageGenerator.theme_key())
@@ -1,9 +1,17 @@
 """Генератор изображений расписания"""
-from PIL import Image, ImageDraw, ImageFont
-from typing import Dict, Any
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from functools import lru_cache
 from io import BytesIO
+import hashlib
 import os
 import re
+import threading
+
+
+# Файлы шрифта по порядку предпочтения
+FONT_PATHS = ("benzin-bold.ttf",)
 
 
 class ScheduleImageGenerator:
@@ -26,38 +34,112 @@ class ScheduleImageGenerator:
     PADDING = 40
     CARD_PADDING = 30
     
-    def __init__(self):
-        """Инициализация генератора"""
+    HEADER_HEIGHT = 200
+    LESSON_HEIGHT = 180
+    FOOTER_HEIGHT = 100
+    NO_LESSONS_HEIGHT = 150
+    
+    # Запас вокруг карточки в шаблоне (контур толщиной 2px выходит за координаты)
+    CARD_MARGIN = 4
+    
+    # Сколько отрисованных надписей держать в памяти
+    TEXT_CACHE_SIZE = 1024
+    
+    def __init__(self, prerender: bool = True):
+        """
+        Инициализация генератора: шрифты, цвета и статичные слои готовятся один раз.
+        
+        Args:
+            prerender: Вставлять заранее отрисованные шаблоны (шапка, карточка,
+                футер) и уже растеризованные надписи вместо того, чтобы рисовать
+                их для каждого изображения
+        """
         self.fonts = self._load_fonts()
+        self.rgb = {name: self._parse_rgba(value) for name, value in self.COLORS.items()}
+        self.prerender = prerender
+        
+        self._header_template: Optional[Image.Image] = None
+        self._card_template: Optional[Image.Image] = None
+        self._footer_template: Optional[Image.Image] = None
+        self._footer_mask: Optional[Image.Image] = None
+        # Надписи (время пар, преподаватели, аудитории) повторяются между
+        # изображениями, поэтому маска текста растеризуется один раз
+        self._text_masks: "OrderedDict[tuple, Tuple[tuple, Image.Image]]" = OrderedDict()
+        self._text_lock = threading.Lock()
+        self.text_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+        if prerender:
+            self._build_templates()
+    
+    @classmethod
+    def theme_key(cls) -> str:
+        """Отпечаток оформления: меняется вместе с цветами, размерами и шрифтом"""
+        theme = (sorted(cls.COLORS.items()), cls.WIDTH, cls.PADDING, cls.CARD_PADDING,
+                 cls.HEADER_HEIGHT, cls.LESSON_HEIGHT, cls.FOOTER_HEIGHT, cls.NO_LESSONS_HEIGHT,
+                 FONT_PATHS)
+        return hashlib.sha1(repr(theme).encode("utf-8")).hexdigest()[:16]
     
     def _load_fonts(self) -> Dict:
-        """Загрузка шрифтов с резервными вариантами"""
-        fonts = {}
-        font_paths = ["benzin-bold.ttf"]
-        
-        try:
-            for path in font_paths:
-                if os.path.exists(path):
-                    fonts['header']   = ImageFont.truetype(path, 48)
-                    fonts['title']    = ImageFont.truetype(path, 36)
-                    fonts['subtitle'] = ImageFont.truetype(path, 28)
-                    fonts['text']     = ImageFont.truetype(path, 24)
-                    fonts['small']    = ImageFont.truetype(path, 20)
-                    fonts['watermark']= ImageFont.truetype(path, 80)
-                    break
-            
-            if not fonts:
-                raise Exception("Font not found")
-                
-        except Exception:
-            fonts['header']   = ImageFont.load_default()
-            fonts['title']    = ImageFont.load_default()
-            fonts['subtitle'] = ImageFont.load_default()
-            fonts['text']     = ImageFont.load_default()
-            fonts['small']    = ImageFont.load_default()
-            fonts['watermark']= ImageFont.load_default()
-        
-        return fonts
+        """Загрузка шрифтов с резервными вариантами (файл читается один раз на процесс)"""
+        return _load_font_set(FONT_PATHS)
+    
+    def _build_templates(self):
+        """Отрисовка статичных слоёв, которые затем вставляются через paste"""
+        background = self.rgb['background']
+        
+        header_width = self.WIDTH - 2 * self.PADDING + 1
+        self._header_template = Image.new('RGB', (header_width, 161), self.rgb['header'])
+        
+        card_x1, card_x2 = self._card_x()
+        margin = self.CARD_MARGIN
+        card = Image.new('RGB', (card_x2 - card_x1 + 1 + 2 * margin, 161 + 2 * margin), background)
+        self._draw_card_frame(
+            ImageDraw.Draw(card, 'RGBA'),
+            (margin, margin, margin + card_x2 - card_x1, margin + 160)
+        )
+        self._card_template = card
+        
+        # Футер рисуется поверх последней карточки, поэтому вставляется по маске:
+        # переносятся только нарисованные пиксели, а не фон шаблона
+        footer = Image.new('RGB', (self.WIDTH, self.FOOTER_HEIGHT), background)
+        self._draw_footer(ImageDraw.Draw(footer, 'RGBA'), 0)
+        blank = Image.new('RGB', footer.size, background)
+        red, green, blue = ImageChops.difference(footer, blank).split()
+        changed = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+        self._footer_mask = changed.point(lambda v: 255 if v else 0)
+        self._footer_template = footer
+    
+    def _draw_text(self, draw: ImageDraw, img: Optional[Image.Image], xy: tuple, text: str,
+                   font: str, fill: tuple, anchor: Optional[str] = None):
+        """Надпись через кэш масок (результат совпадает с draw.text попиксельно)"""
+        if not self.prerender or img is None:
+            draw.text(xy, text, font=self.fonts[font], fill=fill, anchor=anchor)
+            return
+        
+        bbox, mask = self._text_mask(text, font, anchor)
+        left, top, right, bottom = bbox
+        if right > left and bottom > top:
+            img.paste(fill, (xy[0] + left, xy[1] + top, xy[0] + right, xy[1] + bottom), mask)
+    
+    def _text_mask(self, text: str, font: str, anchor: Optional[str]) -> Tuple[tuple, Image.Image]:
+        key = (text, font, anchor)
+        with self._text_lock:
+            cached = self._text_masks.get(key)
+            if cached is not None:
+                self._text_masks.move_to_end(key)
+                self.text_stats["hits"] += 1
+                return cached
+        
+        bbox = self.fonts[font].getbbox(text, anchor=anchor)
+        left, top, right, bottom = bbox
+        mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+        ImageDraw.Draw(mask).text((-left, -top), text, font=self.fonts[font], fill=255, anchor=anchor)
+        
+        with self._text_lock:
+            self.text_stats["misses"] += 1
+            self._text_masks[key] = (bbox, mask)
+            while len(self._text_masks) > self.TEXT_CACHE_SIZE:
+                self._text_masks.popitem(last=False)
+        return bbox, mask
     
     def _hex_to_rgb(self, hex_color: str) -> tuple:
         hex_color = hex_color.lstrip('#')
@@ -109,32 +191,35 @@ class ScheduleImageGenerator:
     def generate_schedule_image(self, schedule: Dict) -> BytesIO:
         lessons = schedule.get('lessons', [])
         
-        header_height = 200
-        lesson_height = 180
-        footer_height = 100
+        header_height = self.HEADER_HEIGHT
+        lesson_height = self.LESSON_HEIGHT
+        footer_height = self.FOOTER_HEIGHT
         
-        total_height = header_height + (len(lessons) * lesson_height if lessons else 150) + footer_height
+        total_height = header_height + (len(lessons) * lesson_height if lessons else self.NO_LESSONS_HEIGHT) + footer_height
         
-        img = Image.new('RGB', (self.WIDTH, total_height), self._hex_to_rgb(self.COLORS['background']))
+        img = Image.new('RGB', (self.WIDTH, total_height), self.rgb['background'])
         draw = ImageDraw.Draw(img, 'RGBA')
         
         y_offset = self.PADDING
         
         # Шапка
-        self._draw_header(draw, schedule, y_offset)
+        self._draw_header(draw, schedule, y_offset, img)
         y_offset += header_height
         
         # Занятия или сообщение об отсутствии
         if lessons:
             for lesson in lessons:
-                self._draw_lesson_card(draw, lesson, y_offset)
+                self._draw_lesson_card(draw, lesson, y_offset, img)
                 y_offset += lesson_height
         else:
-            self._draw_no_lessons(draw, y_offset)
-            y_offset += 150
+            self._draw_no_lessons(draw, y_offset, img)
+            y_offset += self.NO_LESSONS_HEIGHT
         
         # Футер
-        self._draw_footer(draw, total_height - footer_height)
+        if self._footer_template is not None:
+            img.paste(self._footer_template, (0, total_height - footer_height), self._footer_mask)
+        else:
+            self._draw_footer(draw, total_height - footer_height)
         
         output = BytesIO()
         img.save(output, format='PNG', quality=95)
@@ -142,114 +227,133 @@ class ScheduleImageGenerator:
         
         return output
     
-    def _draw_header(self, draw: ImageDraw, schedule: Dict, y: int):
-        header_bg = self._hex_to_rgb(self.COLORS['header'])
-        draw.rectangle(
-            [self.PADDING, y, self.WIDTH - self.PADDING, y + 160],
-            fill=header_bg
-        )
+    def _draw_header(self, draw: ImageDraw, schedule: Dict, y: int, img: Optional[Image.Image] = None):
+        if self._header_template is not None and img is not None:
+            img.paste(self._header_template, (self.PADDING, y))
+        else:
+            draw.rectangle(
+                [self.PADDING, y, self.WIDTH - self.PADDING, y + 160],
+                fill=self.rgb['header']
+            )
         
         # Убрали "📅 "
         date_text = self._clean_text(schedule.get('date', 'Дата не указана'))
-        draw.text(
+        self._draw_text(
+            draw, img,
             (self.WIDTH // 2, y + 40),
             date_text,
-            font=self.fonts['title'],
-            fill=self._hex_to_rgb(self.COLORS['text_primary']),
+            font='title',
+            fill=self.rgb['text_primary'],
             anchor='mm'
         )
         
         day_text = self._clean_text(schedule.get('day_of_week', ''))
-        draw.text(
+        self._draw_text(
+            draw, img,
             (self.WIDTH // 2, y + 80),
             day_text,
-            font=self.fonts['subtitle'],
-            fill=self._hex_to_rgb(self.COLORS['text_secondary']),
+            font='subtitle',
+            fill=self.rgb['text_secondary'],
             anchor='mm'
         )
         
         # Убрали "👥 " перед словом Группа
         group_text = f"Группа: {self._clean_text(schedule.get('group_name', 'Не указана'))}"
-        draw.text(
+        self._draw_text(
+            draw, img,
             (self.WIDTH // 2, y + 120),
             group_text,
-            font=self.fonts['text'],
-            fill=self._hex_to_rgb(self.COLORS['accent']),
+            font='text',
+            fill=self.rgb['accent'],
             anchor='mm'
         )
     
-    def _draw_lesson_card(self, draw: ImageDraw, lesson: Dict, y: int):
+    def _card_x(self) -> tuple:
+        return self.PADDING + 20, self.WIDTH - self.PADDING - 20
+    
+    def _draw_card_frame(self, draw: ImageDraw, coords: tuple):
+        self._draw_rounded_rectangle(
+            draw,
+            coords,
+            radius=15,
+            fill=self.rgb['card_bg'],
+            outline=self.rgb['border']
+        )
+    
+    def _draw_lesson_card(self, draw: ImageDraw, lesson: Dict, y: int, img: Optional[Image.Image] = None):
         lesson_clean = {k: self._clean_text(v) for k, v in lesson.items()}
         
-        card_x1 = self.PADDING + 20
+        card_x1, card_x2 = self._card_x()
         card_y1 = y + 10
-        card_x2 = self.WIDTH - self.PADDING - 20
         card_y2 = y + 170
         
-        self._draw_rounded_rectangle(
-            draw,
-            (card_x1, card_y1, card_x2, card_y2),
-            radius=15,
-            fill=self._hex_to_rgb(self.COLORS['card_bg']),
-            outline=self._hex_to_rgb(self.COLORS['border'])
-        )
+        if self._card_template is not None and img is not None:
+            img.paste(self._card_template, (card_x1 - self.CARD_MARGIN, card_y1 - self.CARD_MARGIN))
+        else:
+            self._draw_card_frame(draw, (card_x1, card_y1, card_x2, card_y2))
         
         x = card_x1 + self.CARD_PADDING
         y_text = card_y1 + 20
         
         # Убрали переменную {emoji} в начале строки
         header = f"{lesson_clean.get('number', '')} пара • {lesson_clean.get('time', '')}"
-        draw.text(
+        self._draw_text(
+            draw, img,
             (x, y_text),
             header,
-            font=self.fonts['subtitle'],
-            fill=self._hex_to_rgb(self.COLORS['accent'])
+            font='subtitle',
+            fill=self.rgb['accent']
         )
         
         y_text += 40
-        draw.text(
+        self._draw_text(
+            draw, img,
             (x, y_text),
             lesson_clean.get('name', 'Предмет не указан')[:50],
-            font=self.fonts['text'],
-            fill=self._hex_to_rgb(self.COLORS['text_primary'])
+            font='text',
+            fill=self.rgb['text_primary']
         )
         
         y_text += 35
         # Убрали "📝 " и "👨‍🏫 "
         details = f"{lesson_clean.get('type', '')} • {lesson_clean.get('teacher', '')}"
-        draw.text(
+        self._draw_text(
+            draw, img,
             (x, y_text),
             details[:60],
-            font=self.fonts['small'],
-            fill=self._hex_to_rgb(self.COLORS['text_secondary'])
+            font='small',
+            fill=self.rgb['text_secondary']
         )
         
         y_text += 30
         # Убрали "🚪 "
         room = f"Аудитория: {lesson_clean.get('room', 'Не указана')}"
-        draw.text(
+        self._draw_text(
+            draw, img,
             (x, y_text),
             room,
-            font=self.fonts['small'],
-            fill=self._hex_to_rgb(self.COLORS['text_secondary'])
+            font='small',
+            fill=self.rgb['text_secondary']
         )
     
-    def _draw_no_lessons(self, draw: ImageDraw, y: int):
+    def _draw_no_lessons(self, draw: ImageDraw, y: int, img: Optional[Image.Image] = None):
         text = "РАСПИСАНИЕ ОТСУТСТВУЕТ"
-        draw.text(
+        self._draw_text(
+            draw, img,
             (self.WIDTH // 2, y + 50),
             text,
-            font=self.fonts['title'],
-            fill=self._hex_to_rgb(self.COLORS['accent']),
+            font='title',
+            fill=self.rgb['accent'],
             anchor='mm'
         )
         
         subtext = "Занятий в этот день нет!"
-        draw.text(
+        self._draw_text(
+            draw, img,
             (self.WIDTH // 2, y + 110),
             subtext,
-            font=self.fonts['text'],
-            fill=self._hex_to_rgb(self.COLORS['text_secondary']),
+            font='text',
+            fill=self.rgb['text_secondary'],
             anchor='mm'
         )
     
@@ -257,7 +361,7 @@ class ScheduleImageGenerator:
         line_y = y + 20
         draw.line(
             [self.PADDING + 40, line_y, self.WIDTH - self.PADDING - 40, line_y],
-            fill=self._hex_to_rgb(self.COLORS['border']),
+            fill=self.rgb['border'],
             width=2
         )
         
@@ -269,7 +373,7 @@ class ScheduleImageGenerator:
             (self.PADDING + 50, text_y),
             "FLEIZY",
             font=self.fonts['text'],
-            fill=self._hex_to_rgb(self.COLORS['accent']),
+            fill=self.rgb['accent'],
             anchor='lm'   # left middle
         )
         
@@ -279,6 +383,48 @@ class ScheduleImageGenerator:
             (self.WIDTH - self.PADDING - 50, text_y),
             "@delovoybalik",
             font=self.fonts['text'],
-            fill=self._hex_to_rgb(self.COLORS['accent']),
+            fill=self.rgb['accent'],
             anchor='rm'   # right middle
-        )
\ No newline at end of file
+        )
+
+
+@lru_cache(maxsize=None)
+def _load_font_set(font_paths: tuple) -> Dict:
+    """Загрузка набора шрифтов; результат кэшируется на весь процесс"""
+    fonts = {}
+    
+    try:
+        for path in font_paths:
+            if os.path.exists(path):
+                fonts['header']   = ImageFont.truetype(path, 48)
+                fonts['title']    = ImageFont.truetype(path, 36)
+                fonts['subtitle'] = ImageFont.truetype(path, 28)
+                fonts['text']     = ImageFont.truetype(path, 24)
+                fonts['small']    = ImageFont.truetype(path, 20)
+                fonts['watermark']= ImageFont.truetype(path, 80)
+                break
+        
+        if not fonts:
+            raise Exception("Font not found")
+            
+    except Exception:
+        fonts['header']   = ImageFont.load_default()
+        fonts['title']    = ImageFont.load_default()
+        fonts['subtitle'] = ImageFont.load_default()
+        fonts['text']     = ImageFont.load_default()
+        fonts['small']    = ImageFont.load_default()
+        fonts['watermark']= ImageFont.load_default()
+    
+    return fonts
+
+
+# Глобальный экземпляр
+_image_generator: Optional[ScheduleImageGenerator] = None
+
+
+def get_image_generator() -> ScheduleImageGenerator:
+    """Общий генератор изображений (создаётся один раз на процесс)"""
+    global _image_generator
+    if _image_generator is None:
+        _image_generator = ScheduleImageGenerator()
+    return _image_generator
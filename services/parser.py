@@ -1,102 +1,96 @@
 """Парсер расписания с сайта ПВГУС"""
 import aiohttp
 from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date as date_type
 import re
 import json
 import asyncio
 
+from config import settings
+from services.http_client import DEFAULT_HEADERS, get_http_client, is_http_client_ready
+from services.singleflight import SingleFlight
+from services.upstream_guard import get_upstream_guard
+from services.workers import parse_html_async
 from utils.logger import logger
 
+# Общий для всех экземпляров парсера: объединяет одинаковые загрузки расписания
+schedule_flight = SingleFlight("schedule")
+
 class ScheduleParser:
     """Парсер расписания"""
     
-    def __init__(self):
+    def __init__(self, session: Optional[aiohttp.ClientSession] = None):
         self.base_url = "https://lk.tolgas.ru/public-schedule/group"
         # Страница поиска, где лежит JS массив с группами
         self.search_url = "https://lk.tolgas.ru/public-schedule/search" 
         
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            "Referer": "https://lk.tolgas.ru/public-schedule/",
-            "X-Requested-With": "XMLHttpRequest"
-        }
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.headers = DEFAULT_HEADERS
+        self.session: Optional[aiohttp.ClientSession] = session
+        # Сессию закрываем только если создали её сами
+        self._owns_session = False
         
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession(headers=self.headers)
+        if self.session is None:
+            if is_http_client_ready():
+                self.session = get_http_client().session
+            else:
+                self.session = aiohttp.ClientSession(headers=self.headers)
+                self._owns_session = True
         return self
         
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self.session and self._owns_session:
             await self.session.close()
+            self.session = None
+            self._owns_session = False
     
-    async def search_groups(self, query: str = "") -> List[Dict[str, str]]:
+    async def fetch_group_names(self) -> List[str]:
         """
-        Парсит группы из JS-массива на странице поиска.
+        Загружает полный список групп из JS-массива на странице поиска.
         Ищет массив строк, ПРОПУСКАЯ массив чисел.
         """
-        try:
-            # Загружаем страницу поиска
+        async def request() -> str:
             async with self.session.get(self.search_url) as response:
                 if response.status != 200:
                     logger.error(f"Ошибка доступа к поиску: {response.status}")
-                    return []
-                
-                html = await response.text()
-                
-                # Ищем ВСЕ вхождения "const groups = [...]"
-                # Используем findall, чтобы найти и мусорный массив, и настоящий
-                pattern = r'const\s+groups\s*=\s*(\[.*?\]);'
-                matches = re.findall(pattern, html, re.DOTALL)
+                # Ответ не 200 - ошибка для предохранителя, а не пустой успех
+                response.raise_for_status()
+                return await response.text()
+
+        try:
+            # Загружаем страницу поиска
+            html = await get_upstream_guard().call(request)
                 
-                all_groups = []
-                found_correct_array = False
-
-                for json_str in matches:
-                    # --- ГЛАВНАЯ ПРОВЕРКА ---
-                    # Если в массиве нет кавычек, это массив чисел [0,1,2...] -> пропускаем
-                    if '"' not in json_str and "'" not in json_str:
-                        continue
-                        
-                    try:
-                        # Парсим найденную строку как JSON
-                        raw_list = json.loads(json_str)
+            # Ищем ВСЕ вхождения "const groups = [...]"
+            # Используем findall, чтобы найти и мусорный массив, и настоящий
+            pattern = r'const\s+groups\s*=\s*(\[.*?\]);'
+            matches = re.findall(pattern, html, re.DOTALL)
+
+            for json_str in matches:
+                # --- ГЛАВНАЯ ПРОВЕРКА ---
+                # Если в массиве нет кавычек, это массив чисел [0,1,2...] -> пропускаем
+                if '"' not in json_str and "'" not in json_str:
+                    continue
+                    
+                try:
+                    # Парсим найденную строку как JSON
+                    raw_list = json.loads(json_str)
+                    
+                    # Дополнительная проверка: первый элемент должен быть строкой
+                    if raw_list and isinstance(raw_list[0], str):
+                        # Ура, это тот самый массив!
+                        return [name for name in raw_list if isinstance(name, str)]
                         
-                        # Дополнительная проверка: первый элемент должен быть строкой
-                        if raw_list and isinstance(raw_list[0], str):
-                            # Ура, это тот самый массив! Преобразуем в словарей
-                            for name in raw_list:
-                                all_groups.append({
-                                    "id": name,
-                                    "name": name,
-                                    "full_name": name
-                                })
-                            found_correct_array = True
-                            # logger.info(f"Успешно загружен массив из {len(all_groups)} групп")
-                            break # Выходим из цикла, мы нашли то что нужно
-                            
-                    except json.JSONDecodeError:
-                        continue
-                
-                if not found_correct_array:
-                    logger.warning("Не удалось найти правильный массив групп в JS")
-                    return []
-
-                # Фильтрация по запросу пользователя
-                if query:
-                    query = query.upper().strip()
-                    filtered = [g for g in all_groups if query in g["name"].upper()]
-                    logger.info(f"Найдено групп по запросу '{query}': {len(filtered)}")
-                    return filtered
-                
-                # Если запроса нет, возвращаем первые 50 (чтобы список не был пустым при открытии меню)
-                # или возвращаем пустой список, если хотите заставить пользователя вводить поиск
-                return all_groups[:50] 
+                except json.JSONDecodeError:
+                    continue
+            
+            logger.warning("Не удалось найти правильный массив групп в JS")
+            return []
                 
         except Exception as e:
-            logger.error(f"Критическая ошибка поиска: {e}")
+            logger.error(f"Критическая ошибка загрузки групп: {e}")
             return []
     
     async def fetch_schedule_html(self, group_name: str, date_from: datetime, date_to: datetime) -> str:
@@ -107,107 +101,73 @@ class ScheduleParser:
             "dateTo": date_to.strftime("%Y-%m-%d")
         }
         
-        try:
+        async def request() -> str:
             async with self.session.get(self.base_url, params=params) as response:
                 response.raise_for_status()
                 return await response.text()
+
+        try:
+            return await get_upstream_guard().call(request)
         except Exception as e:
             logger.error(f"Ошибка получения HTML: {e}")
             raise
     
     def parse_schedule_html(self, html: str) -> List[Dict[str, str]]:
-        """Парсинг HTML страницы"""
-        soup = BeautifulSoup(html, "lxml")
-        schedule = []
-        current_date = None
-        
-        for block in soup.select("div.date-bar, div.lesson-item"):
-            # Если блок - это дата
-            if "date-bar" in block.get("class", []):
-                date_span = block.find("span")
-                if date_span:
-                    current_date = date_span.text.strip()
-            
-            # Если блок - это пара
-            elif "lesson-item" in block.get("class", []):
-                try:
-                    number_div = block.find("div", class_="lesson-number")
-                    # .contents[0] берет только текст номера пары, игнорируя время внутри div
-                    number = number_div.contents[0].strip() if number_div else "0"
-                    
-                    time_div = block.find("div", class_="lesson-time")
-                    time = time_div.text.strip() if time_div else ""
-                    
-                    title_div = block.find("div", class_="lesson-title")
-                    name = title_div.text.strip() if title_div else ""
-                    
-                    room_tag = block.find("span", class_="lesson-auditorium")
-                    room = room_tag.text.strip() if room_tag else ""
-                    
-                    type_div = block.find("div", class_="lesson-type")
-                    type_ = type_div.text.strip() if type_div else ""
-                    
-                    teacher = ""
-                    details_div = block.find("div", class_="lesson-details")
-                    if details_div:
-                        details_text = details_div.get_text("\n")
-                        for line in details_text.split("\n"):
-                            if "Преподаватель:" in line:
-                                teacher = line.replace("Преподаватель:", "").strip()
-                                break
-                    
-                    schedule.append({
-                        "date": current_date,
-                        "number": number,
-                        "time": time,
-                        "name": name,
-                        "type": type_,
-                        "teacher": teacher,
-                        "room": room
-                    })
-                except Exception as e:
-                    logger.error(f"Ошибка парсинга занятия: {e}")
-                    continue
-        return schedule
+        """Парсинг HTML страницы движком из настроек (PARSER_ENGINE)"""
+        return parse_schedule_html(html, settings.PARSER_ENGINE)
 
     # --- Метод для произвольного диапазона ---
+    async def fetch_custom_schedule(self, group_name: str, date_start: datetime, date_end: datetime) -> List[Dict[str, any]]:
+        """Загрузка диапазона дат; ошибки сайта пробрасываются вызывающему"""
+        # Одновременные запросы одного и того же диапазона ждут одну загрузку.
+        # Результат общий для всех ожидающих - не изменяйте его на месте.
+        key = (group_name, date_start.strftime("%Y-%m-%d"), date_end.strftime("%Y-%m-%d"))
+        return await schedule_flight.do(
+            key, lambda: self._load_custom_schedule(group_name, date_start, date_end)
+        )
+
     async def get_custom_schedule(self, group_name: str, date_start: datetime, date_end: datetime) -> List[Dict[str, any]]:
         try:
-            html = await self.fetch_schedule_html(group_name, date_start, date_end)
-            all_lessons = self.parse_schedule_html(html)
-            
-            schedule_map = {}
-            for lesson in all_lessons:
-                date_key = lesson['date']
-                if not date_key: continue
-                
-                if date_key not in schedule_map:
-                    schedule_map[date_key] = {
-                        "date": date_key,
-                        "day_of_week": "", # День недели можно вычислить отдельно или оставить пустым
-                        "group_name": group_name,
-                        "lessons": []
-                    }
-                
-                schedule_map[date_key]["lessons"].append({
-                    "number": int(lesson["number"]) if lesson["number"].isdigit() else 0,
-                    "time": lesson["time"],
-                    "name": lesson["name"],
-                    "type": lesson["type"],
-                    "teacher": lesson["teacher"],
-                    "room": lesson["room"]
-                })
-            
-            return list(schedule_map.values())
+            return await self.fetch_custom_schedule(group_name, date_start, date_end)
         except Exception as e:
             logger.error(f"Ошибка custom schedule: {e}")
             return []
 
+    async def _load_custom_schedule(self, group_name: str, date_start: datetime, date_end: datetime) -> List[Dict[str, any]]:
+        """Загрузка и разбор диапазона дат (без обработки ошибок)"""
+        html = await self.fetch_schedule_html(group_name, date_start, date_end)
+        # Разбор - CPU-нагруженная работа, выполняется в пуле исполнителей
+        all_lessons = await parse_html_async(html)
+        
+        schedule_map = {}
+        for lesson in all_lessons:
+            date_key = lesson['date']
+            if not date_key: continue
+            
+            if date_key not in schedule_map:
+                schedule_map[date_key] = {
+                    "date": date_key,
+                    "day_of_week": "", # День недели можно вычислить отдельно или оставить пустым
+                    "group_name": group_name,
+                    "lessons": []
+                }
+            
+            schedule_map[date_key]["lessons"].append({
+                "number": int(lesson["number"]) if lesson["number"].isdigit() else 0,
+                "time": lesson["time"],
+                "name": lesson["name"],
+                "type": lesson["type"],
+                "teacher": lesson["teacher"],
+                "room": lesson["room"]
+            })
+        
+        return list(schedule_map.values())
+
     # --- Обертки для совместимости ---
     async def get_schedule(self, group_name: str, date: Optional[datetime] = None) -> Dict[str, any]:
         if date is None: date = datetime.now()
         res = await self.get_custom_schedule(group_name, date, date)
-        return res[0] if res else {"date": date.strftime("%d.%m.%Y"), "lessons": [], "day_of_week": "", "group_name": group_name}
+        return res[0] if res else make_empty_day(group_name, date)
 
     async def get_week_schedule(self, group_name: str, start_date: Optional[datetime] = None) -> List[Dict[str, any]]:
         if start_date is None:
@@ -219,5 +179,195 @@ class ScheduleParser:
     def _get_day_name(self, weekday: int) -> str:
         return ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"][weekday]
 
-async def create_parser() -> ScheduleParser:
-    return ScheduleParser()
\ No newline at end of file
+def parse_schedule_html_bs4(html: str) -> List[Dict[str, str]]:
+    """Парсинг HTML страницы через BeautifulSoup"""
+    soup = BeautifulSoup(html, "lxml")
+    schedule = []
+    current_date = None
+    
+    for block in soup.select("div.date-bar, div.lesson-item"):
+        # Если блок - это дата
+        if "date-bar" in block.get("class", []):
+            date_span = block.find("span")
+            if date_span:
+                current_date = date_span.text.strip()
+        
+        # Если блок - это пара
+        elif "lesson-item" in block.get("class", []):
+            try:
+                number_div = block.find("div", class_="lesson-number")
+                # .contents[0] берет только текст номера пары, игнорируя время внутри div
+                number = number_div.contents[0].strip() if number_div else "0"
+                
+                time_div = block.find("div", class_="lesson-time")
+                time = time_div.text.strip() if time_div else ""
+                
+                title_div = block.find("div", class_="lesson-title")
+                name = title_div.text.strip() if title_div else ""
+                
+                room_tag = block.find("span", class_="lesson-auditorium")
+                room = room_tag.text.strip() if room_tag else ""
+                
+                type_div = block.find("div", class_="lesson-type")
+                type_ = type_div.text.strip() if type_div else ""
+                
+                teacher = ""
+                details_div = block.find("div", class_="lesson-details")
+                if details_div:
+                    details_text = details_div.get_text("\n")
+                    for line in details_text.split("\n"):
+                        if "Преподаватель:" in line:
+                            teacher = line.replace("Преподаватель:", "").strip()
+                            break
+                
+                schedule.append({
+                    "date": current_date,
+                    "number": number,
+                    "time": time,
+                    "name": name,
+                    "type": type_,
+                    "teacher": teacher,
+                    "room": room
+                })
+            except Exception as e:
+                logger.error(f"Ошибка парсинга занятия: {e}")
+                continue
+    return schedule
+
+
+def _has_class(element, name: str) -> bool:
+    return name in (element.get("class") or "").split()
+
+
+# Блоки дат и пар в порядке документа (как soup.select("div.date-bar, div.lesson-item"))
+_BLOCKS_XPATH = etree.XPath(
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' date-bar ')"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' lesson-item ')]"
+)
+_FIRST_SPAN_XPATH = etree.XPath("(.//span)[1]")
+
+# Поля пары: (тег, класс) -> ключ; берётся первое вхождение, как block.find(...)
+_LESSON_FIELDS = {
+    ("div", "lesson-number"): "number",
+    ("div", "lesson-time"): "time",
+    ("div", "lesson-title"): "name",
+    ("span", "lesson-auditorium"): "room",
+    ("div", "lesson-type"): "type",
+    ("div", "lesson-details"): "details",
+}
+
+
+def _text(element) -> str:
+    return "".join(element.itertext())
+
+
+def parse_schedule_html_lxml(html: str) -> List[Dict[str, str]]:
+    """
+    Парсинг HTML страницы напрямую через lxml.
+    Результат совпадает с parse_schedule_html_bs4, но без построения
+    дерева BeautifulSoup: блоки выбираются одним XPath, а поля пары -
+    одним проходом по потомкам блока.
+    """
+    if not html or not html.strip():
+        return []
+
+    root = lxml_html.fromstring(html)
+    schedule = []
+    current_date = None
+
+    for block in _BLOCKS_XPATH(root):
+        # Если блок - это дата
+        if _has_class(block, "date-bar"):
+            spans = _FIRST_SPAN_XPATH(block)
+            if spans:
+                current_date = _text(spans[0]).strip()
+            continue
+
+        # Если блок - это пара
+        try:
+            found = {}
+            for element in block.iterdescendants("div", "span"):
+                classes = (element.get("class") or "").split()
+                for class_name in classes:
+                    field = _LESSON_FIELDS.get((element.tag, class_name))
+                    if field and field not in found:
+                        found[field] = element
+                if len(found) == len(_LESSON_FIELDS):
+                    break
+
+            number_div = found.get("number")
+            if number_div is not None and number_div.text is None:
+                # В номере нет текста перед вложенными тегами - как и BeautifulSoup, пропускаем пару
+                raise ValueError("пустой номер пары")
+            # .text берет только текст номера пары, игнорируя время внутри div
+            number = number_div.text.strip() if number_div is not None else "0"
+
+            time = _text(found["time"]).strip() if "time" in found else ""
+            name = _text(found["name"]).strip() if "name" in found else ""
+            room = _text(found["room"]).strip() if "room" in found else ""
+            type_ = _text(found["type"]).strip() if "type" in found else ""
+
+            teacher = ""
+            if "details" in found:
+                details_text = "\n".join(found["details"].itertext())
+                for line in details_text.split("\n"):
+                    if "Преподаватель:" in line:
+                        teacher = line.replace("Преподаватель:", "").strip()
+                        break
+
+            schedule.append({
+                "date": current_date,
+                "number": number,
+                "time": time,
+                "name": name,
+                "type": type_,
+                "teacher": teacher,
+                "room": room
+            })
+        except Exception as e:
+            logger.error(f"Ошибка парсинга занятия: {e}")
+            continue
+    return schedule
+
+
+PARSE_ENGINES = {
+    "bs4": parse_schedule_html_bs4,
+    "lxml": parse_schedule_html_lxml,
+}
+
+
+def parse_schedule_html(html: str, engine: str = "lxml") -> List[Dict[str, str]]:
+    """Парсинг HTML страницы выбранным движком ('bs4' или 'lxml')"""
+    try:
+        parse = PARSE_ENGINES[engine]
+    except KeyError:
+        raise ValueError(f"Неизвестный движок парсинга: {engine}")
+    return parse(html)
+
+
+def make_empty_day(group_name: str, date) -> Dict[str, any]:
+    """Расписание дня без занятий (в том же формате, что и у парсера)"""
+    return {"date": date.strftime("%d.%m.%Y"), "lessons": [], "day_of_week": "", "group_name": group_name}
+
+
+def parse_site_date(text: Optional[str]) -> Optional[date_type]:
+    """Дата из заголовка дня на сайте ('16.02.2026', 'Понедельник, 16.02.2026' и т.п.)"""
+    if not text:
+        return None
+    match = re.search(r'(\d{1,2})\.(\d{1,2})\.(\d{4})', text)
+    if match:
+        day, month, year = (int(part) for part in match.groups())
+    else:
+        match = re.search(r'(\d{4})-(\d{2})-(\d{2})', text)
+        if not match:
+            return None
+        year, month, day = (int(part) for part in match.groups())
+    try:
+        return date_type(year, month, day)
+    except ValueError:
+        return None
+
+
+def get_parser() -> ScheduleParser:
+    """Парсер на общей сессии HTTP-клиента (переиспользует соединения)"""
+    return ScheduleParser(session=get_http_client().session)
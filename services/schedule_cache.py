@@ -0,0 +1,328 @@
+"""Кэш расписания: память (LRU) поверх таблицы schedule_cache"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, date as date_type, timedelta
+from typing import Dict, List, Optional, Tuple, Any
+
+from config import settings
+from database import get_db
+from services.cache_policy import CacheTTLPolicy
+from services.change_detector import report_schedule_changes, schedule_fingerprint
+from services.parser import get_parser, make_empty_day, parse_site_date
+from services.upstream_guard import get_upstream_guard
+from utils.logger import logger
+
+
+CacheKey = Tuple[str, str]
+
+
+class ScheduleCache:
+    """
+    Read-through кэш расписания по ключу (группа, дата).
+    Порядок поиска: память → SQLite → сайт университета.
+    С сайта всегда загружается целая ISO-неделя, дни вырезаются из неё.
+
+    TTL зависит от даты (см. CacheTTLPolicy). Просроченная запись не старше
+    max_stale отдаётся сразу, а неделя обновляется в фоне
+    (stale-while-revalidate). Если сайт недоступен, отдаётся последняя
+    сохранённая версия с пометкой "stale" (stale-if-error).
+
+    В SQLite неделя группы хранится одной записью, поэтому промах памяти
+    поднимает из базы сразу все дни недели. Вместе с днём хранится его
+    отпечаток: при обновлении недели неизменённые дни стоят одного сравнения
+    хэшей, а об изменённых сообщается в services.change_detector.
+    """
+
+    def __init__(self, max_entries: int = 2000, policy: Optional[CacheTTLPolicy] = None, max_stale: float = 7 * 86400):
+        self.max_entries = max_entries
+        self.policy = policy or CacheTTLPolicy()
+        self.max_stale = max_stale
+        self._memory: "OrderedDict[CacheKey, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._revalidating: Dict[Tuple[str, date_type], asyncio.Task] = {}
+        self.stats: Dict[str, int] = {
+            "memory_hits": 0, "db_hits": 0, "misses": 0,
+            "stale_hits": 0, "revalidations": 0, "revalidation_errors": 0,
+            "stale_if_error": 0, "unchanged_days": 0, "changed_days": 0,
+        }
+
+    # ────────────────────────────────────────────────
+    # Публичные методы
+    # ────────────────────────────────────────────────
+
+    async def get_day(self, group_name: str, date) -> Dict[str, Any]:
+        """Расписание группы на день (вырезается из загруженной недели)"""
+        day = _as_date(date)
+        key = (group_name, day.isoformat())
+
+        found = await self._lookup(key)
+        if found is not None:
+            schedule, fresh = found
+            if not fresh:
+                self._revalidate(group_name, week_start(day))
+                if get_upstream_guard().breaker.is_open:
+                    return mark_stale(schedule)
+            return schedule
+
+        self.stats["misses"] += 1
+        try:
+            _, by_date = await self._load_week(group_name, week_start(day))
+            if by_date is not None:
+                return by_date[day]
+
+            # Даты недели не удалось разобрать - запрашиваем один день, как раньше
+            days = await get_parser().fetch_custom_schedule(group_name, day, day)
+        except Exception:
+            # Сайт недоступен - отдаём последнюю сохранённую версию, сколько бы ей ни было
+            schedule = await self._lookup_any(key)
+            if schedule is None:
+                raise
+            self.stats["stale_if_error"] += 1
+            return mark_stale(schedule)
+
+        schedule = days[0] if days else make_empty_day(group_name, day)
+        await self._store(key, schedule)
+        return schedule
+
+    async def get_week(self, group_name: str, start_date=None) -> List[Dict[str, Any]]:
+        """Расписание группы на неделю (только дни с занятиями, как у парсера)"""
+        if start_date is None:
+            start_date = datetime.now()
+        start = week_start(_as_date(start_date))
+        dates = [start + timedelta(days=offset) for offset in range(7)]
+
+        cached_days = []
+        all_fresh = True
+        for day in dates:
+            found = await self._lookup((group_name, day.isoformat()))
+            if found is None:
+                break
+            cached_days.append(found[0])
+            all_fresh = all_fresh and found[1]
+        else:
+            week = [schedule for schedule in cached_days if schedule.get("lessons")]
+            if not all_fresh:
+                self._revalidate(group_name, start)
+                if get_upstream_guard().breaker.is_open:
+                    return [mark_stale(schedule) for schedule in week]
+            return week
+
+        self.stats["misses"] += 1
+        try:
+            week, by_date = await self._load_week(group_name, start)
+        except Exception:
+            stale_days = [await self._lookup_any((group_name, day.isoformat())) for day in dates]
+            stale_days = [schedule for schedule in stale_days if schedule is not None]
+            if not stale_days:
+                raise
+            self.stats["stale_if_error"] += 1
+            return [mark_stale(schedule) for schedule in stale_days if schedule.get("lessons")]
+
+        if by_date is None:
+            return week
+        return [by_date[day] for day in dates if by_date[day].get("lessons")]
+
+    async def refresh_week(self, group_name: str, date) -> bool:
+        """
+        Обновить неделю, в которую входит date, если в ней есть
+        просроченные дни. Возвращает True, если неделя загружалась.
+        """
+        start = week_start(_as_date(date))
+        for offset in range(7):
+            found = await self._lookup((group_name, (start + timedelta(days=offset)).isoformat()))
+            if found is None or not found[1]:
+                break
+        else:
+            return False
+
+        self.stats["revalidations"] += 1
+        try:
+            await self._load_week(group_name, start)
+        except Exception as e:
+            self.stats["revalidation_errors"] += 1
+            logger.warning(f"Обновление {group_name} (неделя с {start}) не удалось: {e}")
+        return True
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = dict(self.stats)
+        hits = stats["memory_hits"] + stats["db_hits"]
+        total = hits + stats["misses"]
+        stats["memory_entries"] = len(self._memory)
+        stats["hit_ratio"] = hits / total if total else 0.0
+        stats["stale_ratio"] = stats["stale_hits"] / hits if hits else 0.0
+        return stats
+
+    def invalidate(self, group_name: Optional[str] = None):
+        """Сброс памяти (целиком или для одной группы)"""
+        if group_name is None:
+            self._memory.clear()
+            return
+        for key in [key for key in self._memory if key[0] == group_name]:
+            del self._memory[key]
+
+    # ────────────────────────────────────────────────
+    # Внутренние методы
+    # ────────────────────────────────────────────────
+
+    async def _lookup(self, key: CacheKey) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """(расписание, свежее ли оно) или None, если записи нет или она слишком старая"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            schedule, fetched_at = entry
+            self._memory.move_to_end(key)
+            source = "memory_hits"
+        else:
+            week = await get_db().get_cached_week(key[0], week_start(date_type.fromisoformat(key[1])).isoformat())
+            if not week or key[1] not in week:
+                return None
+            # Соседние дни той же записи почти наверняка понадобятся следом
+            for day, db_entry in week.items():
+                self._remember((key[0], day), db_entry["data"], db_entry["fetched_at"])
+            schedule, fetched_at = week[key[1]]["data"], week[key[1]]["fetched_at"]
+            self._memory.move_to_end(key)
+            source = "db_hits"
+
+        age = time.time() - fetched_at
+        if age <= self.policy.ttl_for(date_type.fromisoformat(key[1])):
+            self.stats[source] += 1
+            return schedule, True
+        if age <= self.max_stale:
+            self.stats[source] += 1
+            self.stats["stale_hits"] += 1
+            return schedule, False
+
+        # Слишком старая запись - считаем, что её нет
+        self._memory.pop(key, None)
+        return None
+
+    async def _lookup_any(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """Последняя сохранённая версия без учёта возраста (для ответа при ошибке сайта)"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            return entry[0]
+        try:
+            db_entry = await get_db().get_cached_schedule_entry(*key)
+        except Exception as e:
+            logger.error(f"Ошибка чтения кэша {key[0]} → {key[1]}: {e}")
+            return None
+        return db_entry["data"] if db_entry else None
+
+    def _revalidate(self, group_name: str, start: date_type):
+        """Фоновое обновление недели (не больше одного на группу и неделю)"""
+        key = (group_name, start)
+        if key in self._revalidating:
+            return
+        task = asyncio.create_task(self._revalidate_week(group_name, start))
+        self._revalidating[key] = task
+        task.add_done_callback(lambda _: self._revalidating.pop(key, None))
+
+    async def _revalidate_week(self, group_name: str, start: date_type):
+        self.stats["revalidations"] += 1
+        try:
+            await self._load_week(group_name, start)
+        except Exception as e:
+            self.stats["revalidation_errors"] += 1
+            logger.warning(f"Фоновое обновление {group_name} (неделя с {start}) не удалось: {e}")
+
+    async def _store(self, key: CacheKey, schedule: Dict[str, Any], fingerprint: Optional[str] = None):
+        self._remember(key, schedule, time.time())
+        try:
+            await get_db().save_schedule_to_cache(key[0], key[1], schedule, fingerprint or schedule_fingerprint(schedule))
+        except Exception as e:
+            logger.error(f"Не удалось сохранить кэш {key[0]} → {key[1]}: {e}")
+
+    async def _store_week(self, group_name: str, start: date_type, days: Dict[str, Tuple[Dict[str, Any], str]]):
+        """Сохранение загруженной недели одной записью"""
+        now = time.time()
+        for day, (schedule, _) in days.items():
+            self._remember((group_name, day), schedule, now)
+        try:
+            await get_db().save_schedule_week(group_name, start.isoformat(), days)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить кэш {group_name} (неделя с {start}): {e}")
+
+    async def _load_week(self, group_name: str, start: date_type) -> Tuple[List[Dict[str, Any]], Optional[Dict[date_type, Dict[str, Any]]]]:
+        """
+        Загрузка целой недели (пн-вс) одним запросом и раскладка по дням.
+        Одновременные запросы дня и недели одной группы попадают в одну
+        загрузку парсера, так как ключ диапазона у них совпадает.
+        Возвращает (неделя как у парсера, {дата: расписание} или None).
+        """
+        dates = [start + timedelta(days=offset) for offset in range(7)]
+        week = await get_parser().fetch_custom_schedule(group_name, dates[0], dates[-1])
+
+        by_date = {}
+        for schedule in week:
+            day = parse_site_date(schedule.get("date"))
+            if day is None or day not in dates:
+                logger.warning(f"Не удалось разобрать дату '{schedule.get('date')}', неделя {group_name} не кэшируется")
+                return week, None
+            by_date[day] = schedule
+
+        try:
+            fingerprints = await get_db().get_schedule_fingerprints(group_name, dates[0].isoformat(), dates[-1].isoformat())
+        except Exception as e:
+            logger.error(f"Не удалось прочитать отпечатки {group_name}: {e}")
+            fingerprints = {}
+
+        # Дни без занятий тоже кэшируются, чтобы не ходить за ними на сайт
+        changes = {}
+        fresh = {}
+        for day in dates:
+            schedule = by_date.setdefault(day, make_empty_day(group_name, day))
+            key = (group_name, day.isoformat())
+            fingerprint = schedule_fingerprint(schedule)
+            previous = fingerprints.get(key[1])
+            fresh[key[1]] = (schedule, fingerprint)
+
+            if fingerprint == previous:
+                self.stats["unchanged_days"] += 1
+                continue
+
+            if previous is not None:
+                self.stats["changed_days"] += 1
+                old = await self._lookup_any(key)
+                if old is not None:
+                    changes[day] = (old, schedule)
+        await self._store_week(group_name, start, fresh)
+
+        if changes:
+            report_schedule_changes(group_name, changes)
+
+        return week, by_date
+
+    def _remember(self, key: CacheKey, schedule: Dict[str, Any], fetched_at: float):
+        self._memory[key] = (schedule, fetched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+def mark_stale(schedule: Dict[str, Any]) -> Dict[str, Any]:
+    """Копия расписания с пометкой, что данные могли устареть"""
+    return {**schedule, "stale": True}
+
+
+def _as_date(value) -> date_type:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def week_start(day: date_type) -> date_type:
+    """Понедельник ISO-недели, в которую входит день"""
+    return day - timedelta(days=day.weekday())
+
+
+# Глобальный экземпляр
+_schedule_cache: Optional[ScheduleCache] = None
+
+
+def get_schedule_cache() -> ScheduleCache:
+    """Получить кэш расписания (создаётся при первом обращении)"""
+    global _schedule_cache
+    if _schedule_cache is None:
+        _schedule_cache = ScheduleCache(
+            max_entries=settings.SCHEDULE_CACHE_MEMORY_SIZE,
+            policy=CacheTTLPolicy.from_settings(),
+            max_stale=settings.CACHE_MAX_STALE_HOURS * 3600,
+        )
+    return _schedule_cache
@@ -0,0 +1,267 @@
+"""Планировщик фоновых задач: очередь с приоритетом по времени запуска"""
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from zoneinfo import ZoneInfo
+
+from config import settings
+from database import get_db
+from utils.logger import logger
+
+
+class CronSpec:
+    """
+    Расписание в формате cron из пяти полей: минута, час, день месяца,
+    месяц, день недели (0 или 7 - воскресенье). Поддерживаются *, списки
+    через запятую, диапазоны a-b и шаг */n или a-b/n. Время считается
+    в часовом поясе tz.
+    """
+
+    FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expression: str, tz: str = "Europe/Moscow"):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Ожидалось 5 полей cron, получено {len(parts)}: '{expression}'")
+
+        self.expression = expression
+        self.tz = ZoneInfo(tz)
+        values = [self._parse_field(part, low, high) for part, (low, high) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        # В cron воскресенье - 0 или 7, в Python - 6
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> List[int]:
+        result: Set[int] = set()
+        for item in field.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/", 1)
+                step = int(step_text)
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start, end = (int(value) for value in item.split("-", 1))
+            else:
+                start = end = int(item)
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Недопустимое значение cron: '{field}'")
+            result.update(range(start, end + 1, step))
+        return sorted(result)
+
+    def _day_matches(self, day) -> bool:
+        if day.month not in self.months:
+            return False
+        day_ok = day.day in self.days
+        weekday_ok = day.weekday() in self.weekdays
+        # Как в cron: если заданы и день месяца, и день недели - достаточно одного
+        if not self._any_day and not self._any_weekday:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """Ближайшее время запуска строго после moment"""
+        local = moment.astimezone(self.tz)
+        day = local.date()
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=self.tz)
+                        if candidate > local:
+                            return candidate
+            day += timedelta(days=1)
+        raise ValueError(f"Расписание '{self.expression}' никогда не срабатывает")
+
+    def __str__(self) -> str:
+        return self.expression
+
+
+class ScheduledJob:
+    """Задача планировщика и её состояние"""
+
+    def __init__(
+        self,
+        name: str,
+        spec: CronSpec,
+        func: Callable[[], Awaitable[Any]],
+        jitter: float = 0,
+        catch_up: float = 0,
+    ):
+        self.name = name
+        self.spec = spec
+        self.func = func
+        self.jitter = jitter
+        self.catch_up = catch_up
+
+        self.next_run: Optional[datetime] = None
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.runs = 0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+class Scheduler:
+    """
+    Задачи хранятся в куче по времени следующего запуска; цикл спит ровно
+    до ближайшего запуска (или до добавления новой задачи), без
+    периодических проверок. Время последнего запуска сохраняется в БД:
+    если бот был выключен в момент запуска, задача выполняется сразу после
+    старта, при условии что пропуск не старше catch_up секунд.
+    К времени запуска добавляется случайная задержка до jitter секунд.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def add_job(
+        self,
+        name: str,
+        cron: str,
+        func: Callable[[], Awaitable[Any]],
+        jitter: float = 0,
+        catch_up: float = 0,
+        tz: Optional[str] = None,
+    ) -> ScheduledJob:
+        """Добавить задачу по расписанию cron (задача с тем же именем заменяется)"""
+        previous = self._jobs.get(name)
+        if previous is not None:
+            previous.next_run = None
+
+        job = ScheduledJob(name, CronSpec(cron, tz or settings.TIMEZONE), func, jitter, catch_up)
+        now = datetime.now(job.spec.tz)
+
+        last_run = await get_db().get_job_last_run(name)
+        if last_run is not None:
+            job.last_run = datetime.fromtimestamp(last_run, job.spec.tz)
+            missed = job.spec.next_after(job.last_run)
+            if missed <= now and (now - missed).total_seconds() <= catch_up:
+                logger.info(f"Задача '{name}' пропустила запуск в {missed:%d.%m %H:%M} - выполняется сейчас")
+                self._push(job, now)
+
+        if job.next_run is None:
+            self._schedule_next(job, now)
+
+        self._jobs[name] = job
+        self._changed.set()
+        return job
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for job in self._jobs.values():
+            if job.running:
+                job.task.cancel()
+
+    def jobs(self) -> List[ScheduledJob]:
+        """Задачи в порядке следующего запуска"""
+        return sorted(self._jobs.values(), key=lambda job: job.next_run or datetime.max.replace(tzinfo=job.spec.tz))
+
+    # ────────────────────────────────────────────────
+    # Внутренние методы
+    # ────────────────────────────────────────────────
+
+    def _schedule_next(self, job: ScheduledJob, after: datetime):
+        fire_at = job.spec.next_after(after)
+        if job.jitter:
+            fire_at += timedelta(seconds=random.uniform(0, job.jitter))
+        self._push(job, fire_at)
+
+    def _push(self, job: ScheduledJob, fire_at: datetime):
+        job.next_run = fire_at
+        heapq.heappush(self._heap, (fire_at.timestamp(), next(self._counter), job))
+
+    async def _loop(self):
+        while True:
+            self._changed.clear()
+            delay = self._heap[0][0] - time.time() if self._heap else None
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            fire_ts, _, job = heapq.heappop(self._heap)
+            if job.next_run is None or job.next_run.timestamp() != fire_ts:
+                continue  # устаревшая запись кучи
+
+            fired_at = datetime.now(job.spec.tz)
+            job.next_run = None
+            self._schedule_next(job, fired_at)
+
+            if job.running:
+                logger.warning(f"Задача '{job.name}' ещё выполняется - запуск пропущен")
+                continue
+            job.task = asyncio.create_task(self._run(job, fired_at))
+
+    async def _run(self, job: ScheduledJob, fired_at: datetime):
+        # Время запуска сохраняется до выполнения: если бот упадёт посреди
+        # задачи, после перезапуска она не будет выполнена повторно
+        job.last_run = fired_at
+        try:
+            await get_db().set_job_last_run(job.name, int(fired_at.timestamp()))
+        except Exception as e:
+            logger.error(f"Не удалось сохранить время запуска задачи '{job.name}': {e}")
+
+        started = time.perf_counter()
+        try:
+            await job.func()
+            job.last_error = None
+        except Exception as e:
+            job.last_error = str(e)
+            logger.error(f"Ошибка задачи '{job.name}': {e}")
+        finally:
+            job.runs += 1
+            job.last_duration = time.perf_counter() - started
+
+
+# Глобальный экземпляр
+_scheduler: Optional[Scheduler] = None
+
+
+def get_scheduler() -> Scheduler:
+    """Получить планировщик"""
+    if _scheduler is None:
+        raise RuntimeError("Планировщик не инициализирован. Вызовите init_scheduler()")
+    return _scheduler
+
+
+async def init_scheduler() -> Scheduler:
+    """Инициализация и запуск планировщика (задачи добавляются через add_job)"""
+    global _scheduler
+    _scheduler = Scheduler()
+    await _scheduler.start()
+    return _scheduler
+
+
+async def close_scheduler():
+    """Остановка планировщика и выполняющихся задач"""
+    global _scheduler
+    if _scheduler:
+        await _scheduler.close()
+        _scheduler = None
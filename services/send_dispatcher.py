@@ -0,0 +1,159 @@
+"""Общий диспетчер исходящих сообщений: лимит Telegram, паузы по RetryAfter"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from config import settings
+from services.upstream_guard import TokenBucket
+from utils.logger import logger
+
+
+SendJob = Tuple[int, Callable[[], Awaitable[Any]]]
+
+
+class SendDispatcher:
+    """
+    Все рассылки идут через один диспетчер:
+    - общий бюджет rate сообщений в секунду (ведро токенов);
+    - в один чат - не чаще раза в per_chat_interval секунд;
+    - не больше max_concurrency запросов к Telegram одновременно;
+    - на TelegramRetryAfter отправка приостанавливается для всех
+      на указанное Telegram время, затем сообщение отправляется снова.
+    """
+
+    # Сколько чатов помнить для интервала; старые записи удаляются
+    MAX_TRACKED_CHATS = 10000
+
+    def __init__(
+        self,
+        rate: float = 25.0,
+        per_chat_interval: float = 1.0,
+        max_concurrency: int = 10,
+        max_retries: int = 3,
+    ):
+        self.rate = rate
+        self.per_chat_interval = per_chat_interval
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+
+        # Без всплеска: сообщения идут равномерно, не больше rate в секунду
+        self._bucket = TokenBucket(rate, 1)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._chat_last: Dict[int, float] = {}
+        self._paused_until = 0.0
+        self.stats: Dict[str, float] = {
+            "sent": 0, "failed": 0, "retry_after": 0, "paused_seconds": 0.0,
+        }
+        self.last_report: Optional[Dict[str, Any]] = None
+
+    async def send(self, chat_id: int, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить func() (один запрос к Telegram для chat_id) с учётом всех лимитов"""
+        attempt = 0
+        while True:
+            await self._wait_chat(chat_id)
+            async with self._semaphore:
+                await self._wait_pause()
+                await self._bucket.acquire()
+                self._chat_last[chat_id] = max(self._chat_last.get(chat_id, 0.0), time.monotonic())
+                try:
+                    result = await func()
+                except TelegramRetryAfter as e:
+                    self.stats["retry_after"] += 1
+                    self._pause(e.retry_after)
+                    if attempt >= self.max_retries:
+                        self.stats["failed"] += 1
+                        raise
+                    attempt += 1
+                    continue
+                except Exception:
+                    self.stats["failed"] += 1
+                    raise
+            self.stats["sent"] += 1
+            return result
+
+    async def deliver(self, jobs: Iterable[SendJob], name: str = "рассылка") -> Dict[str, Any]:
+        """
+        Отправить все задания (chat_id, func) и вернуть отчёт:
+        sent, failed, elapsed (с), rate (сообщений в секунду).
+        Задания берутся из итератора по мере отправки, поэтому список
+        на тысячи получателей не превращается в тысячи задач сразу.
+        """
+        jobs = iter(jobs)
+        report: Dict[str, Any] = {"name": name, "sent": 0, "failed": 0}
+        started = time.monotonic()
+
+        async def worker():
+            for chat_id, func in jobs:
+                try:
+                    await self.send(chat_id, func)
+                    report["sent"] += 1
+                except Exception as e:
+                    report["failed"] += 1
+                    logger.error(f"Ошибка отправки ({name}) в чат {chat_id}: {e}")
+
+        await asyncio.gather(*(worker() for _ in range(self.max_concurrency)))
+
+        report["elapsed"] = time.monotonic() - started
+        report["rate"] = report["sent"] / report["elapsed"] if report["elapsed"] > 0 else 0.0
+        self.last_report = report
+        logger.info(
+            f"{name[:1].upper()}{name[1:]}: отправлено {report['sent']}, ошибок {report['failed']} "
+            f"за {report['elapsed']:.1f} с ({report['rate']:.1f} сообщ./с)"
+        )
+        return report
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        stats["paused"] = self._paused_until > time.monotonic()
+        stats["tracked_chats"] = len(self._chat_last)
+        stats["last_report"] = self.last_report
+        return stats
+
+    async def _wait_chat(self, chat_id: int):
+        # Время отправки резервируется заранее, чтобы одновременные
+        # сообщения в один чат выстроились с интервалом, а не проснулись разом
+        if len(self._chat_last) > self.MAX_TRACKED_CHATS:
+            self._forget_idle_chats()
+        now = time.monotonic()
+        last = self._chat_last.get(chat_id)
+        slot = now if last is None else max(now, last + self.per_chat_interval)
+        self._chat_last[chat_id] = slot
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _wait_pause(self):
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def _pause(self, seconds: float):
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self.stats["paused_seconds"] += until - max(self._paused_until, time.monotonic())
+            self._paused_until = until
+            logger.warning(f"Telegram просит подождать {seconds} с - отправка приостановлена")
+
+    def _forget_idle_chats(self):
+        threshold = time.monotonic() - self.per_chat_interval
+        self._chat_last = {chat_id: last for chat_id, last in self._chat_last.items() if last > threshold}
+
+
+# Глобальный экземпляр
+_send_dispatcher: Optional[SendDispatcher] = None
+
+
+def get_send_dispatcher() -> SendDispatcher:
+    """Получить диспетчер отправки (создаётся при первом обращении)"""
+    global _send_dispatcher
+    if _send_dispatcher is None:
+        _send_dispatcher = SendDispatcher(
+            rate=settings.SEND_RATE,
+            per_chat_interval=settings.SEND_PER_CHAT_INTERVAL,
+            max_concurrency=settings.SEND_MAX_CONCURRENCY,
+            max_retries=settings.SEND_MAX_RETRIES,
+        )
+    return _send_dispatcher
@@ -0,0 +1,43 @@
+"""Объединение одновременных одинаковых запросов (single-flight)"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Одновременные вызовы с одинаковым ключом ждут один общий результат.
+    Работа выполняется отдельной задачей, поэтому отмена одного из
+    ожидающих не отменяет загрузку для остальных.
+    """
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats: Dict[str, int] = {"calls": 0, "executed": 0, "coalesced": 0}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить func() один раз для всех одновременных вызовов с ключом key"""
+        self.stats["calls"] += 1
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["executed"] += 1
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats["coalesced"] += 1
+
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, float]:
+        stats = dict(self.stats)
+        stats["in_flight"] = len(self._inflight)
+        stats["coalesced_ratio"] = stats["coalesced"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
@@ -0,0 +1,270 @@
+"""Защита сайта университета: ограничение частоты, предохранитель, повторы"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import aiohttp
+
+from config import settings
+from utils.logger import logger
+
+
+class UpstreamUnavailable(Exception):
+    """Запрос к сайту не выполнен: сайт недоступен или запрос отброшен"""
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    """Предохранитель разомкнут - запросы к сайту временно не отправляются"""
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """
+    Ошибка говорит о проблемах сайта: таймаут, обрыв соединения, 5xx или 429.
+    Остальные 4xx (например, несуществующая группа) - ошибка запроса:
+    она не повторяется и не размыкает предохранитель.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status == 429
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, aiohttp.ClientPayloadError))
+
+
+class TokenBucket:
+    """Ведро токенов: в среднем rate запросов в секунду, всплеск до capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Дождаться токена (ожидающие обслуживаются по очереди)"""
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Предохранитель: размыкается после failure_threshold ошибок подряд
+    или slow_call_threshold медленных ответов подряд. Через reset_timeout
+    пропускает один пробный запрос (half-open) и по его итогу замыкается
+    или снова размыкается.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 8.0,
+        slow_call_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.opened_at: Optional[float] = None
+        self._failures = 0
+        self._slow_calls = 0
+        self._probe_in_flight = False
+        self.stats: Dict[str, int] = {"opened": 0, "rejected": 0}
+
+    @property
+    def is_open(self) -> bool:
+        return self.state != self.CLOSED
+
+    def allow(self) -> bool:
+        """Можно ли сейчас отправить запрос"""
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.stats["rejected"] += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self._probe_in_flight:
+                self.stats["rejected"] += 1
+                return False
+            self._probe_in_flight = True
+
+        return True
+
+    def release_probe(self):
+        """Пробный запрос не был отправлен или не дал ответа о сайте - разрешить следующий"""
+        self._probe_in_flight = False
+
+    def record_success(self, latency: float):
+        self._failures = 0
+        if latency >= self.slow_call_seconds:
+            self._slow_calls += 1
+            if self.state == self.HALF_OPEN or self._slow_calls >= self.slow_call_threshold:
+                self._open(f"медленные ответы ({latency:.1f} с)")
+            return
+
+        self._slow_calls = 0
+        if self.state != self.CLOSED:
+            logger.info("Предохранитель сайта расписания замкнут: сайт снова отвечает")
+        self.state = self.CLOSED
+        self._probe_in_flight = False
+
+    def record_failure(self, error: Exception):
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            self._open(f"ошибки ({error})")
+
+    def _open(self, reason: str):
+        if self.state != self.OPEN:
+            self.stats["opened"] += 1
+            logger.warning(f"Предохранитель сайта расписания разомкнут на {self.reset_timeout:.0f} с: {reason}")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self._failures = 0
+        self._slow_calls = 0
+        self._probe_in_flight = False
+
+
+class UpstreamGuard:
+    """
+    Обёртка для запросов к сайту: ведро токенов на все запросы,
+    ограничение одновременных запросов, предохранитель и повторы
+    с экспоненциальной задержкой в пределах бюджета повторов.
+    Запрос, который ждёт очереди дольше max_wait, отбрасывается.
+    """
+
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        breaker: CircuitBreaker,
+        max_concurrency: int = 4,
+        max_wait: float = 5.0,
+        retries: int = 2,
+        retry_budget: float = 0.2,
+        backoff: float = 0.5,
+    ):
+        self.bucket = bucket
+        self.breaker = breaker
+        self.max_wait = max_wait
+        self.retries = retries
+        self.retry_budget = retry_budget
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats: Dict[str, int] = {"calls": 0, "failures": 0, "retries": 0, "shed": 0}
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить запрос к сайту под защитой"""
+        self.stats["calls"] += 1
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(func)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                if (
+                    attempt >= self.retries
+                    or not self._can_retry()
+                    or isinstance(e, UpstreamUnavailable)
+                    or not is_upstream_failure(e)
+                ):
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                delay = self.backoff * (2 ** (attempt - 1)) * (1 + random.random())
+                logger.warning(f"Повтор запроса к сайту через {delay:.1f} с (попытка {attempt}): {e}")
+                await asyncio.sleep(delay)
+
+    async def _attempt(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Сайт расписания временно недоступен")
+        # Только пробный запрос half-open освобождает место пробы
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self.bucket.acquire(), timeout=self.max_wait)
+            remaining = self.max_wait - (time.monotonic() - started)
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=max(remaining, 0.001))
+        except asyncio.TimeoutError:
+            self.stats["shed"] += 1
+            if probe:
+                self.breaker.release_probe()
+            raise UpstreamUnavailable("Очередь запросов к сайту переполнена")
+        except BaseException:
+            # Отмена во время ожидания: пробный запрос не должен остаться занятым
+            if probe:
+                self.breaker.release_probe()
+            raise
+
+        try:
+            request_started = time.monotonic()
+            result = await func()
+        except Exception as e:
+            if is_upstream_failure(e):
+                self.stats["failures"] += 1
+                self.breaker.record_failure(e)
+            elif probe:
+                self.breaker.release_probe()
+            raise
+        except BaseException:
+            # CancelledError и т.п.: о состоянии сайта ничего не известно
+            if probe:
+                self.breaker.release_probe()
+            raise
+        finally:
+            self._semaphore.release()
+
+        self.breaker.record_success(time.monotonic() - request_started)
+        return result
+
+    def _can_retry(self) -> bool:
+        # Повторы не должны превышать долю retry_budget от всех запросов
+        return self.stats["retries"] < max(1, self.stats["calls"] * self.retry_budget)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        stats["breaker_state"] = self.breaker.state
+        stats["breaker_opened"] = self.breaker.stats["opened"]
+        stats["breaker_rejected"] = self.breaker.stats["rejected"]
+        return stats
+
+
+# Глобальный экземпляр
+_upstream_guard: Optional[UpstreamGuard] = None
+
+
+def get_upstream_guard() -> UpstreamGuard:
+    """Получить защиту запросов к сайту (создаётся при первом обращении)"""
+    global _upstream_guard
+    if _upstream_guard is None:
+        _upstream_guard = UpstreamGuard(
+            bucket=TokenBucket(settings.UPSTREAM_RATE, settings.UPSTREAM_BURST),
+            breaker=CircuitBreaker(
+                failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+                slow_call_seconds=settings.BREAKER_SLOW_CALL_SECONDS,
+                slow_call_threshold=settings.BREAKER_SLOW_CALL_THRESHOLD,
+                reset_timeout=settings.BREAKER_RESET_TIMEOUT,
+            ),
+            max_concurrency=settings.UPSTREAM_MAX_CONCURRENCY,
+            max_wait=settings.UPSTREAM_MAX_WAIT,
+            retries=settings.UPSTREAM_RETRIES,
+            retry_budget=settings.UPSTREAM_RETRY_BUDGET,
+        )
+    return _upstream_guard
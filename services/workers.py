@@ -0,0 +1,182 @@
+"""Пул исполнителей для CPU-нагруженной работы: разбор HTML и отрисовка"""
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from config import settings
+from services.image_cache import get_image_cache, schedule_image_key
+from services.singleflight import SingleFlight
+from utils.logger import logger
+
+
+class WorkerQueueFull(Exception):
+    """Очередь пула переполнена - задача отклонена"""
+
+
+class WorkerPool:
+    """
+    Пул потоков или процессов за асинхронной обёрткой.
+    Одновременно в исполнитель передаётся не больше max_workers задач,
+    остальные ждут в очереди длиной не больше max_queue; сверх этого
+    задачи отклоняются, чтобы не копить работу в памяти.
+    """
+
+    def __init__(self, kind: str = "thread", max_workers: Optional[int] = None, max_queue: int = 64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Неизвестный тип пула: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self.max_queue = max_queue
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(self.max_workers)
+        self._queued = 0
+        self._running = 0
+        self.stats: Dict[str, float] = {
+            "submitted": 0, "completed": 0, "failed": 0, "rejected": 0,
+            "max_queue_depth": 0, "wait_time": 0.0, "run_time": 0.0,
+        }
+
+    def start(self):
+        if self.kind == "process":
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_process_worker)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="worker")
+        logger.info(f"Пул исполнителей запущен: {self.kind}, {self.max_workers} воркеров, очередь до {self.max_queue}")
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Пул исполнителей остановлен")
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Выполнить func(*args) в пуле и дождаться результата"""
+        if self._executor is None:
+            raise RuntimeError("Пул исполнителей не запущен")
+        if self._queued >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise WorkerQueueFull(f"Очередь пула переполнена ({self._queued} задач)")
+
+        self.stats["submitted"] += 1
+        self._queued += 1
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._queued)
+        queued_at = time.perf_counter()
+        try:
+            await self._slots.acquire()
+        finally:
+            self._queued -= 1
+
+        started = time.perf_counter()
+        self.stats["wait_time"] += started - queued_at
+        self._running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, func, *args)
+        except Exception:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._running -= 1
+            self._slots.release()
+            self.stats["run_time"] += time.perf_counter() - started
+
+        self.stats["completed"] += 1
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = dict(self.stats)
+        finished = stats["completed"] + stats["failed"]
+        stats["kind"] = self.kind
+        stats["workers"] = self.max_workers
+        stats["queue_depth"] = self._queued
+        stats["running"] = self._running
+        stats["avg_wait_ms"] = stats["wait_time"] / finished * 1000 if finished else 0.0
+        stats["avg_run_ms"] = stats["run_time"] / finished * 1000 if finished else 0.0
+        return stats
+
+
+# ────────────────────────────────────────────────
+# Задачи для пула (функции верхнего уровня, чтобы работать и в процессах)
+# ────────────────────────────────────────────────
+
+def _parse_job(html: str, engine: str) -> List[Dict[str, str]]:
+    from services.parser import parse_schedule_html
+    return parse_schedule_html(html, engine)
+
+
+def _render_job(schedule: Dict[str, Any]) -> bytes:
+    from services.image_generator import get_image_generator
+    return get_image_generator().generate_schedule_image(schedule).getvalue()
+
+
+def _init_process_worker():
+    """Подготовка процесса пула: шрифты и шаблоны загружаются до первой задачи"""
+    from services.image_generator import get_image_generator
+    get_image_generator()
+
+
+# Одинаковые изображения, запрошенные одновременно, рисуются один раз
+render_flight = SingleFlight("render")
+
+# Глобальный экземпляр
+_worker_pool: Optional[WorkerPool] = None
+
+
+def get_worker_pool() -> WorkerPool:
+    """Получить пул исполнителей"""
+    if _worker_pool is None:
+        raise RuntimeError("Пул исполнителей не инициализирован. Вызовите init_worker_pool()")
+    return _worker_pool
+
+
+def init_worker_pool() -> WorkerPool:
+    """Инициализация пула исполнителей"""
+    global _worker_pool
+    _worker_pool = WorkerPool(
+        kind=settings.WORKER_POOL_KIND,
+        max_workers=settings.WORKER_POOL_SIZE or None,
+        max_queue=settings.WORKER_POOL_MAX_QUEUE,
+    )
+    _worker_pool.start()
+    return _worker_pool
+
+
+def close_worker_pool():
+    """Остановка пула исполнителей"""
+    global _worker_pool
+    if _worker_pool:
+        _worker_pool.shutdown()
+        _worker_pool = None
+
+
+async def parse_html_async(html: str, engine: Optional[str] = None) -> List[Dict[str, str]]:
+    """Разбор HTML расписания в пуле (или на месте, если пул не запущен)"""
+    engine = engine or settings.PARSER_ENGINE
+    if _worker_pool is None:
+        return _parse_job(html, engine)
+    return await _worker_pool.run(_parse_job, html, engine)
+
+
+async def render_schedule_image(schedule: Dict[str, Any]) -> bytes:
+    """
+    PNG расписания: из кэша изображений, а при промахе - отрисовка
+    в пуле (или на месте, если пул не запущен) с сохранением в кэш
+    """
+    key = schedule_image_key(schedule)
+    return await render_flight.do(key, lambda: _render_cached(key, schedule))
+
+
+async def _render_cached(key: str, schedule: Dict[str, Any]) -> bytes:
+    cache = get_image_cache()
+    image = await cache.get(key)
+    if image is not None:
+        return image
+
+    if _worker_pool is None:
+        image = _render_job(schedule)
+    else:
+        image = await _worker_pool.run(_render_job, schedule)
+    await cache.put(key, image)
+    return image
@@ -0,0 +1,9 @@
+"""Общие настройки тестов: модули проекта читают настройки при импорте"""
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault("BOT_TOKEN", "0:test")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,68 @@
+"""Время жизни кэша расписания: прошедшие дни, сегодня и будущие недели"""
+import asyncio
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from services.cache_policy import CacheTTLPolicy
+from services.schedule_cache import ScheduleCache
+
+TODAY = date(2026, 2, 16)
+
+
+@pytest.fixture
+def policy():
+    return CacheTTLPolicy(near_ttl=15 * 60, soon_ttl=3600, far_ttl=6 * 3600, past_ttl=float("inf"), near_days=1, far_days=14)
+
+
+@pytest.mark.parametrize("offset, expected", [
+    (-30, float("inf")),     # прошедшие дни не меняются
+    (-1, float("inf")),
+    (0, 15 * 60),            # сегодня и завтра
+    (1, 15 * 60),
+    (2, 3600),               # ближайшие две недели
+    (13, 3600),
+    (14, 6 * 3600),          # дальние недели
+    (60, 6 * 3600),
+])
+def test_ttl_for(policy, offset, expected):
+    assert policy.ttl_for(TODAY + timedelta(days=offset), today=TODAY) == expected
+
+
+def test_finite_past_ttl():
+    policy = CacheTTLPolicy(past_ttl=86400)
+    assert policy.ttl_for(TODAY - timedelta(days=3), today=TODAY) == 86400
+
+
+def test_today_uses_policy_timezone():
+    policy = CacheTTLPolicy(tz="Asia/Vladivostok")
+    assert policy.today() == datetime.now(ZoneInfo("Asia/Vladivostok")).date()
+
+
+@pytest.mark.parametrize("offset, age, expected", [
+    # (день относительно сегодня, возраст записи в секундах, ожидаемый результат _lookup)
+    (-2, 30 * 86400, (True, True)),   # прошедший день свежий сколько угодно долго (max_stale не важен)
+    (0, 10 * 60, (True, True)),
+    (0, 20 * 60, (True, False)),      # сегодня: старше near_ttl - устаревшая, отдаётся с обновлением
+    (5, 30 * 60, (True, True)),
+    (5, 2 * 3600, (True, False)),
+    (30, 5 * 3600, (True, True)),
+    (30, 7 * 3600, (True, False)),
+    (0, 8 * 86400, (False, None)),    # старше max_stale - как будто записи нет
+])
+def test_schedule_cache_freshness(policy, offset, age, expected):
+    cache = ScheduleCache(policy=policy, max_stale=7 * 86400)
+    day = (policy.today() + timedelta(days=offset)).isoformat()
+    key = ("БОЗИ-24", day)
+    cache._remember(key, {"date": day, "lessons": []}, time.time() - age)
+
+    result = asyncio.run(cache._lookup(key))
+
+    found, fresh = expected
+    if not found:
+        assert result is None
+        assert key not in cache._memory
+    else:
+        assert result == ({"date": day, "lessons": []}, fresh)
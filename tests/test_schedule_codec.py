@@ -0,0 +1,158 @@
+"""Формат кэша расписания: запись недели и перенос из прежней таблицы schedule_cache"""
+import asyncio
+import json
+import sqlite3
+import zlib
+
+import pytest
+
+from database.database import Database
+from database.schedule_codec import CacheFormatError, MAGIC, day_of, decode_week, encode_week, week_of
+
+FINGERPRINT = "0123456789abcdef0123456789abcdef01234567"
+
+
+def make_day(date: str, lessons: int = 3) -> dict:
+    return {
+        "date": date,
+        "day_of_week": "Понедельник",
+        "group_name": "БОЗИ-24",
+        "lessons": [
+            {
+                "number": number, "time": "08:30 - 10:00", "name": "Программирование на Python",
+                "type": "Лабораторная работа", "teacher": "Кузнецова Мария Викторовна", "room": f"А-10{number}",
+            }
+            for number in range(1, lessons + 1)
+        ],
+    }
+
+
+def test_week_of_and_day_of():
+    # 19.02.2026 - четверг
+    assert week_of("2026-02-19") == ("2026-02-16", 3)
+    assert week_of("2026-02-16") == ("2026-02-16", 0)
+    assert week_of("2026-02-22") == ("2026-02-16", 6)
+    assert day_of("2026-02-16", 3) == "2026-02-19"
+    # Неделя через границу года
+    assert week_of("2027-01-01") == ("2026-12-28", 4)
+
+
+def test_round_trip():
+    days = {
+        0: (make_day("16.02.2026"), FINGERPRINT, 1771200000),
+        1: (make_day("17.02.2026", lessons=0), None, 1771200001),
+        5: (make_day("21.02.2026", lessons=5), FINGERPRINT, 1771200002),
+    }
+    assert decode_week(encode_week(days)) == days
+
+
+def test_round_trip_empty_week():
+    assert decode_week(encode_week({})) == {}
+
+
+@pytest.mark.parametrize("schedule", [
+    # Лишнее поле дня
+    {**make_day("16.02.2026"), "stale": True},
+    # Нечисловой номер пары
+    {**make_day("16.02.2026"), "lessons": [{**make_day("16.02.2026")["lessons"][0], "number": "1-2"}]},
+    # Лишнее поле занятия
+    {**make_day("16.02.2026"), "lessons": [{**make_day("16.02.2026")["lessons"][0], "subgroup": "1"}]},
+    # Не строковое значение
+    {**make_day("16.02.2026"), "lessons": [{**make_day("16.02.2026")["lessons"][0], "room": None}]},
+    # Отсутствует поле
+    {"date": "16.02.2026", "lessons": []},
+])
+def test_round_trip_json_fallback(schedule):
+    days = {0: (schedule, FINGERPRINT, 1771200000), 1: (make_day("17.02.2026"), None, 1771200000)}
+    assert decode_week(encode_week(days)) == days
+
+
+def test_foreign_fingerprint_is_dropped():
+    # Отпечаток хранится только как sha1; другой вид не сохраняется
+    record = encode_week({0: (make_day("16.02.2026"), "not-a-sha1", 1771200000)})
+    assert decode_week(record)[0][1] is None
+
+
+def test_repeated_strings_are_stored_once():
+    one_day = encode_week({0: (make_day("16.02.2026", lessons=5), None, 0)})
+    body = zlib.decompress(one_day[3:])
+    assert body.count("Кузнецова Мария Викторовна".encode("utf-8")) == 1
+
+
+@pytest.mark.parametrize("record", [
+    b"",
+    b"XX\x01" + zlib.compress(b"data"),
+    MAGIC + b"\x09" + zlib.compress(b"data"),
+    MAGIC + b"\x01" + b"not zlib",
+    MAGIC + b"\x01" + zlib.compress(b"\x05"),
+])
+def test_corrupted_record(record):
+    with pytest.raises(CacheFormatError):
+        decode_week(record)
+
+
+def _legacy_db(path, with_fingerprint: bool):
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE schedule_cache (group_name TEXT NOT NULL, date TEXT NOT NULL, data TEXT NOT NULL, "
+        "fetched_at INTEGER NOT NULL, " + ("fingerprint TEXT, " if with_fingerprint else "") +
+        "PRIMARY KEY (group_name, date))"
+    )
+    rows = [
+        ("БОЗИ-24", "2026-02-16", json.dumps(make_day("16.02.2026"), ensure_ascii=False), 100),
+        ("БОЗИ-24", "2026-02-18", json.dumps(make_day("18.02.2026", lessons=1), ensure_ascii=False), 300),
+        ("БОЗИ-24", "2026-02-23", json.dumps(make_day("23.02.2026"), ensure_ascii=False), 200),
+        ("ИВТ-23", "2026-02-17", json.dumps({"date": "17.02.2026", "lessons": []}), 400),
+        # Повреждённые строки пропускаются
+        ("ИВТ-23", "2026-02-18", "{not json", 500),
+        ("ИВТ-23", "not a date", "{}", 500),
+    ]
+    if with_fingerprint:
+        connection.executemany(
+            "INSERT INTO schedule_cache VALUES (?, ?, ?, ?, ?)",
+            [row + (FINGERPRINT if row[1] == "2026-02-16" else None,) for row in rows],
+        )
+    else:
+        connection.executemany("INSERT INTO schedule_cache VALUES (?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.close()
+
+
+@pytest.mark.parametrize("with_fingerprint", [False, True])
+def test_legacy_schedule_cache_migration(tmp_path, with_fingerprint):
+    path = tmp_path / "bot.db"
+    _legacy_db(path, with_fingerprint)
+
+    async def migrate():
+        db = Database(str(path))
+        await db.connect()
+        try:
+            return (
+                await db.get_cached_week("БОЗИ-24", "2026-02-16"),
+                await db.get_cached_week("БОЗИ-24", "2026-02-23"),
+                await db.get_cached_week("ИВТ-23", "2026-02-16"),
+            )
+        finally:
+            await db.disconnect()
+
+    first, second, other = asyncio.run(migrate())
+
+    assert set(first) == {"2026-02-16", "2026-02-18"}
+    assert first["2026-02-16"] == {
+        "data": make_day("16.02.2026"),
+        "fetched_at": 100,
+        "fingerprint": FINGERPRINT if with_fingerprint else None,
+    }
+    assert first["2026-02-18"]["data"] == make_day("18.02.2026", lessons=1)
+    assert set(second) == {"2026-02-23"}
+    assert other == {"2026-02-17": {"data": {"date": "17.02.2026", "lessons": []}, "fetched_at": 400, "fingerprint": None}}
+
+    connection = sqlite3.connect(path)
+    tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    fetched_at = connection.execute(
+        "SELECT fetched_at FROM schedule_weeks WHERE group_name = 'БОЗИ-24' AND week = '2026-02-16'"
+    ).fetchone()[0]
+    connection.close()
+    assert "schedule_cache" not in tables
+    # fetched_at недели - самый свежий из её дней
+    assert fetched_at == 300
@@ -0,0 +1,78 @@
+"""CronSpec: разбор выражений и ближайшее время запуска"""
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from services.scheduler import CronSpec
+
+MSK = ZoneInfo("Europe/Moscow")
+
+
+def at(year, month, day, hour=0, minute=0):
+    return datetime(year, month, day, hour, minute, tzinfo=MSK)
+
+
+@pytest.mark.parametrize("expression, moment, expected", [
+    # Шаг по минутам
+    ("*/15 * * * *", at(2026, 2, 16, 10, 7), at(2026, 2, 16, 10, 15)),
+    ("*/15 * * * *", at(2026, 2, 16, 10, 45), at(2026, 2, 16, 11, 0)),
+    # Диапазон с шагом
+    ("10-30/10 * * * *", at(2026, 2, 16, 10, 25), at(2026, 2, 16, 10, 30)),
+    ("10-30/10 * * * *", at(2026, 2, 16, 10, 30), at(2026, 2, 16, 11, 10)),
+    # Диапазон часов: после последнего - следующий день
+    ("0 7-22 * * *", at(2026, 2, 16, 12, 30), at(2026, 2, 16, 13, 0)),
+    ("0 7-22 * * *", at(2026, 2, 16, 22, 30), at(2026, 2, 17, 7, 0)),
+    # Списки
+    ("0,30 9,18 * * *", at(2026, 2, 16, 9, 30), at(2026, 2, 16, 18, 0)),
+    # Строго после moment: совпадающее время переносится на следующий запуск
+    ("5 4 * * *", at(2026, 2, 16, 4, 5), at(2026, 2, 17, 4, 5)),
+    # Переход через конец месяца и года
+    ("0 0 1 * *", at(2026, 1, 31, 12, 0), at(2026, 2, 1, 0, 0)),
+    ("30 23 * * *", at(2026, 12, 31, 23, 45), at(2027, 1, 1, 23, 30)),
+    # 29 февраля - только в високосный год
+    ("0 12 29 2 *", at(2026, 3, 1), at(2028, 2, 29, 12, 0)),
+])
+def test_next_after(expression, moment, expected):
+    assert CronSpec(expression).next_after(moment) == expected
+
+
+def test_weekday_sunday_is_zero_or_seven():
+    # 16.02.2026 - понедельник
+    monday = at(2026, 2, 16, 12, 0)
+    assert CronSpec("0 9 * * 1").next_after(monday) == at(2026, 2, 23, 9, 0)
+    assert CronSpec("0 9 * * 0").next_after(monday) == at(2026, 2, 22, 9, 0)
+    assert CronSpec("0 9 * * 7").next_after(monday) == at(2026, 2, 22, 9, 0)
+    assert CronSpec("0 9 * * 1-5").next_after(at(2026, 2, 20, 10, 0)) == at(2026, 2, 23, 9, 0)
+
+
+def test_day_of_month_or_weekday():
+    # Заданы оба поля - как в cron, достаточно совпадения одного (1-е число или воскресенье)
+    spec = CronSpec("0 8 1 * 0")
+    assert spec.next_after(at(2026, 2, 16)) == at(2026, 2, 22, 8, 0)
+    assert spec.next_after(at(2026, 2, 22, 9, 0)) == at(2026, 3, 1, 8, 0)
+
+
+def test_moment_in_other_timezone():
+    # 21:00 UTC = 00:00 MSK следующего дня
+    moment = datetime(2026, 2, 16, 20, 59, tzinfo=ZoneInfo("UTC"))
+    assert CronSpec("0 0 * * *").next_after(moment) == at(2026, 2, 17, 0, 0)
+
+
+@pytest.mark.parametrize("expression", [
+    "* * * *",
+    "60 * * * *",
+    "* 24 * * *",
+    "* * 0 * *",
+    "30-10 * * * *",
+    "*/0 * * * *",
+    "a * * * *",
+])
+def test_invalid_expression(expression):
+    with pytest.raises(ValueError):
+        CronSpec(expression)
+
+
+def test_never_matches():
+    with pytest.raises(ValueError):
+        CronSpec("0 0 31 2 *").next_after(at(2026, 1, 1))